@@ -10,6 +10,7 @@ IFS=$'\n\t'
 ROOT_DIR="$(cd -- "$(dirname -- "$0")/.." && pwd)"
 . "$ROOT_DIR/scripts/lib/lib.sh"
 . "$ROOT_DIR/scripts/lib/lib_sqlite.sh"
+. "$ROOT_DIR/scripts/lib/lib_inventory.sh"
 
 usage() {
   cat << 'USAGE'
@@ -115,6 +116,7 @@ collect_desired_clusters() {
 }
 
 list_k3d_clusters() {
+  inventory_list_clusters k3d && return 0
   command -v k3d > /dev/null 2>&1 || return 0
   if command -v jq > /dev/null 2>&1; then
     k3d cluster list -o json 2> /dev/null | jq -r '.[].name' 2> /dev/null || true
@@ -124,6 +126,7 @@ list_k3d_clusters() {
 }
 
 list_kind_clusters() {
+  inventory_list_clusters kind && return 0
   command -v kind > /dev/null 2>&1 || return 0
   kind get clusters 2> /dev/null | tr -d '\r' || true
 }
@@ -11,6 +11,8 @@ ROOT_DIR="$(cd -- "$(dirname -- "$0")/.." && pwd)"
 . "$ROOT_DIR/scripts/lib/lib.sh"
 # 需要从 SQLite 数据库获取 provider 等信息
 . "$ROOT_DIR/scripts/lib/lib_sqlite.sh"
+# 集群节点 IP 优先从后端内存清单获取（免去多次 docker inspect）
+. "$ROOT_DIR/scripts/lib/lib_inventory.sh"
 # Allow overriding HAProxy config path for tests via HAPROXY_CFG
 CFG="${HAPROXY_CFG:-$ROOT_DIR/compose/infrastructure/haproxy.cfg}"
 DCMD=(docker compose -f "$ROOT_DIR/compose/infrastructure/docker-compose.yml")
@@ -226,8 +228,12 @@ add_backend() {
   fi
 
   # Resolve cluster node container IP and target port
+  # 先查预解析列表/后端清单/Docker socket（lib_inventory.sh，选择规则与下面的 docker inspect 回退链相同）
   # kind cluster detected - 优先取 kind 网络的 IP；回退到第一个IP（以空格分隔）
-  if ip=$(docker inspect -f '{{with index .NetworkSettings.Networks "kind"}}{{.IPAddress}}{{end}}' "${name}-control-plane" 2> /dev/null) && [ -n "$ip" ]; then
+  if ip=$(inventory_cluster_ip "$name" "$provider") && [ -n "$ip" ]; then
+    detected_port="$node_port"
+    echo "[haproxy] $provider cluster $name: using inventory IP $ip:$detected_port"
+  elif ip=$(docker inspect -f '{{with index .NetworkSettings.Networks "kind"}}{{.IPAddress}}{{end}}' "${name}-control-plane" 2> /dev/null) && [ -n "$ip" ]; then
     detected_port="$node_port"
     echo "[haproxy] kind cluster $name: using kind-net IP $ip:$detected_port"
   elif ip=$(docker inspect -f '{{range .NetworkSettings.Networks}}{{.IPAddress}} {{end}}' "${name}-control-plane" 2> /dev/null | awk '{print $1}') && [ -n "$ip" ]; then
@@ -2,7 +2,7 @@
 set -Eeuo pipefail
 IFS=$'\n\t'
 # Description: Reconcile HAProxy routes from SQLite (preferred) or CSV with optional pruning.
-# Usage: scripts/haproxy_sync.sh [--prune]
+# Usage: scripts/haproxy_sync.sh [--prune | --clusters <a,b,...>]
 # Category: routing
 # Status: stable
 # See also: scripts/haproxy_route.sh
@@ -15,24 +15,39 @@ CFG="${HAPROXY_CFG:-$ROOT_DIR/compose/infrastructure/haproxy.cfg}"
 
 . "$ROOT_DIR/scripts/lib/lib.sh"
 . "$ROOT_DIR/scripts/lib/lib_sqlite.sh"
+. "$ROOT_DIR/scripts/lib/lib_inventory.sh"
 
 usage() {
   cat >&2 << USAGE
-Usage: $0 [--prune]
+Usage: $0 [--prune | --clusters <a,b,...>]
 
 说明：
 - 优先从 SQLite(clusters) 读取业务集群与 node_port，批量调用 haproxy_route.sh add 进行同步（跳过 devops 与不存在的集群）。
 - 当 DB 不可用时回退到 CSV；指定 --prune 时，以"当前源"（DB 或 CSV）为准移除缺失环境路由。
+- 指定 --clusters 时只处理列出的集群：可访问的添加/更新路由，其余（已删除或不可访问）移除路由；仍只重载一次。
 USAGE
 }
 
 prune=0
+only_csv=""
 while [ $# -gt 0 ]; do
   case "$1" in
     --prune)
       prune=1
       shift
       ;;
+    --clusters)
+      only_csv="${2:-}"
+      [ -n "$only_csv" ] || {
+        echo "--clusters requires a comma-separated list" >&2
+        exit 2
+      }
+      shift 2
+      ;;
+    --clusters=*)
+      only_csv="${1#*=}"
+      shift
+      ;;
     -h | --help)
       usage
       exit 0
@@ -92,9 +107,29 @@ validate_cfg() {
 }
 
 acquire_lock
-trap 'release_lock' EXIT
+NODE_IPS_FILE=""
+trap 'release_lock; [ -n "$NODE_IPS_FILE" ] && rm -f "$NODE_IPS_FILE"' EXIT
 
 declare -a records
+
+# --clusters：只同步列出的集群（与 --prune 互斥，全量清理交给周期性全量同步）
+declare -A only
+only=()
+if [ -n "$only_csv" ]; then
+  if [ $prune -eq 1 ]; then
+    echo "[sync] --clusters and --prune are mutually exclusive" >&2
+    exit 2
+  fi
+  IFS=, read -r -a _only_names <<< "$only_csv"
+  IFS=$'\n\t'
+  for n in "${_only_names[@]}"; do
+    [ -n "$n" ] && [ "$n" != "devops" ] && only["$n"]=1
+  done
+  if [ ${#only[@]} -eq 0 ]; then
+    echo "[sync] no clusters to sync"
+    exit 0
+  fi
+fi
 failed_envs=()
 src="db"
 if db_is_available > /dev/null 2>&1; then
@@ -110,16 +145,28 @@ else
   mapfile -t records < <(awk -F, '$0 !~ /^\s*#/ && NF>0 && $1!="devops" {print $1","$2","$3","$6}' "$csv")
 fi
 
-if [ ${#records[@]} -eq 0 ]; then
+if [ ${#records[@]} -eq 0 ] && [ ${#only[@]} -eq 0 ]; then
   echo "[sync] no environments found from $src" >&2
   exit 0
 fi
 
+# 一次性解析全部集群节点 IP（Docker socket，每个 provider 一次查询），供每次 haproxy_route.sh add 直接读取
+NODE_IPS_FILE=$(mktemp)
+if docker_api_node_ips > "$NODE_IPS_FILE" && [ -s "$NODE_IPS_FILE" ]; then
+  export NODE_IPS_FILE
+  echo "[sync] resolved node IPs of $(wc -l < "$NODE_IPS_FILE") cluster(s) via Docker API"
+fi
+
+declare -A routed
+routed=()
 echo "[sync] adding/updating routes from $src..."
 for entry in "${records[@]}"; do
   IFS=, read -r n provider node_port extra <<< "$entry"
   IFS=$'\n\t'
   [ -n "${n:-}" ] || continue
+  if [ ${#only[@]} -gt 0 ] && [ -z "${only[$n]:-}" ]; then
+    continue
+  fi
   # CSV 模式下若提供 haproxy_route 标志，尊重之
   if [ "$src" = "csv" ] && [ -n "${extra:-}" ] && ! is_true "$extra"; then
     continue
@@ -132,13 +179,21 @@ for entry in "${records[@]}"; do
   fi
   p="${node_port:-30080}"
   if NO_RELOAD=1 "$ROOT_DIR"/scripts/haproxy_route.sh add "$n" --node-port "$p"; then
-    :
+    routed["$n"]=1
   else
     echo "[sync] ERROR: failed to add route for $n ($provider)" >&2
     failed_envs+=("$n")
   fi
 done
 
+# 列出但未添加路由的集群（已删除、不在当前源或不可访问）：移除其路由
+for n in "${!only[@]}"; do
+  [ -n "${routed[$n]:-}" ] && continue
+  if grep -q "acl host_${n} " "$CFG" || grep -q "backend be_${n}\$" "$CFG"; then
+    NO_RELOAD=1 "$ROOT_DIR"/scripts/haproxy_route.sh remove "$n" || true
+  fi
+done
+
 if [ $prune -eq 1 ]; then
   echo "[sync] pruning routes not present in $src..."
   # collect existing env names from haproxy.cfg (host_ ACL markers)
@@ -0,0 +1,86 @@
+#!/usr/bin/env bash
+# k3d/kind 集群清单查询库
+# 优先向 WebUI 后端的内存清单（/api/inventory，由 Docker 事件流维护）查询集群是否存在及节点 IP，
+# 后端不可用、清单未同步（503）或响应不是清单应答时返回非零，调用方回退到 k3d/kind/docker inspect 命令。
+# 节点 IP 另可直接经 Docker socket 查询（webui/backend/app/docker_api.py，仅依赖标准库），
+# 每个 provider 一次带标签过滤的 GET /containers/json 即可得到全部集群的 IP。
+
+# 后端端口默认不发布到宿主机（宿主机 8000 属于 HAProxy → Portainer Edge），因此默认经
+# docker exec 在后端容器内访问 127.0.0.1:8000（与 lib_sqlite.sh 相同）；在后端容器内则直接访问。
+# KINDLER_API_URL：显式指定可直达后端的地址（如在 compose 中发布了后端端口），设置后直接 curl。
+KINDLER_API_URL="${KINDLER_API_URL:-}"
+KINDLER_API_CONTAINER="${KINDLER_API_CONTAINER:-kindler-webui-backend}"
+# INVENTORY_API=0 关闭清单查询，始终直接调用 k3d/kind/docker
+INVENTORY_API="${INVENTORY_API:-1}"
+INVENTORY_API_TIMEOUT="${INVENTORY_API_TIMEOUT:-2}"
+DOCKER_API_PY="${DOCKER_API_PY:-$(cd -- "$(dirname -- "${BASH_SOURCE[0]}")/../.." && pwd)/webui/backend/app/docker_api.py}"
+# NODE_IPS_FILE：预先解析的 "<集群> <provider> <IP>" 列表（haproxy_sync.sh 每轮生成一次）
+
+# 请求 /api/inventory$1，输出响应体
+# 仅接受带 X-Kindler-Inventory 头的 2xx 响应：地址指错时其他服务的 2xx 不会被当作集群清单
+_inventory_get() {
+  [ "$INVENTORY_API" = "1" ] || return 1
+  local path="/api/inventory$1" response
+  local -a curl_args=(curl -fsS -i --max-time "$INVENTORY_API_TIMEOUT")
+  if [ -n "$KINDLER_API_URL" ]; then
+    command -v curl > /dev/null 2>&1 || return 1
+    response=$("${curl_args[@]}" "${KINDLER_API_URL}${path}" 2> /dev/null) || return 1
+  elif [ -d /data/kindler-webui ] && command -v curl > /dev/null 2>&1; then
+    response=$("${curl_args[@]}" "http://127.0.0.1:8000${path}" 2> /dev/null) || return 1
+  else
+    command -v docker > /dev/null 2>&1 || return 1
+    response=$(docker exec "$KINDLER_API_CONTAINER" "${curl_args[@]}" "http://127.0.0.1:8000${path}" 2> /dev/null) || return 1
+  fi
+  printf '%s\n' "$response" | awk '
+    head { sub(/\r$/, ""); if ($0 == "") { head = 0; next } if (tolower($0) ~ /^x-kindler-inventory:/) ok = 1; next }
+    ok { print }
+    BEGIN { head = 1 }
+    END { exit ok ? 0 : 1 }
+  '
+}
+
+# 列出某个 provider 的集群（每行一个，与 kind get clusters 输出一致）
+# 参数：$1 = k3d | kind
+# 返回：0 = 结果来自清单（可能为空）；1 = 清单不可用
+inventory_list_clusters() {
+  local provider="$1" out
+  out=$(_inventory_get "/clusters?provider=${provider}&format=text") || return 1
+  [ -n "$out" ] && printf '%s\n' "$out"
+  return 0
+}
+
+# 经 Docker socket 解析全部集群的节点 IP（每行 "<集群> <provider> <IP>"）
+# 参数：$1 = k3d | kind（可选）
+# 返回：0 = 成功；非零 = python3 不可用或无法访问 Docker socket
+docker_api_node_ips() {
+  command -v python3 > /dev/null 2>&1 || return 1
+  [ -f "$DOCKER_API_PY" ] || return 1
+  if [ -n "${1:-}" ]; then
+    python3 "$DOCKER_API_PY" node-ips --provider "$1" 2> /dev/null
+  else
+    python3 "$DOCKER_API_PY" node-ips 2> /dev/null
+  fi
+}
+
+# 查询集群节点 IP（HAProxy 后端地址，选择规则与 haproxy_route.sh add_backend 相同）
+# 依次尝试：NODE_IPS_FILE → 后端清单 → Docker socket（docker_api.py）
+# 参数：$1 = 集群名；$2 = k3d | kind（可选；同名的 k3d 与 kind 集群可能同时存在）
+# 返回：0 并输出 IP；1 = 均不可用或未找到
+inventory_cluster_ip() {
+  local name="$1" provider="${2:-}" ip=""
+  if [ -n "${NODE_IPS_FILE:-}" ] && [ -s "$NODE_IPS_FILE" ]; then
+    ip=$(awk -v n="$name" -v p="$provider" '$1==n && (p=="" || $2==p) {print $3; exit}' "$NODE_IPS_FILE")
+  fi
+  if [ -z "$ip" ]; then
+    ip=$(_inventory_get "/clusters/${name}/ip${provider:+?provider=${provider}}") || ip=""
+  fi
+  if [ -z "$ip" ] && command -v python3 > /dev/null 2>&1 && [ -f "$DOCKER_API_PY" ]; then
+    if [ -n "$provider" ]; then
+      ip=$(python3 "$DOCKER_API_PY" ip "$name" --provider "$provider" 2> /dev/null) || ip=""
+    else
+      ip=$(python3 "$DOCKER_API_PY" ip "$name" 2> /dev/null) || ip=""
+    fi
+  fi
+  [ -n "$ip" ] || return 1
+  printf '%s\n' "$ip"
+}
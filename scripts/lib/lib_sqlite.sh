@@ -17,8 +17,110 @@ _is_in_container() {
   }
 }
 
+# 持久查询通道：每个脚本进程只启动一个 sqlite3（容器内直接执行，主机上一次 docker exec），
+# 之后的语句都通过同一管道发送，用结束标记分隔每批输出。
+# SQLITE_SESSION=0 可退回到每条查询单独启动 sqlite3 的旧方式。
+SQLITE_SESSION="${SQLITE_SESSION:-1}"
+SQLITE_SESSION_TIMEOUT="${SQLITE_SESSION_TIMEOUT:-60}"
+_SQLITE_SESSION_PID=""
+_SQLITE_SESSION_IN=""
+_SQLITE_SESSION_OUT=""
+_SQLITE_SESSION_TRIED=false
+_SQLITE_SESSION_MARK="__kindler_sqlite_done_$$_${RANDOM}__"
+
+_sqlite_session_alive() {
+  [ -n "$_SQLITE_SESSION_PID" ] && kill -0 "$_SQLITE_SESSION_PID" 2>/dev/null
+}
+
+# 启动持久 sqlite3 会话并完成一次表结构初始化
+# 需在脚本主进程中调用（$(...) 子 shell 中启动的会话无法被后续查询复用）
+sqlite_session_start() {
+  [ "$SQLITE_SESSION" = "1" ] || return 1
+  _sqlite_session_alive && return 0
+  _SQLITE_SESSION_TRIED=true
+
+  local -a cmd
+  if _is_in_container; then
+    command -v sqlite3 >/dev/null 2>&1 || return 1
+    cmd=(sqlite3 -batch -cmd ".timeout 5000" "$SQLITE_DB")
+  elif docker ps --format '{{.Names}}' 2>/dev/null | grep -q "^${SQLITE_CONTAINER}$"; then
+    cmd=(docker exec -i "$SQLITE_CONTAINER" sqlite3 -batch -cmd ".timeout 5000" "$SQLITE_DB")
+  else
+    return 1
+  fi
+  _ensure_db_dir || return 1
+
+  coproc KINDLER_SQLITE { "${cmd[@]}" 2>&1; }
+  _SQLITE_SESSION_PID="$KINDLER_SQLITE_PID"
+  # 复制为普通文件描述符，$(...) 子 shell 中也可使用
+  exec {_SQLITE_SESSION_IN}>&"${KINDLER_SQLITE[1]}" {_SQLITE_SESSION_OUT}<&"${KINDLER_SQLITE[0]}"
+
+  if ! _sqlite_session_exec "SELECT 1;" >/dev/null; then
+    sqlite_session_stop
+    return 1
+  fi
+  _init_db_if_needed
+}
+
+# 关闭持久会话（进程退出时会自动关闭，通常无需调用）
+sqlite_session_stop() {
+  if [ -n "$_SQLITE_SESSION_IN" ]; then
+    exec {_SQLITE_SESSION_IN}>&- 2>/dev/null || true
+  fi
+  if [ -n "$_SQLITE_SESSION_OUT" ]; then
+    exec {_SQLITE_SESSION_OUT}<&- 2>/dev/null || true
+  fi
+  if [ -n "$_SQLITE_SESSION_PID" ]; then
+    kill "$_SQLITE_SESSION_PID" 2>/dev/null || true
+  fi
+  _SQLITE_SESSION_PID=""
+  _SQLITE_SESSION_IN=""
+  _SQLITE_SESSION_OUT=""
+}
+
+# 主进程中首次查询时自动启动会话（只尝试一次）
+_sqlite_session_autostart() {
+  _sqlite_session_alive && return 0
+  if ! $_SQLITE_SESSION_TRIED && [ "$BASHPID" = "$$" ]; then
+    sqlite_session_start >/dev/null 2>&1 || true
+  fi
+}
+
+# 通过持久会话执行一批 SQL，输出与单次 sqlite3 相同（含错误信息）
+# 出错时回滚未结束的事务，返回 1
+_sqlite_session_exec() {
+  local sql="$1" line rc=0 finished=false
+  printf '%s\n;\n.print %s\n' "$sql" "$_SQLITE_SESSION_MARK" >&"$_SQLITE_SESSION_IN" || {
+    sqlite_session_stop
+    return 1
+  }
+  while IFS= read -r -t "$SQLITE_SESSION_TIMEOUT" -u "$_SQLITE_SESSION_OUT" line; do
+    if [ "$line" = "$_SQLITE_SESSION_MARK" ]; then
+      finished=true
+      break
+    fi
+    case "$line" in
+      "Parse error"* | "Runtime error"* | "Error:"*) rc=1 ;;
+    esac
+    printf '%s\n' "$line"
+  done
+  if ! $finished; then
+    echo "[ERROR] SQLite session did not answer within ${SQLITE_SESSION_TIMEOUT}s, closing it" >&2
+    sqlite_session_stop
+    return 1
+  fi
+  if [ "$rc" -ne 0 ]; then
+    # 与单次进程退出时一样，不留下未提交的事务
+    printf 'ROLLBACK;\n.print %s\n' "$_SQLITE_SESSION_MARK" >&"$_SQLITE_SESSION_IN"
+    while IFS= read -r -t "$SQLITE_SESSION_TIMEOUT" -u "$_SQLITE_SESSION_OUT" line; do
+      [ "$line" = "$_SQLITE_SESSION_MARK" ] && break
+    done
+  fi
+  return "$rc"
+}
+
 # 在容器内执行 SQLite 命令（如果不在容器内，通过 docker exec）
-# 支持直接字符串参数或 heredoc
+# 支持直接字符串参数或 heredoc；有持久会话时走会话
 _sqlite_exec() {
   local sql
   if [ $# -eq 0 ]; then
@@ -29,6 +131,11 @@ _sqlite_exec() {
     sql="$1"
   fi
   
+  if _sqlite_session_alive; then
+    _sqlite_session_exec "$sql"
+    return
+  fi
+  
   if _is_in_container; then
     # 在容器内，直接执行
     echo "$sql" | sqlite3 -cmd ".timeout 5000" "$SQLITE_DB" 2>&1
@@ -43,6 +150,7 @@ _sqlite_exec() {
 
 # 确保数据库目录存在
 _ensure_db_dir() {
+  [ "${_SQLITE_READY_DB:-}" = "$SQLITE_DB" ] && return 0
   local db_dir=$(dirname "$SQLITE_DB")
   
   if _is_in_container; then
@@ -65,8 +173,9 @@ _ensure_db_dir() {
   fi
 }
 
-# 初始化数据库表结构（如果不存在）
+# 初始化数据库表结构（如果不存在）；在主进程中成功一次后不再重复
 _init_db_if_needed() {
+  [ "${_SQLITE_READY_DB:-}" = "$SQLITE_DB" ] && return 0
   _ensure_db_dir || return 1
   
   # 使用 _sqlite_exec 检查表是否存在，不存在则创建
@@ -109,6 +218,7 @@ EOF
     fi
     rm -f /tmp/.kindler_cols 2>/dev/null || true
   fi
+  _SQLITE_READY_DB="$SQLITE_DB"
 }
 
 # 执行 SQL 查询（并发安全，使用文件锁）
@@ -118,6 +228,7 @@ sqlite_query() {
   local sql="$1"
   
   # 确保数据库已初始化
+  _sqlite_session_autostart
   _init_db_if_needed || return 1
   
   # 使用 flock 加锁，确保并发安全（独占锁）
@@ -136,6 +247,7 @@ sqlite_query() {
 sqlite_transaction() {
   local sql="$1"
   
+  _sqlite_session_autostart
   _init_db_if_needed || return 1
   
   (
@@ -143,11 +255,17 @@ sqlite_transaction() {
       echo "[ERROR] Failed to acquire database lock after 30s" >&2
       return 1
     }
-    _sqlite_exec <<EOF
+    if _sqlite_session_alive; then
+      # 会话中任一语句出错则整体回滚，不提交部分结果
+      _sqlite_session_exec "BEGIN IMMEDIATE TRANSACTION;
+$sql" && _sqlite_session_exec "COMMIT;"
+    else
+      _sqlite_exec <<EOF
 BEGIN IMMEDIATE TRANSACTION;
 $sql
 COMMIT;
 EOF
+    fi
   ) 200>"$SQLITE_LOCK" 2>&1
 }
 
@@ -217,7 +335,11 @@ sqlite_delete_cluster() {
     echo "[ERROR] sqlite_delete_cluster: name is required" >&2
     return 1
   fi
-  sqlite_transaction "DELETE FROM clusters WHERE name = '$name';" >/dev/null
+  sqlite_transaction "
+$_SQLITE_ALLOCATIONS_DDL
+DELETE FROM clusters WHERE name = '$name';
+DELETE FROM allocations WHERE owner = '$name';
+" >/dev/null
 }
 
 # 查询集群记录（与 db_get_cluster 相同的接口）
@@ -304,25 +426,152 @@ sqlite_subnet_in_use() {
   [ "${count:-0}" -gt 0 ]
 }
 
-# 获取下一个可用端口（原子操作，并发安全）
+# 端口/子网分配（与 webui/backend/app/db.py 的 allocate()/PORT_RANGES 保持一致）
+# 所有主机端口共用 "port" 池，子网为 10.<n>.0.0/16（池内的值为 <n>）
+SQLITE_PF_PORT_RANGE="${SQLITE_PF_PORT_RANGE:-19001 19999}"
+SQLITE_HTTP_PORT_RANGE="${SQLITE_HTTP_PORT_RANGE:-20000 20999}"
+SQLITE_HTTPS_PORT_RANGE="${SQLITE_HTTPS_PORT_RANGE:-21000 21999}"
+SQLITE_SUBNET_RANGE="${SQLITE_SUBNET_RANGE:-101 254}"
+
+_SQLITE_ALLOCATIONS_DDL="CREATE TABLE IF NOT EXISTS allocations (
+  pool TEXT NOT NULL,
+  value INTEGER NOT NULL,
+  owner TEXT NOT NULL,
+  purpose TEXT NOT NULL,
+  allocated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (pool, value)
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_allocations_owner ON allocations(owner, purpose);"
+
+# 生成查找空闲值的单条 SQL（已用值排序一次，取第一个后继缺失的值）
+# 参数：$1 = 池（port|subnet），$2 = 起始值，$3 = 结束值
+_sqlite_free_value_sql() {
+  local pool="$1" lo="$2" hi="$3" used
+  if [ "$pool" = "subnet" ]; then
+    used="SELECT CAST(substr(subnet, 4, instr(substr(subnet, 4), '.') - 1) AS INTEGER) AS v
+      FROM clusters WHERE subnet LIKE '10.%.0.0/16' AND v BETWEEN $lo AND $hi"
+  else
+    used="SELECT pf_port FROM clusters WHERE pf_port BETWEEN $lo AND $hi
+      UNION SELECT http_port FROM clusters WHERE http_port BETWEEN $lo AND $hi
+      UNION SELECT https_port FROM clusters WHERE https_port BETWEEN $lo AND $hi
+      UNION SELECT node_port FROM clusters WHERE node_port BETWEEN $lo AND $hi"
+  fi
+  cat <<EOF
+WITH used(v) AS (
+  SELECT $lo - 1
+  UNION SELECT value FROM allocations WHERE pool = '$pool' AND value BETWEEN $lo AND $hi
+  UNION $used
+)
+SELECT v + 1 AS free_value FROM (SELECT v, LEAD(v) OVER (ORDER BY v) AS next FROM used)
+WHERE (next IS NULL OR next > v + 1) AND v + 1 <= $hi
+ORDER BY v LIMIT 1
+EOF
+}
+
+_sqlite_is_int() {
+  case "$1" in
+    '' | *[!0-9]*) return 1 ;;
+    *) return 0 ;;
+  esac
+}
+
+# 为 owner 预留池中 [lo, hi] 内最小的空闲值（BEGIN IMMEDIATE 内一次查询完成）
+# 同一 owner + purpose 重复调用返回已有的预留
+# 参数：$1 = 池（port|subnet），$2 = owner（集群名），$3 = 用途，$4 = 起始值，$5 = 结束值
+# 返回：预留的值（stdout）；范围耗尽时返回 1
+sqlite_allocate() {
+  local pool="$1" owner="$2" purpose="$3" lo="$4" hi="$5"
+  if [ "$pool" != "port" ] && [ "$pool" != "subnet" ]; then
+    echo "[ERROR] sqlite_allocate: unknown pool '$pool'" >&2
+    return 1
+  fi
+  if [ -z "$owner" ] || [ -z "$purpose" ] || ! _sqlite_is_int "$lo" || ! _sqlite_is_int "$hi"; then
+    echo "[ERROR] sqlite_allocate: owner, purpose, start and end are required" >&2
+    return 1
+  fi
+  owner=$(printf '%s' "$owner" | sed "s/'/''/g")
+  purpose=$(printf '%s' "$purpose" | sed "s/'/''/g")
+
+  local value
+  value=$(sqlite_transaction "
+$_SQLITE_ALLOCATIONS_DDL
+INSERT INTO allocations (pool, value, owner, purpose)
+SELECT '$pool', free.free_value, '$owner', '$purpose'
+FROM ($(_sqlite_free_value_sql "$pool" "$lo" "$hi")) AS free
+WHERE NOT EXISTS (SELECT 1 FROM allocations WHERE owner = '$owner' AND purpose = '$purpose');
+SELECT value FROM allocations WHERE owner = '$owner' AND purpose = '$purpose';
+" | tr -d ' \n')
+
+  if ! _sqlite_is_int "$value"; then
+    echo "[ERROR] 没有可用的 $pool 在 $lo-$hi 范围内${value:+: $value}" >&2
+    return 1
+  fi
+  echo "$value"
+}
+
+# 预留主机端口
+# 参数：$1 = 集群名，$2 = 用途（pf_port|http_port|https_port）
+sqlite_allocate_port() {
+  local owner="$1" purpose="$2" range
+  case "$purpose" in
+    pf_port) range="$SQLITE_PF_PORT_RANGE" ;;
+    http_port) range="$SQLITE_HTTP_PORT_RANGE" ;;
+    https_port) range="$SQLITE_HTTPS_PORT_RANGE" ;;
+    *)
+      echo "[ERROR] sqlite_allocate_port: unknown purpose '$purpose'" >&2
+      return 1
+      ;;
+  esac
+  sqlite_allocate port "$owner" "$purpose" "${range% *}" "${range#* }"
+}
+
+# 预留集群子网（10.<n>.0.0/16）
+# 参数：$1 = 集群名
+sqlite_allocate_subnet() {
+  local n
+  n=$(sqlite_allocate subnet "$1" subnet "${SQLITE_SUBNET_RANGE% *}" "${SQLITE_SUBNET_RANGE#* }") || return 1
+  echo "10.${n}.0.0/16"
+}
+
+# 释放预留
+# 参数：$1 = 集群名，$2 = 用途（可选，缺省释放全部）
+sqlite_release_allocations() {
+  local owner purpose="${2:-}" where
+  owner=$(printf '%s' "${1:-}" | sed "s/'/''/g")
+  if [ -z "$owner" ]; then
+    echo "[ERROR] sqlite_release_allocations: owner is required" >&2
+    return 1
+  fi
+  where="owner = '$owner'"
+  [ -n "$purpose" ] && where="$where AND purpose = '$(printf '%s' "$purpose" | sed "s/'/''/g")'"
+  sqlite_transaction "
+$_SQLITE_ALLOCATIONS_DDL
+DELETE FROM allocations WHERE $where;
+" >/dev/null
+}
+
+# 获取下一个可用端口（单条查询，不预留；需要预留请用 sqlite_allocate_port）
 # 参数：$1 = 起始端口，$2 = 结束端口
 # 返回：可用端口号
 sqlite_next_available_port() {
   local start="$1"
   local end="$2"
   
-  if [ -z "$start" ] || [ -z "$end" ]; then
+  if ! _sqlite_is_int "$start" || ! _sqlite_is_int "$end"; then
     echo "[ERROR] sqlite_next_available_port: start and end ports are required" >&2
     return 1
   fi
   
-  # 使用事务确保端口分配的原子性
-  for port in $(seq "$start" "$end"); do
-    if ! sqlite_port_in_use "$port"; then
-      echo "$port"
-      return 0
-    fi
-  done
+  local port
+  port=$(sqlite_transaction "
+$_SQLITE_ALLOCATIONS_DDL
+$(_sqlite_free_value_sql port "$start" "$end");
+" 2>/dev/null | tr -d ' \n')
+  
+  if _sqlite_is_int "$port"; then
+    echo "$port"
+    return 0
+  fi
   
   echo "[ERROR] 没有可用端口在 $start-$end 范围内" >&2
   return 1
@@ -331,6 +580,7 @@ sqlite_next_available_port() {
 # 检查数据库是否可用
 # 返回：0 = 可用，1 = 不可用
 sqlite_is_available() {
+  _sqlite_session_autostart
   _ensure_db_dir || return 1
   
   # 尝试初始化数据库（如果不存在）
@@ -382,6 +632,18 @@ db_next_available_port() {
   sqlite_next_available_port "$@"
 }
 
+db_allocate_port() {
+  sqlite_allocate_port "$@"
+}
+
+db_allocate_subnet() {
+  sqlite_allocate_subnet "$@"
+}
+
+db_release_allocations() {
+  sqlite_release_allocations "$@"
+}
+
 db_is_available() {
   sqlite_is_available "$@"
 }
@@ -2,7 +2,7 @@
 set -Eeuo pipefail
 IFS=$'\n\t'
 # Description: Declarative reconciliation entrypoint that converges SQLite desired state and final sync steps.
-# Usage: scripts/reconcile.sh [--from-db] [--dry-run] [--prune-missing]
+# Usage: scripts/reconcile.sh [--from-db] [--dry-run] [--prune-missing] [--clusters <a,b,...>]
 # Category: gitops
 # Status: stable
 # See also: scripts/reconciler.sh, scripts/create_env.sh, scripts/delete_env.sh
@@ -10,6 +10,7 @@ IFS=$'\n\t'
 ROOT_DIR="$(cd -- "$(dirname -- "$0")/.." && pwd)"
 . "$ROOT_DIR/scripts/lib/lib.sh"
 . "$ROOT_DIR/scripts/lib/lib_sqlite.sh"
+. "$ROOT_DIR/scripts/lib/lib_inventory.sh"
 
 ORIGINAL_ARGS=("$@")
 START_EPOCH=$(date +%s)
@@ -39,6 +40,8 @@ Options:
   --from-db             Read desired state from SQLite and create/delete clusters to match it.
   --dry-run             Plan actions without mutating resources (implies --from-db). Exits non-zero when drift exists.
   --prune-missing       Remove SQLite rows for clusters that no longer exist (skips devops).
+  --clusters <a,b,...>  Limit the final HAProxy sync to these clusters (add/remove their routes)
+                        instead of the full haproxy_sync.sh --prune resync.
   --history-file <path> Override reconcile history JSONL path (default: logs/reconcile_history.jsonl).
   --last-run            Print the most recent history entry and exit (combine with --json for raw output).
   --json                When used with --last-run, output only the JSON entry (no formatting).
@@ -48,6 +51,7 @@ Examples:
   scripts/reconcile.sh --from-db
   scripts/reconcile.sh --dry-run
   scripts/reconcile.sh --prune-missing
+  scripts/reconcile.sh --clusters dev,uat
   scripts/reconcile.sh --last-run --json
 USAGE
 }
@@ -175,6 +179,7 @@ PY
 FROM_DB=false
 DRY_RUN=false
 PRUNE_MISSING=false
+SYNC_CLUSTERS=""
 
 PLAN_COUNT=0
 FAILED_COUNT=0
@@ -202,6 +207,18 @@ while [ $# -gt 0 ]; do
       PRUNE_MISSING=true
       shift
       ;;
+    --clusters)
+      if [ -z "${2:-}" ]; then
+        log_error "--clusters requires a comma-separated list"
+        exit 1
+      fi
+      SYNC_CLUSTERS="$2"
+      shift 2
+      ;;
+    --clusters=*)
+      SYNC_CLUSTERS="${1#*=}"
+      shift
+      ;;
     --history-file)
       if [ -z "${2:-}" ]; then
         log_error "--history-file requires a path"
@@ -263,24 +280,28 @@ update_cluster_record() {
   local status="$3"
   local err_msg="${4:-}"
 
-  local esc_name esc_status esc_actual err_clause
+  local esc_name esc_status esc_actual err_value
   esc_name="$(sql_escape "$name")"
   esc_status="$(sql_escape "${status:-unknown}")"
   esc_actual="$(sql_escape "${actual:-unknown}")"
 
   if [ -n "$err_msg" ]; then
-    err_clause="reconcile_error='$(sql_escape "$err_msg")'"
+    err_value="'$(sql_escape "$err_msg")'"
   else
-    err_clause="reconcile_error=NULL"
+    err_value="NULL"
   fi
 
+  # 仅在状态确有变化时写入：每次写都会递增 resource_version（使 ETag 失效、触发 watch 事件）
   sqlite_transaction "
     UPDATE clusters
        SET actual_state='${esc_actual}',
            status='${esc_status}',
            last_reconciled_at=datetime('now'),
-           ${err_clause}
-     WHERE name='${esc_name}';
+           reconcile_error=${err_value}
+     WHERE name='${esc_name}'
+       AND (actual_state IS NOT '${esc_actual}'
+            OR status IS NOT '${esc_status}'
+            OR reconcile_error IS NOT ${err_value});
   " > /dev/null 2>&1 || true
 }
 
@@ -288,6 +309,7 @@ K3D_CACHE=""
 KIND_CACHE=""
 
 list_k3d_clusters() {
+  inventory_list_clusters k3d && return 0
   command -v k3d > /dev/null 2>&1 || return 0
   if command -v jq > /dev/null 2>&1; then
     k3d cluster list -o json 2> /dev/null | jq -r '.[].name' 2> /dev/null || true
@@ -297,6 +319,7 @@ list_k3d_clusters() {
 }
 
 list_kind_clusters() {
+  inventory_list_clusters kind && return 0
   command -v kind > /dev/null 2>&1 || return 0
   kind get clusters 2> /dev/null | tr -d '\r' || true
 }
@@ -334,6 +357,8 @@ record_summary() {
 }
 
 ensure_sqlite_online() {
+  # One sqlite3 process (one docker exec on the host) for every query of this run
+  sqlite_session_start > /dev/null 2>&1 || true
   if ! sqlite_is_available > /dev/null 2>&1; then
     log_error "SQLite database is not reachable (is kindler-webui-backend running?)"
     exit 2
@@ -568,8 +593,14 @@ run_final_sync() {
   fi
 
   if [ -x "$ROOT_DIR/scripts/haproxy_sync.sh" ]; then
-    log_info "Reconciling HAProxy routes (with prune)..."
-    NO_RELOAD=0 "$ROOT_DIR/scripts/haproxy_sync.sh" --prune 2>&1 | sed 's/^/  /' || true
+    if [ -n "$SYNC_CLUSTERS" ]; then
+      # 只处理本轮变更的集群；全量 --prune 留给周期性全量同步
+      log_info "Reconciling HAProxy routes for: $SYNC_CLUSTERS"
+      NO_RELOAD=0 "$ROOT_DIR/scripts/haproxy_sync.sh" --clusters "$SYNC_CLUSTERS" 2>&1 | sed 's/^/  /' || true
+    else
+      log_info "Reconciling HAProxy routes (with prune)..."
+      NO_RELOAD=0 "$ROOT_DIR/scripts/haproxy_sync.sh" --prune 2>&1 | sed 's/^/  /' || true
+    fi
   fi
 
   log_info "Final convergence complete."
@@ -0,0 +1,85 @@
+#!/usr/bin/env bash
+# reconcile.sh --dry-run 耗时对比：每条查询一个 sqlite3 进程 vs 持久会话
+# 用临时数据库和伪造的 k3d/kind 命令，不需要真实集群
+# 用法：tests/bench_reconcile_dry_run.sh [集群数量，默认 100] [重复次数，默认 3]
+
+set -Eeuo pipefail
+IFS=$'\n\t'
+
+ROOT_DIR="$(cd "$(dirname "$0")/.." && pwd)"
+CLUSTERS="${1:-100}"
+REPEAT="${2:-3}"
+
+command -v sqlite3 > /dev/null 2>&1 || {
+  echo "[SKIP] sqlite3 not found"
+  exit 0
+}
+
+WORKDIR="$(mktemp -d)"
+trap 'rm -rf "$WORKDIR"' EXIT
+
+export SQLITE_DB="$WORKDIR/kindler.db"
+export SQLITE_LOCK="$WORKDIR/kindler.lock"
+
+# 一半 k3d、一半 kind；每 4 个中有 1 个不存在（dry-run 计划创建），其余走“已存在”分支并回写状态
+{
+  echo "CREATE TABLE clusters (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL, provider TEXT NOT NULL,
+    subnet TEXT, node_port INTEGER, pf_port INTEGER, http_port INTEGER, https_port INTEGER, server_ip TEXT,
+    status TEXT DEFAULT 'unknown', desired_state TEXT DEFAULT 'present', actual_state TEXT DEFAULT 'unknown',
+    last_reconciled_at TIMESTAMP, reconcile_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);"
+  for i in $(seq 1 "$CLUSTERS"); do
+    provider=k3d
+    [ $((i % 2)) -eq 0 ] && provider=kind
+    echo "INSERT INTO clusters (name, provider, node_port, pf_port, http_port, https_port)
+      VALUES ('bench-$i', '$provider', 30080, $((19000 + i)), $((20000 + i)), $((21000 + i)));"
+  done
+} | sqlite3 "$SQLITE_DB"
+
+mkdir -p "$WORKDIR/bin"
+for i in $(seq 1 "$CLUSTERS"); do
+  [ $((i % 4)) -eq 0 ] && continue
+  if [ $((i % 2)) -eq 0 ]; then echo "bench-$i" >> "$WORKDIR/kind.list"; else echo "bench-$i" >> "$WORKDIR/k3d.list"; fi
+done
+cat > "$WORKDIR/bin/k3d" << EOF
+#!/usr/bin/env bash
+if [ "\${3:-}" = "-o" ]; then
+  sed 's/.*/{"name":"&"}/' "$WORKDIR/k3d.list" | paste -sd, | sed 's/^/[/; s/\$/]/'
+else
+  echo "NAME SERVERS AGENTS"
+  sed 's/\$/ 1\/1 0\/0/' "$WORKDIR/k3d.list"
+fi
+EOF
+cat > "$WORKDIR/bin/kind" << EOF
+#!/usr/bin/env bash
+cat "$WORKDIR/kind.list"
+EOF
+# 统计 sqlite3 进程数（在主机上每个都是一次 docker exec）
+cat > "$WORKDIR/bin/sqlite3" << EOF
+#!/usr/bin/env bash
+echo x >> "$WORKDIR/sqlite3.count"
+exec "$(command -v sqlite3)" "\$@"
+EOF
+chmod +x "$WORKDIR/bin/k3d" "$WORKDIR/bin/kind" "$WORKDIR/bin/sqlite3"
+
+run() {
+  local mode="$1" start end best=""
+  for _ in $(seq 1 "$REPEAT"); do
+    : > "$WORKDIR/sqlite3.count"
+    start=$(date +%s%N)
+    PATH="$WORKDIR/bin:$PATH" SQLITE_SESSION="$mode" \
+      "$ROOT_DIR/scripts/reconcile.sh" --dry-run --history-file "$WORKDIR/history.jsonl" > "$WORKDIR/out.$mode" 2>&1 || true
+    end=$(date +%s%N)
+    local ms=$(((end - start) / 1000000))
+    if [ -z "$best" ] || [ "$ms" -lt "$best" ]; then best="$ms"; fi
+  done
+  echo "$best ms, $(wc -l < "$WORKDIR/sqlite3.count") sqlite3 processes"
+}
+
+per_query=$(run 0)
+session=$(run 1)
+planned=$(grep -c "planned" "$WORKDIR/out.1" || true)
+
+echo "reconcile.sh --dry-run over $CLUSTERS clusters ($planned planned, best of $REPEAT)"
+echo "  one sqlite3 per query (SQLITE_SESSION=0): ${per_query}"
+echo "  persistent session    (SQLITE_SESSION=1): ${session}"
@@ -1,14 +1,26 @@
 """Cluster management API endpoints"""
+import asyncio
+import base64
+import hashlib
+import json
 import logging
-from typing import List
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-
-from ..models.cluster import ClusterCreate, ClusterInfo, ClusterStatus, ClusterUpdate
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from ..db import PORT_RANGES
+from ..models.cluster import ClusterCreate, ClusterInfo, ClusterStatus, ClusterUpdate, cluster_to_info_dict
 from ..models.task import TaskCreate
-from ..services.db_service import DBService
+from ..services.db_service import db_service
 from ..services.cluster_service import ClusterService
+from ..services.health_monitor import health_monitor
+from ..services.operation_scheduler import operation_scheduler
+from ..services.prober import http_prober
 from ..services.reconcile_service import reconciler
 from ..services.task_manager import task_manager
+from ..services.watch_service import cluster_watch, WatchExpired
 from ..websocket.manager import ws_manager
 
 logger = logging.getLogger(__name__)
@@ -16,43 +28,136 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/clusters", tags=["clusters"])
 
 # Service instances
-db_service = DBService()
 cluster_service = ClusterService()
 
 
+# ClusterInfo field -> clusters table column(s) needed to build it
+_FIELD_COLUMNS = {
+    "name": ["name"],
+    "provider": ["provider"],
+    "node_port": ["node_port"],
+    "pf_port": ["pf_port"],
+    "http_port": ["http_port"],
+    "https_port": ["https_port"],
+    "cluster_subnet": ["subnet"],
+    "register_portainer": [],
+    "haproxy_route": [],
+    "register_argocd": [],
+    "status": ["actual_state"],
+    "created_at": ["created_at"],
+    "updated_at": ["updated_at"],
+    "desired_state": ["desired_state"],
+    "actual_state": ["actual_state"],
+    "last_reconciled_at": ["last_reconciled_at"],
+    "reconcile_error": ["reconcile_error"],
+    "resource_version": ["resource_version"],
+}
+
+MAX_PAGE_SIZE = 500
+
+
+def _encode_cursor(cluster: Dict[str, Any]) -> str:
+    """Opaque keyset cursor from the last row of a page"""
+    raw = json.dumps([cluster.get("created_at"), cluster.get("id")])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(created_at), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid 'after' cursor")
+
+
+def _etag(opaque: str) -> str:
+    """Weak ETag: versions track the data, not the exact bytes sent"""
+    return f'W/"{opaque}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Evaluate If-None-Match against our ETag (weak comparison, RFC 9110)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
 @router.get("", response_model=List[ClusterInfo])
-async def list_clusters():
-    """List all clusters"""
+async def list_clusters(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size (default: all)"),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    provider: Optional[str] = Query(None, pattern="^(kind|k3d)$"),
+    desired_state: Optional[str] = None,
+    actual_state: Optional[str] = None,
+    name_prefix: Optional[str] = Query(None, alias="prefix"),
+    fields: Optional[str] = Query(None, description="Comma-separated ClusterInfo fields to return"),
+):
+    """List clusters, newest first
+
+    Supports keyset pagination (``limit`` + ``after``), server-side filters and
+    an optional ``fields=`` projection. When more rows are available, the
+    cursor for the next page is returned in the ``X-Next-Cursor`` header.
+
+    Responses carry a weak ETag derived from the clusters change version and
+    the query; ``If-None-Match`` with a current ETag returns 304 after a
+    single-row lookup.
+    """
+    selected_fields = None
+    columns = None
+    if fields:
+        selected_fields = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in selected_fields if f not in _FIELD_COLUMNS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        columns = sorted({c for f in selected_fields for c in _FIELD_COLUMNS[f]} | {"name"})
+
     try:
-        db_clusters = await db_service.list_clusters()
+        # Pick up environments.csv edits (one stat() when unchanged)
+        await db_service.sync_from_csv()
+        # Read the version before the rows: a concurrent write can only make
+        # the ETag stale (forcing a refetch), never hide a change.
+        version = await db_service.get_change_version()
+        etag = None
+        if version is not None:
+            query_hash = hashlib.sha1(str(sorted(request.query_params.multi_items())).encode()).hexdigest()[:12]
+            etag = _etag(f"clusters-{version}-{query_hash}")
+            if _etag_matches(request, etag):
+                return _not_modified(etag)
+
+        db_clusters = await db_service.list_clusters(
+            # Fetch one extra row to know whether another page exists
+            limit=limit + 1 if limit else None,
+            after=_decode_cursor(after) if after else None,
+            provider=provider,
+            desired_state=desired_state,
+            actual_state=actual_state,
+            name_prefix=name_prefix,
+            columns=columns,
+        )
 
-        # 使用声明式状态作为权威来源，避免容器内 kubectl 对 0.0.0.0 的访问问题
-        result = []
-        for cluster in db_clusters:
-            cluster_info = ClusterInfo(
-                name=cluster["name"],
-                provider=cluster["provider"],
-                node_port=cluster.get("node_port", 30080),
-                pf_port=cluster.get("pf_port", 19000),
-                http_port=cluster.get("http_port", 18080),
-                https_port=cluster.get("https_port", 18443),
-                cluster_subnet=cluster.get("subnet"),
-                register_portainer=True,
-                haproxy_route=True,
-                register_argocd=True,
-                # 统一以 actual_state 为准，避免旧的 status 字段造成误判
-                status=cluster.get("actual_state") or "unknown",
-                created_at=cluster.get("created_at"),
-                updated_at=cluster.get("updated_at"),
-                desired_state=cluster.get("desired_state"),
-                actual_state=cluster.get("actual_state"),
-                last_reconciled_at=cluster.get("last_reconciled_at"),
-                reconcile_error=cluster.get("reconcile_error"),
-            )
-            result.append(cluster_info)
+        headers = {"Cache-Control": "no-cache"}
+        if etag:
+            headers["ETag"] = etag
+        if limit and len(db_clusters) > limit:
+            db_clusters = db_clusters[:limit]
+            headers["X-Next-Cursor"] = _encode_cursor(db_clusters[-1])
 
-        return result
+        # 使用声明式状态作为权威来源，避免容器内 kubectl 对 0.0.0.0 的访问问题
+        result = [cluster_to_info_dict(cluster, selected_fields) for cluster in db_clusters]
+        return JSONResponse(content=result, headers=headers)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error listing clusters: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -71,6 +176,8 @@ async def create_cluster(cluster: ClusterCreate, background_tasks: BackgroundTas
     This ensures WebUI creation is as stable as predefined cluster creation.
     """
     try:
+        # Pick up environments.csv edits (one stat() when unchanged)
+        await db_service.sync_from_csv()
         # Check if cluster already exists
         exists = await db_service.cluster_exists(cluster.name)
         if exists:
@@ -79,26 +186,40 @@ async def create_cluster(cluster: ClusterCreate, background_tasks: BackgroundTas
                 detail=f"Cluster {cluster.name} already exists"
             )
         
-        # Declare desired state in database (reconciler will handle actual creation)
-        await db_service.create_cluster({
-            "name": cluster.name,
-            "provider": cluster.provider,
-            "node_port": cluster.node_port,
-            "pf_port": cluster.pf_port,
-            "http_port": cluster.http_port,
-            "https_port": cluster.https_port,
-            "subnet": cluster.cluster_subnet,
-            "desired_state": "present",      # Declare: we want this cluster
-            "actual_state": "unknown",        # Actual: reconciler will update
-            "status": "pending"               # For compatibility
-        })
+        # Host ports the request did not set come from the allocator; the
+        # reservations are released again if the cluster is not recorded
+        ports = {purpose: getattr(cluster, purpose) for purpose in PORT_RANGES}
+        try:
+            for purpose in PORT_RANGES:
+                if purpose not in cluster.model_fields_set:
+                    try:
+                        ports[purpose] = await db_service.allocate_port(cluster.name, purpose)
+                    except ValueError as e:
+                        raise HTTPException(status_code=409, detail=str(e))
+            
+            # Declare desired state in database (reconciler will handle actual creation)
+            created = await db_service.create_cluster({
+                "name": cluster.name,
+                "provider": cluster.provider,
+                "node_port": cluster.node_port,
+                **ports,
+                "subnet": cluster.cluster_subnet,
+                "desired_state": "present",      # Declare: we want this cluster
+                "actual_state": "unknown",        # Actual: reconciler will update
+                "status": "pending"               # For compatibility
+            })
+            if not created:
+                raise HTTPException(status_code=500, detail=f"Failed to record cluster {cluster.name}")
+        except Exception:
+            await db_service.release_allocations(cluster.name)
+            raise
         
         logger.info(f"Cluster creation declared: {cluster.name} ({cluster.provider})")
         logger.info(f"Reconciler will create the cluster on host (same as predefined clusters)")
 
         # Schedule a debounced global reconcile so that batch operations converge in one pass
         try:
-            await reconciler.schedule(reason=f"create:{cluster.name}")
+            await reconciler.schedule(reason=f"create:{cluster.name}", names=[cluster.name])
         except Exception as _:
             # non-fatal
             logger.warning("Failed to schedule reconcile after create for %s", cluster.name)
@@ -116,34 +237,86 @@ async def create_cluster(cluster: ClusterCreate, background_tasks: BackgroundTas
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/watch")
+async def watch_clusters(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="Resume after this resource version"),
+):
+    """Watch cluster changes as Server-Sent Events (Kubernetes watch semantics)
+
+    Without ``since``: one ``ADDED`` event per existing cluster, then a
+    ``BOOKMARK`` carrying the snapshot version. With ``since`` (or the
+    ``Last-Event-ID`` header sent by EventSource on reconnect): only the
+    changes after that version. Then incremental ``ADDED``/``MODIFIED``/
+    ``DELETED`` events follow. Every event's SSE ``id`` is its resource
+    version. Returns 410 when ``since`` is older than the retained change
+    log; clients should then re-watch without ``since``.
+    """
+    if since is None:
+        last_event_id = request.headers.get("last-event-id", "")
+        if last_event_id.isdigit():
+            since = int(last_event_id)
+
+    await cluster_watch.start()
+    # Subscribe before reading the snapshot/replay so no change slips between them
+    queue = cluster_watch.subscribe()
+    try:
+        initial = await cluster_watch.initial_events(since)
+    except WatchExpired as e:
+        cluster_watch.unsubscribe(queue)
+        raise HTTPException(status_code=410, detail=str(e))
+    except Exception:
+        cluster_watch.unsubscribe(queue)
+        raise
+
+    async def event_stream():
+        last_version = since or 0
+        try:
+            for event in initial:
+                last_version = max(last_version, event.resource_version)
+                yield event.frame
+            while cluster_watch.is_subscribed(queue):
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=cluster_watch.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                # Already covered by the snapshot/replay
+                if event.resource_version <= last_version:
+                    continue
+                last_version = event.resource_version
+                yield event.frame
+        finally:
+            cluster_watch.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/{name}", response_model=ClusterInfo)
-async def get_cluster(name: str):
-    """Get cluster details"""
+async def get_cluster(name: str, request: Request, response: Response):
+    """Get cluster details (weak ETag = resource_version; If-None-Match → 304)"""
     try:
+        # Pick up environments.csv edits (one stat() when unchanged)
+        await db_service.sync_from_csv()
+        if request.headers.get("if-none-match"):
+            version = await db_service.get_cluster_version(name)
+            if version is not None and _etag_matches(request, _etag(f"{name}-{version}")):
+                return _not_modified(_etag(f"{name}-{version}"))
+
         cluster = await db_service.get_cluster(name)
         if not cluster:
             raise HTTPException(status_code=404, detail=f"Cluster {name} not found")
         
-        return ClusterInfo(
-            name=cluster["name"],
-            provider=cluster["provider"],
-            node_port=cluster.get("node_port", 30080),
-            pf_port=cluster.get("pf_port", 19000),
-            http_port=cluster.get("http_port", 18080),
-            https_port=cluster.get("https_port", 18443),
-            cluster_subnet=cluster.get("subnet"),
-            register_portainer=True,
-            haproxy_route=True,
-            register_argocd=True,
-            # 统一以 actual_state 为准
-            status=cluster.get("actual_state") or "unknown",
-            created_at=cluster.get("created_at"),
-            updated_at=cluster.get("updated_at"),
-            desired_state=cluster.get("desired_state"),
-            actual_state=cluster.get("actual_state"),
-            last_reconciled_at=cluster.get("last_reconciled_at"),
-            reconcile_error=cluster.get("reconcile_error"),
-        )
+        if cluster.get("resource_version") is not None:
+            response.headers["ETag"] = _etag(f"{name}-{cluster['resource_version']}")
+            response.headers["Cache-Control"] = "no-cache"
+        return ClusterInfo(**cluster_to_info_dict(cluster))
     
     except HTTPException:
         raise
@@ -165,7 +338,8 @@ async def delete_cluster(name: str, background_tasks: BackgroundTasks):
         if name == "devops":
             raise HTTPException(status_code=403, detail="devops cluster cannot be deleted")
 
-        # Check if cluster exists
+        # Pick up environments.csv edits (one stat() when unchanged)
+        await db_service.sync_from_csv()
         exists = await db_service.cluster_exists(name)
         if not exists:
             raise HTTPException(status_code=404, detail=f"Cluster {name} not found")
@@ -179,7 +353,7 @@ async def delete_cluster(name: str, background_tasks: BackgroundTasks):
 
         # Schedule a debounced global reconcile to converge deletions alongside other changes
         try:
-            await reconciler.schedule(reason=f"delete:{name}")
+            await reconciler.schedule(reason=f"delete:{name}", names=[name])
         except Exception as _:
             logger.warning("Failed to schedule reconcile after delete for %s", name)
 
@@ -219,30 +393,20 @@ async def get_cluster_status(name: str):
         # Declarative cluster state from DB
         status_overall = cluster.get("actual_state") or "unknown"
 
-        # Global service reachability (Portainer/ArgoCD via HAProxy)
-        #    Reuse simple HTTP GET with follow redirects; healthy if <500
-        import httpx
-        # Prefer configured base domain if ClusterService is available; otherwise default
-        cs = ClusterService()
-        base_domain = getattr(cs, 'base_domain', None) or "192.168.51.30.sslip.io"
-        urls = {
-            "portainer": f"http://portainer.devops.{base_domain}",
-            "argocd": f"http://argocd.devops.{base_domain}",
-        }
-        portainer_status = "unknown"
-        argocd_status = "unknown"
-        try:
-            async with httpx.AsyncClient(verify=False, timeout=5) as client:
-                pr = await client.get(urls["portainer"], follow_redirects=True)
-                portainer_status = "online" if pr.status_code < 500 else "offline"
-        except Exception:
-            portainer_status = "offline"
-        try:
-            async with httpx.AsyncClient(verify=False, timeout=5) as client:
-                ar = await client.get(urls["argocd"], follow_redirects=True)
-                argocd_status = "healthy" if ar.status_code < 500 else "degraded"
-        except Exception:
-            argocd_status = "degraded"
+        # Global service reachability (Portainer/ArgoCD via HAProxy): read the
+        # background health monitor; probe (pooled client + TTL cache) when it
+        # has no result yet or is backing off beyond the base check interval
+        targets = [health_monitor.get("portainer"), health_monitor.get("argocd")]
+        ages = [target.age_seconds() for target in targets]
+        if all(age is not None and age <= health_monitor.interval for age in ages):
+            portainer_ok, argocd_ok = (target.status == "healthy" for target in targets)
+            checked_at = time.time() - max(ages)
+        else:
+            results = await http_prober.probe_many([target.url for target in targets])
+            portainer_ok, argocd_ok = (results[target.url].reachable for target in targets)
+            checked_at = min(results[target.url].checked_at for target in targets)
+        portainer_status = "online" if portainer_ok else "offline"
+        argocd_status = "healthy" if argocd_ok else "degraded"
 
         return ClusterStatus(
             name=name,
@@ -251,6 +415,8 @@ async def get_cluster_status(name: str):
             nodes_total=0,
             portainer_status=portainer_status,
             argocd_status=argocd_status,
+            services_checked_at=datetime.fromtimestamp(checked_at, timezone.utc).isoformat(),
+            services_age_seconds=round(max(0.0, time.time() - checked_at), 1),
             error_message=cluster.get("reconcile_error")
         )
 
@@ -265,7 +431,8 @@ async def get_cluster_status(name: str):
 async def start_cluster(name: str, background_tasks: BackgroundTasks):
     """Start a stopped cluster (async operation)"""
     try:
-        # Check if cluster exists
+        # Pick up environments.csv edits (one stat() when unchanged)
+        await db_service.sync_from_csv()
         exists = await db_service.cluster_exists(name)
         if not exists:
             raise HTTPException(status_code=404, detail=f"Cluster {name} not found")
@@ -273,23 +440,20 @@ async def start_cluster(name: str, background_tasks: BackgroundTasks):
         # Create task
         task_id = task_manager.create_task(f"Starting cluster {name}")
         
-        # Add WebSocket callback
-        async def ws_callback(task_status):
-            await ws_manager.broadcast_task_update(task_id, {
-                "type": "task_update",
-                "task": task_status.dict()
-            })
+        # Add WebSocket callback (publishes to the task:<id> topic)
+        async def ws_callback(update: dict):
+            ws_manager.publish_task(task_id, update)
         
         task_manager.add_callback(task_id, ws_callback)
         
-        # Progress callback
-        async def progress_callback(log_line: str):
-            await task_manager.update_task(task_id, log_line=log_line)
+        # Progress callback: lines are coalesced into task_logs batches
+        progress_callback = task_manager.log_writer(task_id)
         
-        # Run start in background
-        background_tasks.add_task(
-            task_manager.run_task,
+        # Queue behind the operation scheduler (concurrency cap, one operation per cluster)
+        await operation_scheduler.submit(
             task_id,
+            name,
+            "start",
             cluster_service.start_cluster,
             name=name,
             progress_callback=progress_callback
@@ -312,7 +476,8 @@ async def start_cluster(name: str, background_tasks: BackgroundTasks):
 async def stop_cluster(name: str, background_tasks: BackgroundTasks):
     """Stop a running cluster (async operation)"""
     try:
-        # Check if cluster exists
+        # Pick up environments.csv edits (one stat() when unchanged)
+        await db_service.sync_from_csv()
         exists = await db_service.cluster_exists(name)
         if not exists:
             raise HTTPException(status_code=404, detail=f"Cluster {name} not found")
@@ -320,23 +485,20 @@ async def stop_cluster(name: str, background_tasks: BackgroundTasks):
         # Create task
         task_id = task_manager.create_task(f"Stopping cluster {name}")
         
-        # Add WebSocket callback
-        async def ws_callback(task_status):
-            await ws_manager.broadcast_task_update(task_id, {
-                "type": "task_update",
-                "task": task_status.dict()
-            })
+        # Add WebSocket callback (publishes to the task:<id> topic)
+        async def ws_callback(update: dict):
+            ws_manager.publish_task(task_id, update)
         
         task_manager.add_callback(task_id, ws_callback)
         
-        # Progress callback
-        async def progress_callback(log_line: str):
-            await task_manager.update_task(task_id, log_line=log_line)
+        # Progress callback: lines are coalesced into task_logs batches
+        progress_callback = task_manager.log_writer(task_id)
         
-        # Run stop in background
-        background_tasks.add_task(
-            task_manager.run_task,
+        # Queue behind the operation scheduler (concurrency cap, one operation per cluster)
+        await operation_scheduler.submit(
             task_id,
+            name,
+            "stop",
             cluster_service.stop_cluster,
             name=name,
             progress_callback=progress_callback
@@ -0,0 +1,79 @@
+"""Provider inventory API endpoints (k3d/kind cluster existence and node IPs)
+
+Answers come from memory; scripts use them instead of ``k3d cluster list``,
+``kind get clusters`` and ``docker inspect`` (see scripts/lib/lib_inventory.sh).
+503 means the inventory is not fresh and the caller should fall back. Every
+answer carries ``X-Kindler-Inventory`` so scripts can tell it apart from a 2xx
+sent by whatever else listens on the address they were pointed at.
+"""
+import logging
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse
+
+from ..services.inventory_service import AmbiguousClusterError, provider_inventory
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_HEADER = "X-Kindler-Inventory"
+
+
+def _mark_response(response: Response):
+    response.headers[INVENTORY_HEADER] = "1"
+
+
+router = APIRouter(prefix="/api/inventory", tags=["inventory"], dependencies=[Depends(_mark_response)])
+
+Provider = Literal["k3d", "kind"]
+
+
+def _require_fresh():
+    if not provider_inventory.fresh:
+        raise HTTPException(status_code=503, detail="Provider inventory is not synced")
+
+
+def _cluster(name: str, provider: Optional[str]):
+    """Inventory entry of a cluster; 409 when the name is ambiguous across providers"""
+    _require_fresh()
+    try:
+        return provider_inventory.cluster(name, provider)
+    except AmbiguousClusterError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("")
+async def get_inventory_state():
+    """Sync state, counters and cluster names per provider"""
+    return provider_inventory.snapshot()
+
+
+@router.get("/clusters")
+async def list_inventory_clusters(
+    provider: Optional[Provider] = Query(None),
+    format: Literal["json", "text"] = Query("json", description="text: one name per line"),
+):
+    """Existing clusters (of one provider), as ``kind get clusters`` would print them"""
+    _require_fresh()
+    names = sorted(provider_inventory.clusters(provider) or ())
+    if format == "text":
+        return PlainTextResponse("".join(f"{name}\n" for name in names), headers={INVENTORY_HEADER: "1"})
+    return {"provider": provider, "clusters": names}
+
+
+@router.get("/clusters/{name}")
+async def get_inventory_cluster(name: str, provider: Optional[Provider] = Query(None)):
+    """Provider, node containers (state, networks) and routing IP of a cluster; 404 if absent"""
+    cluster = _cluster(name, provider)
+    if cluster is None:
+        raise HTTPException(status_code=404, detail=f"Cluster {name} not found")
+    return cluster
+
+
+@router.get("/clusters/{name}/ip", response_class=PlainTextResponse)
+async def get_inventory_cluster_ip(name: str, provider: Optional[Provider] = Query(None)):
+    """Node IP HAProxy routes to (plain text); 404 if the cluster or its IP is unknown"""
+    cluster = _cluster(name, provider)
+    if cluster is None or not cluster["ip"]:
+        raise HTTPException(status_code=404, detail=f"No IP for cluster {name}")
+    return cluster["ip"]
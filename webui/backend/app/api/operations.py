@@ -0,0 +1,121 @@
+"""Operation history API endpoints (metadata and transcripts)"""
+import logging
+import re
+from typing import List, Literal, Optional, Tuple
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from ..db import get_db, slice_log_chunk
+from ..services.db_service import run_db
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api", tags=["operations"])
+
+# Largest piece of decompressed transcript sent at once
+STREAM_BLOCK_BYTES = 256 * 1024
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``Range: bytes=`` spec into ``[start, end)``; None if unsatisfiable"""
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return None
+        return max(0, size - length), size
+    start = int(first)
+    end = size if last == "" else min(size, int(last) + 1)
+    if start >= size or end <= start:
+        return None
+    return start, end
+
+
+async def _log_snapshot(operation_id: int, start: int, end: int) -> List[Tuple[int, int, bytes]]:
+    """Compressed chunks covering ``[start, end)``, read before any header is sent
+    
+    Streaming from this snapshot keeps the body at the announced
+    Content-Length even if retention prunes the chunks meanwhile.
+    """
+    chunks = await run_db(get_db().get_operation_log_chunks, operation_id, start, end)
+    covered = start
+    for offset, raw_size, _ in chunks:
+        if offset > covered:
+            break
+        covered = max(covered, offset + raw_size)
+    if covered < end:
+        raise HTTPException(status_code=404, detail=f"Transcript of operation {operation_id} was pruned")
+    return chunks
+
+
+async def _stream_log(chunks: List[Tuple[int, int, bytes]], start: int, end: int):
+    for offset, _, data in chunks:
+        raw = slice_log_chunk(offset, data, start, end)
+        for position in range(0, len(raw), STREAM_BLOCK_BYTES):
+            yield raw[position:position + STREAM_BLOCK_BYTES]
+
+
+@router.get("/clusters/{name}/operations")
+async def list_cluster_operations(name: str, limit: int = Query(50, ge=1, le=500)):
+    """Operation history of a cluster (metadata only, transcripts via /api/operations/{id}/log)"""
+    return await run_db(get_db().get_cluster_operations, name, limit)
+
+
+@router.get("/operations/search")
+async def search_operations(
+    q: str = Query(..., min_length=1, max_length=500, description="Words to find (quote for a phrase)"),
+    kind: Optional[Literal["operation", "cluster"]] = Query(None, description="Restrict hits to one source"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    """Full-text search over operation transcripts and cluster reconcile errors"""
+    result = await run_db(get_db().search_operations, q, kind, limit, offset)
+    return {**result, "limit": limit, "offset": offset}
+
+
+@router.get("/operations/{operation_id}")
+async def get_operation(operation_id: int):
+    """Metadata of one operation, including ``log_size`` in bytes"""
+    operation = await run_db(get_db().get_operation, operation_id)
+    if not operation:
+        raise HTTPException(status_code=404, detail=f"Operation {operation_id} not found")
+    return operation
+
+
+@router.get("/operations/{operation_id}/log")
+async def get_operation_log(operation_id: int, range_header: Optional[str] = Header(None, alias="Range")):
+    """Stream an operation transcript (text/plain), honouring ``Range: bytes=start-end``"""
+    operation = await run_db(get_db().get_operation, operation_id)
+    if not operation:
+        raise HTTPException(status_code=404, detail=f"Operation {operation_id} not found")
+
+    size = operation["log_size"]
+    headers = {"Accept-Ranges": "bytes"}
+    media_type = "text/plain; charset=utf-8"
+
+    if range_header is None:
+        chunks = await _log_snapshot(operation_id, 0, size)
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_stream_log(chunks, 0, size), media_type=media_type, headers=headers)
+
+    byte_range = _parse_range(range_header, size)
+    if byte_range is None:
+        raise HTTPException(
+            status_code=416,
+            detail=f"Range not satisfiable: {range_header}",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    start, end = byte_range
+    chunks = await _log_snapshot(operation_id, start, end)
+    headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    headers["Content-Length"] = str(end - start)
+    return StreamingResponse(
+        _stream_log(chunks, start, end), status_code=206, media_type=media_type, headers=headers
+    )
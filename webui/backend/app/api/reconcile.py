@@ -0,0 +1,55 @@
+"""Reconcile engine API endpoints"""
+import logging
+from typing import List, Optional
+
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
+
+from ..models.task import TaskCreate
+from ..services.reconcile_engine import ReconcileBusyError, reconcile_engine
+from ..services.reconcile_service import reconciler
+from ..services.task_manager import task_manager
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/reconcile", tags=["reconcile"])
+
+
+@router.get("")
+async def get_reconcile_state():
+    """Engine limits, whether a pass is running and the summary of the last pass"""
+    return reconcile_engine.snapshot()
+
+
+@router.get("/scheduler")
+async def get_reconciler_state():
+    """Coalescing reconciler: run in flight, queued follow-up (triggers, reasons) and recent runs"""
+    return reconciler.snapshot()
+
+
+@router.get("/plan")
+async def get_reconcile_plan(name: Optional[List[str]] = Query(None, description="Only these clusters")):
+    """Dry run: actions the next pass would take (nothing is executed or written)"""
+    return await reconcile_engine.run(names=name, dry_run=True)
+
+
+@router.post("/run", response_model=TaskCreate, status_code=202)
+async def run_reconcile(
+    background_tasks: BackgroundTasks,
+    name: Optional[List[str]] = Query(None, description="Only these clusters (default: all)"),
+):
+    """Start a reconcile pass in the background (progress via /api/tasks/{task_id})"""
+    try:
+        # Claimed here, not in the background task: a second request gets 409
+        await reconcile_engine.claim()
+    except ReconcileBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    task_id = task_manager.create_task("Reconciling clusters")
+
+    async def reconcile_pass():
+        result = await reconcile_engine.run(names=name, claimed=True)
+        counts = ", ".join(f"{key}={value}" for key, value in sorted(result["counts"].items())) or "no actions"
+        return not result["counts"].get("error"), f"Reconcile pass finished ({counts})"
+
+    background_tasks.add_task(task_manager.run_task, task_id, reconcile_pass)
+    return TaskCreate(task_id=task_id, status="pending", message="Reconcile pass started")
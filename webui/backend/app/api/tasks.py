@@ -3,6 +3,7 @@ import logging
 from fastapi import APIRouter, HTTPException
 
 from ..models.task import TaskStatus
+from ..services.operation_scheduler import operation_scheduler
 from ..services.task_manager import task_manager
 
 logger = logging.getLogger(__name__)
@@ -10,13 +11,30 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
 
+@router.get("/scheduler")
+async def get_scheduler_state():
+    """Running and queued cluster operations (concurrency cap, wait times)"""
+    return operation_scheduler.snapshot()
+
+
 @router.get("/{task_id}", response_model=TaskStatus)
 async def get_task_status(task_id: str):
-    """Get task status by ID"""
-    task = task_manager.get_task(task_id)
+    """Get task status by ID (loaded from the task store if no longer in memory)"""
+    task = await task_manager.load_task(task_id)
     
     if not task:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
     
     return task
 
+
+@router.post("/{task_id}/cancel", response_model=TaskStatus)
+async def cancel_task(task_id: str):
+    """Cancel a queued or running cluster operation"""
+    if not await operation_scheduler.cancel(task_id):
+        task = await task_manager.load_task(task_id)
+        if not task:
+            raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+        raise HTTPException(status_code=409, detail=f"Task {task_id} is not queued or running")
+    
+    return task_manager.get_task(task_id)
@@ -1,7 +1,9 @@
 """WebSocket API endpoint"""
 import logging
+from typing import List, Optional
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
+from ..services.task_manager import task_manager
 from ..websocket.manager import ws_manager
 
 logger = logging.getLogger(__name__)
@@ -9,42 +11,98 @@ logger = logging.getLogger(__name__)
 router = APIRouter(tags=["websocket"])
 
 
+def _requested_topics(data: dict) -> List[str]:
+    """Topics of a (un)subscribe message: ``topics``, ``topic`` or legacy ``task_id``"""
+    topics = list(data.get("topics") or [])
+    if data.get("topic"):
+        topics.append(data["topic"])
+    if data.get("task_id"):
+        topics.append(f"task:{data['task_id']}")
+    return topics
+
+
+def _replay_since(data: dict, topic: str) -> Optional[int]:
+    """``since`` for a task topic: an int, or a mapping of topic -> seq"""
+    since = data.get("since")
+    if isinstance(since, dict):
+        since = since.get(topic)
+    if isinstance(since, bool) or not isinstance(since, int) or since < 0:
+        return None
+    return since
+
+
+def _replay_task(websocket: WebSocket, topic: str, since: int) -> bool:
+    """Queue the task state and missed log lines right after subscribing
+
+    Nothing awaits between subscribe and this call, so live messages are
+    queued after the replay and carry higher sequence numbers. Returns False
+    when the task is not in memory (see ``_replay_stored_task``).
+    """
+    messages = task_manager.replay_messages(topic[len("task:"):], since)
+    for message in messages:
+        ws_manager.send(websocket, {**message, "topic": topic})
+    return bool(messages)
+
+
+async def _replay_stored_task(websocket: WebSocket, topic: str, since: int):
+    """Replay a task evicted from memory from the task store
+
+    Evicted tasks are finished, so no live messages can overtake the replay.
+    """
+    for message in await task_manager.load_replay_messages(topic[len("task:"):], since):
+        ws_manager.send(websocket, {**message, "topic": topic})
+
+
+@router.websocket("/ws")
 @router.websocket("/ws/tasks")
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time task updates"""
+    """WebSocket endpoint for real-time updates (topic subscriptions over one socket)"""
     await ws_manager.connect(websocket)
-    
+
     try:
         while True:
             # Receive messages from client
             data = await websocket.receive_json()
-            
+
             # Handle subscription requests
             if data.get("type") == "subscribe":
-                task_id = data.get("task_id")
-                if task_id:
-                    ws_manager.subscribe_task(websocket, task_id)
-                    await websocket.send_json({
-                        "type": "subscribed",
-                        "task_id": task_id
+                requested = _requested_topics(data)
+                topics = ws_manager.subscribe(websocket, requested)
+                rejected = [t for t in requested if t not in topics]
+                if rejected:
+                    ws_manager.send(websocket, {
+                        "type": "error",
+                        "message": f"Unknown topics: {rejected}"
                     })
-            
+                if topics:
+                    reply = {"type": "subscribed", "topics": topics}
+                    if data.get("task_id"):
+                        reply["task_id"] = data["task_id"]
+                    ws_manager.send(websocket, reply)
+                # Resume: replay only the lines after the client's last seq;
+                # tasks in memory first, before anything awaits
+                stored = []
+                for topic in topics:
+                    since = _replay_since(data, topic) if topic.startswith("task:") else None
+                    if since is not None and not _replay_task(websocket, topic, since):
+                        stored.append((topic, since))
+                for topic, since in stored:
+                    await _replay_stored_task(websocket, topic, since)
+
             elif data.get("type") == "unsubscribe":
-                task_id = data.get("task_id")
-                if task_id:
-                    ws_manager.unsubscribe_task(websocket, task_id)
-                    await websocket.send_json({
-                        "type": "unsubscribed",
-                        "task_id": task_id
-                    })
-            
+                topics = ws_manager.unsubscribe(websocket, _requested_topics(data))
+                if topics:
+                    reply = {"type": "unsubscribed", "topics": topics}
+                    if data.get("task_id"):
+                        reply["task_id"] = data["task_id"]
+                    ws_manager.send(websocket, reply)
+
             elif data.get("type") == "ping":
-                await websocket.send_json({"type": "pong"})
-    
+                ws_manager.send(websocket, {"type": "pong"})
+
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected normally")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
         ws_manager.disconnect(websocket)
-
@@ -4,20 +4,245 @@ SQLite database module for kindler Web UI.
 Replaces PostgreSQL dependency for cluster configuration storage.
 """
 
+import html
+import json
 import sqlite3
+import queue
+import threading
+import time
+import zlib
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable, Tuple
 from contextlib import contextmanager
 import os
 
 
+# Columns of the clusters table (allowlist for projections)
+CLUSTER_COLUMNS = (
+    "id", "name", "provider", "subnet", "node_port", "pf_port", "http_port",
+    "https_port", "server_ip", "status", "desired_state", "actual_state",
+    "last_reconciled_at", "reconcile_error", "created_at", "updated_at",
+    "resource_version",
+)
+
+# Operation metadata returned by listings (transcripts are read separately)
+OPERATION_METADATA_SELECT = """
+    o.id, o.cluster_name, o.operation, o.status, o.started_at, o.completed_at,
+    o.error_message,
+    (SELECT COALESCE(SUM(raw_size), 0) FROM operation_log_chunks c WHERE c.operation_id = o.id) AS log_size
+"""
+LOG_COMPRESSION_LEVEL = 6
+# PRAGMA user_version; one-off data migrations run when the file is older
+SCHEMA_VERSION = 1
+
+# Host port / subnet allocation. All host ports share the "port" pool so pf,
+# http and https ports never collide; subnets are 10.<n>.0.0/16 and the pool
+# value is <n>. Keep in sync with sqlite_allocate_* in scripts/lib/lib_sqlite.sh.
+PORT_RANGES = {
+    "pf_port": (19001, 19999),
+    "http_port": (20000, 20999),
+    "https_port": (21000, 21999),
+}
+SUBNET_RANGE = (101, 254)
+ALLOCATION_SOURCES = {
+    "port": [
+        (column, f"SELECT {column} FROM clusters WHERE {column} BETWEEN :lo AND :hi")
+        for column in ("pf_port", "http_port", "https_port", "node_port")
+    ],
+    "subnet": [
+        ("subnet", """
+            SELECT CAST(substr(subnet, 4, instr(substr(subnet, 4), '.') - 1) AS INTEGER) AS v
+            FROM clusters WHERE subnet LIKE '10.%.0.0/16' AND v BETWEEN :lo AND :hi
+        """),
+    ],
+}
+
+
+def subnet_cidr(value: int) -> str:
+    return f"10.{value}.0.0/16"
+
+
+SEARCH_SNIPPET_TOKENS = 16
+# snippet() match delimiters; control characters are stripped from indexed
+# text, so these only ever come from snippet() itself
+SNIPPET_OPEN, SNIPPET_CLOSE = "\x02", "\x03"
+
+
+def _search_text(text: Optional[str]) -> str:
+    """Text as stored in the search index (without the snippet delimiters)"""
+    return (text or "").replace(SNIPPET_OPEN, "").replace(SNIPPET_CLOSE, "")
+
+
+def highlight_snippet(snippet: str) -> str:
+    """HTML-escape a snippet, then turn its match delimiters into ``<mark>``"""
+    return (
+        html.escape(snippet)
+        .replace(SNIPPET_OPEN, "<mark>")
+        .replace(SNIPPET_CLOSE, "</mark>")
+    )
+
+
+def fts_query(text: str) -> str:
+    """Turn user input into an FTS5 query that cannot be a syntax error
+    
+    Every whitespace-separated word is quoted (so ``-``, ``:`` or ``*`` are
+    literal) and all of them must match; input wrapped in double quotes is
+    matched as a single phrase.
+    """
+    text = text.strip()
+    if len(text) > 1 and text.startswith('"') and text.endswith('"'):
+        phrase = text[1:-1].strip()
+        return '"' + phrase.replace('"', '""') + '"' if phrase else ""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+def slice_log_chunk(offset: int, data: bytes, start: int = 0, end: Optional[int] = None) -> bytes:
+    """Decompress a transcript chunk stored at ``offset`` and cut it to ``[start, end)``"""
+    raw = zlib.decompress(data)
+    lo = max(0, start - offset)
+    hi = len(raw) if end is None else min(len(raw), end - offset)
+    return raw[lo:hi]
+
+
+# Columns of the tasks table (TaskManager write-behind)
+TASK_COLUMNS = (
+    "task_id", "status", "progress", "message", "error", "log_seq",
+    "created_at", "updated_at", "completed_at",
+)
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections
+
+    Connections are created lazily up to ``size`` and handed out LIFO so the
+    hottest connection (warm page cache) is reused first. When every
+    connection is checked out, callers wait up to ``timeout`` seconds.
+    """
+
+    def __init__(self, db_path: str, size: int, timeout: float, pragmas: List[str]):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._pragmas = pragmas
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        # Counters reported by stats()
+        self._hits = 0
+        self._misses = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._timeouts = 0
+        self._in_use = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # Enable dict-like access
+        for pragma in self._pragmas:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check out a connection (reuse idle, create if below size, else wait)"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._hits += 1
+                self._in_use += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+                self._misses += 1
+                self._in_use += 1
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                    self._in_use -= 1
+                raise
+
+        started = time.monotonic()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise sqlite3.OperationalError(
+                f"Timed out after {self.timeout}s waiting for a database connection"
+            )
+        waited = time.monotonic() - started
+        with self._lock:
+            self._waits += 1
+            self._wait_seconds += waited
+            self._max_wait_seconds = max(self._max_wait_seconds, waited)
+            self._in_use += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False):
+        """Return a connection to the pool (or close it if broken/closed)"""
+        with self._lock:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._created -= 1
+        if discard or self._closed:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            return
+        self._idle.put(conn)
+
+    def close(self):
+        """Close all idle connections; busy ones are closed on release"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool hit/wait statistics"""
+        with self._lock:
+            acquisitions = self._hits + self._misses + self._waits
+            return {
+                "size": self.size,
+                "open": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "acquisitions": acquisitions,
+                "hits": self._hits,
+                "misses": self._misses,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "hit_ratio": round(self._hits / acquisitions, 4) if acquisitions else None,
+                "wait_seconds_total": round(self._wait_seconds, 6),
+                "wait_seconds_max": round(self._max_wait_seconds, 6),
+            }
+
+
 class Database:
     """SQLite database manager for kindler clusters"""
     
     def __init__(self, db_path: str = "/data/kindler-webui/kindler.db"):
         self.db_path = db_path
         self._ensure_db_dir()
+        self._init_pools()
         self._init_db()
     
     def _ensure_db_dir(self):
@@ -25,19 +250,63 @@ class Database:
         db_dir = Path(self.db_path).parent
         db_dir.mkdir(parents=True, exist_ok=True)
     
+    def _init_pools(self):
+        """Create writer/reader connection pools (tunable via DB_* env vars)"""
+        timeout = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+        # Negative cache_size is in KiB
+        common = [
+            f"PRAGMA synchronous = {os.getenv('DB_SYNCHRONOUS', 'NORMAL')}",
+            f"PRAGMA cache_size = -{int(os.getenv('DB_CACHE_SIZE_KB', '8192'))}",
+            f"PRAGMA mmap_size = {int(os.getenv('DB_MMAP_SIZE', str(64 * 1024 * 1024)))}",
+            "PRAGMA temp_store = MEMORY",
+        ]
+        # journal_mode is persistent in the database file, so lib_sqlite.sh
+        # (sqlite3 CLI) transparently picks up WAL as well.
+        writer = [f"PRAGMA journal_mode = {os.getenv('DB_JOURNAL_MODE', 'WAL')}"] + common
+        # Read-only fast path: no commit/rollback round trip, and SQLite
+        # refuses accidental writes on these connections.
+        reader = common + ["PRAGMA query_only = ON"]
+        self._write_pool = ConnectionPool(
+            self.db_path, int(os.getenv("DB_POOL_SIZE", "4")), timeout, writer
+        )
+        self._read_pool = ConnectionPool(
+            self.db_path, int(os.getenv("DB_READ_POOL_SIZE", "8")), timeout, reader
+        )
+    
     @contextmanager
-    def _get_conn(self):
-        """Get database connection with context manager"""
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        conn.row_factory = sqlite3.Row  # Enable dict-like access
+    def _get_conn(self, readonly: bool = False):
+        """Get a pooled database connection with context manager
+
+        Writers commit on success and roll back on error. Read-only
+        connections skip transaction handling entirely.
+        """
+        pool = self._read_pool if readonly else self._write_pool
+        conn = pool.acquire()
+        discard = False
         try:
             yield conn
-            conn.commit()
+            if not readonly:
+                conn.commit()
         except Exception as e:
-            conn.rollback()
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
             raise e
         finally:
-            conn.close()
+            pool.release(conn, discard=discard)
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool statistics for monitoring"""
+        return {
+            "write": self._write_pool.stats(),
+            "read": self._read_pool.stats(),
+        }
+    
+    def close(self):
+        """Close all pooled connections"""
+        self._write_pool.close()
+        self._read_pool.close()
     
     def _init_db(self):
         """Initialize database schema"""
@@ -82,6 +351,56 @@ class Database:
                 cursor.execute("ALTER TABLE clusters ADD COLUMN last_reconciled_at TIMESTAMP;")
             if 'reconcile_error' not in columns:
                 cursor.execute("ALTER TABLE clusters ADD COLUMN reconcile_error TEXT;")
+            if 'resource_version' not in columns:
+                cursor.execute("ALTER TABLE clusters ADD COLUMN resource_version INTEGER DEFAULT 0;")
+            
+            # Change version counter: bumped by triggers on every write to
+            # clusters, including writes made by lib_sqlite.sh / reconcile.sh,
+            # and stamped onto the written row as resource_version. Every bump
+            # is also appended to cluster_changes, which drives the watch API.
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS change_versions (
+                    resource TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            cursor.execute("INSERT OR IGNORE INTO change_versions (resource, version) VALUES ('clusters', 0)")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS cluster_changes (
+                    version INTEGER PRIMARY KEY,
+                    cluster_name TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            current_version = "(SELECT version FROM change_versions WHERE resource = 'clusters')"
+            # Triggers are recreated on startup so their definitions track this code.
+            # The UPDATE trigger skips the trigger's own resource_version stamp.
+            for event, when, watch_event in (
+                ("INSERT", "", "ADDED"),
+                ("UPDATE", "WHEN NEW.resource_version IS OLD.resource_version", "MODIFIED"),
+            ):
+                cursor.execute(f"DROP TRIGGER IF EXISTS trg_clusters_version_{event.lower()}")
+                cursor.execute(f"""
+                    CREATE TRIGGER trg_clusters_version_{event.lower()}
+                    AFTER {event} ON clusters {when}
+                    BEGIN
+                        UPDATE change_versions SET version = version + 1 WHERE resource = 'clusters';
+                        UPDATE clusters SET resource_version = {current_version} WHERE id = NEW.id;
+                        INSERT INTO cluster_changes (version, cluster_name, event)
+                        VALUES ({current_version}, NEW.name, '{watch_event}');
+                    END
+                """)
+            cursor.execute("DROP TRIGGER IF EXISTS trg_clusters_version_delete")
+            cursor.execute(f"""
+                CREATE TRIGGER trg_clusters_version_delete
+                AFTER DELETE ON clusters
+                BEGIN
+                    UPDATE change_versions SET version = version + 1 WHERE resource = 'clusters';
+                    INSERT INTO cluster_changes (version, cluster_name, event)
+                    VALUES ({current_version}, OLD.name, 'DELETED');
+                END
+            """)
             
             # Operations log table
             cursor.execute("""
@@ -98,34 +417,315 @@ class Database:
                 )
             """)
             
+            # Operation transcripts: zlib-compressed chunks appended while the
+            # script runs; offset/raw_size are byte positions in the UTF-8 log
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS operation_log_chunks (
+                    operation_id INTEGER NOT NULL,
+                    seq INTEGER NOT NULL,
+                    offset INTEGER NOT NULL,
+                    raw_size INTEGER NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (operation_id, seq)
+                ) WITHOUT ROWID
+            """)
+            
+            # Full-text search over operation transcripts/errors (rowid = operations.id)
+            # and clusters.reconcile_error (rowid = clusters.id). Cluster rows are
+            # also written by the shell scripts, so that index is maintained by
+            # triggers and searches never have to write.
+            existing = {
+                row[0] for row in cursor.execute(
+                    "SELECT name FROM sqlite_master WHERE name IN ('operation_search', 'cluster_error_search')"
+                )
+            }
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS operation_search USING fts5(log, error)
+            """)
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS cluster_error_search USING fts5(error)
+            """)
+            cluster_error = (
+                f"replace(replace(NEW.reconcile_error, char({ord(SNIPPET_OPEN)}), ''), "
+                f"char({ord(SNIPPET_CLOSE)}), '')"
+            )
+            for event, when, body in (
+                ("INSERT", "", ""),
+                ("UPDATE", "OF reconcile_error", "DELETE FROM cluster_error_search WHERE rowid = OLD.id;"),
+            ):
+                cursor.execute(f"DROP TRIGGER IF EXISTS trg_clusters_search_{event.lower()}")
+                cursor.execute(f"""
+                    CREATE TRIGGER trg_clusters_search_{event.lower()}
+                    AFTER {event} {when} ON clusters
+                    BEGIN
+                        {body}
+                        INSERT INTO cluster_error_search (rowid, error)
+                        SELECT NEW.id, {cluster_error}
+                        WHERE NEW.reconcile_error IS NOT NULL AND NEW.reconcile_error != '';
+                    END
+                """)
+            cursor.execute("DROP TRIGGER IF EXISTS trg_clusters_search_delete")
+            cursor.execute("""
+                CREATE TRIGGER trg_clusters_search_delete
+                AFTER DELETE ON clusters
+                BEGIN
+                    DELETE FROM cluster_error_search WHERE rowid = OLD.id;
+                END
+            """)
+            
+            # Port/subnet reservations made by the allocator; a reservation
+            # lives until released, even after the cluster row is written
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS allocations (
+                    pool TEXT NOT NULL,
+                    value INTEGER NOT NULL,
+                    owner TEXT NOT NULL,
+                    purpose TEXT NOT NULL,
+                    allocated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (pool, value)
+                ) WITHOUT ROWID
+            """)
+            
+            # Background task state (write-behind from TaskManager)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    progress INTEGER DEFAULT 0,
+                    message TEXT,
+                    error TEXT,
+                    log_seq INTEGER DEFAULT 0,
+                    created_at TIMESTAMP,
+                    updated_at TIMESTAMP,
+                    completed_at TIMESTAMP
+                )
+            """)
+            
+            # Append-only task log, one row per flushed batch of lines
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS task_log_chunks (
+                    task_id TEXT NOT NULL,
+                    first_seq INTEGER NOT NULL,
+                    last_seq INTEGER NOT NULL,
+                    lines TEXT NOT NULL,
+                    PRIMARY KEY (task_id, first_seq)
+                ) WITHOUT ROWID
+            """)
+            
+            # CSV import bookkeeping (mtime/hash gate for sync_from_csv)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    source TEXT PRIMARY KEY,
+                    mtime_ns INTEGER,
+                    size INTEGER,
+                    content_hash TEXT,
+                    synced_at TIMESTAMP
+                )
+            """)
+            
             # Indexes
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_clusters_name ON clusters(name)
             """)
+            # Keyset pagination / filtered listing (ORDER BY created_at DESC, id DESC)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_clusters_created ON clusters(created_at, id)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_clusters_provider_created ON clusters(provider, created_at, id)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_clusters_desired_created ON clusters(desired_state, created_at, id)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_clusters_actual_created ON clusters(actual_state, created_at, id)
+            """)
+            # Gap search of the allocator (only the pool's range is read)
+            for column in ("pf_port", "http_port", "https_port", "node_port"):
+                cursor.execute(f"""
+                    CREATE INDEX IF NOT EXISTS idx_clusters_{column} ON clusters({column})
+                """)
+            cursor.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_allocations_owner ON allocations(owner, purpose)
+            """)
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_operations_cluster ON operations(cluster_name)
             """)
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_operations_status ON operations(status)
             """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_operations_cluster_started ON operations(cluster_name, started_at)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_tasks_status_completed ON tasks(status, completed_at)
+            """)
+            
+            schema_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            if schema_version < 1:
+                self._migrate_operation_log_output(cursor)
+            if schema_version < SCHEMA_VERSION:
+                cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            if "operation_search" not in existing:
+                for (operation_id,) in cursor.execute(
+                    "SELECT id FROM operations WHERE status != 'running'"
+                ).fetchall():
+                    self._index_operation(conn, operation_id)
+            if "cluster_error_search" not in existing:
+                cursor.execute(f"""
+                    INSERT INTO cluster_error_search (rowid, error)
+                    SELECT id, {cluster_error.replace("NEW.", "")} FROM clusters
+                    WHERE reconcile_error IS NOT NULL AND reconcile_error != ''
+                """)
             
             conn.commit()
     
+    @staticmethod
+    def _migrate_operation_log_output(cursor):
+        """Move transcripts still stored in operations.log_output into chunks"""
+        rows = cursor.execute(
+            "SELECT id, log_output FROM operations WHERE log_output IS NOT NULL"
+        ).fetchall()
+        for operation_id, log_output in rows:
+            raw = log_output.encode("utf-8")
+            cursor.execute(
+                "INSERT OR REPLACE INTO operation_log_chunks VALUES (?, 0, 0, ?, ?)",
+                (operation_id, len(raw), zlib.compress(raw, LOG_COMPRESSION_LEVEL)),
+            )
+            cursor.execute("UPDATE operations SET log_output = NULL WHERE id = ?", (operation_id,))
+    
     # Cluster CRUD operations
     
     def get_cluster(self, name: str) -> Optional[Dict[str, Any]]:
         """Get cluster by name"""
-        with self._get_conn() as conn:
+        with self._get_conn(readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM clusters WHERE name = ?", (name,))
             row = cursor.fetchone()
             return dict(row) if row else None
+
+    def get_clusters(self, names: Iterable[str]) -> List[Dict[str, Any]]:
+        """Clusters with the given names, ordered by name (missing names are skipped)"""
+        names = sorted(set(names))
+        if not names:
+            return []
+        with self._get_conn(readonly=True) as conn:
+            cursor = conn.cursor()
+            # One JSON parameter instead of one placeholder per name
+            cursor.execute(
+                "SELECT * FROM clusters WHERE name IN (SELECT value FROM json_each(?)) ORDER BY name",
+                (json.dumps(names),),
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_change_version(self, resource: str = "clusters") -> int:
+        """Current change version of a table (bumped on every write)"""
+        with self._get_conn(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM change_versions WHERE resource = ?", (resource,))
+            row = cursor.fetchone()
+            return row[0] if row else 0
     
-    def list_clusters(self) -> List[Dict[str, Any]]:
-        """List all clusters"""
+    def get_cluster_version(self, name: str) -> Optional[int]:
+        """resource_version of a single cluster (None if it does not exist)"""
+        with self._get_conn(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(resource_version, 0) FROM clusters WHERE name = ?", (name,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+    
+    def list_cluster_changes(self, since: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Change log entries after ``since``, joined with the current cluster row
+        
+        Each entry has ``change_version``, ``event`` (ADDED/MODIFIED/DELETED),
+        ``cluster_name`` and the cluster columns (NULL for deleted clusters).
+        """
+        with self._get_conn(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT ch.version AS change_version, ch.event, ch.cluster_name, cl.*
+                FROM cluster_changes ch
+                LEFT JOIN clusters cl ON cl.name = ch.cluster_name
+                WHERE ch.version > ?
+                ORDER BY ch.version
+                LIMIT ?
+            """, (since, limit))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def get_oldest_change_version(self) -> Optional[int]:
+        """Oldest version still retained in the change log (None if empty)"""
+        with self._get_conn(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MIN(version) FROM cluster_changes")
+            return cursor.fetchone()[0]
+    
+    def prune_cluster_changes(self, keep: int) -> int:
+        """Drop all but the newest ``keep`` change log entries"""
         with self._get_conn() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM clusters ORDER BY created_at DESC")
+            cursor.execute("""
+                DELETE FROM cluster_changes
+                WHERE version <= (SELECT MAX(version) FROM cluster_changes) - ?
+            """, (keep,))
+            return cursor.rowcount
+    
+    def list_clusters(
+        self,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[str, int]] = None,
+        provider: Optional[str] = None,
+        desired_state: Optional[str] = None,
+        actual_state: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """List clusters, newest first (keyset-paginated, filterable, projectable)
+
+        Args:
+            limit: Maximum rows to return (None = all)
+            after: Keyset cursor ``(created_at, id)`` of the last row of the previous page
+            provider/desired_state/actual_state: Exact-match filters
+            name_prefix: Only clusters whose name starts with this prefix
+            columns: Subset of CLUSTER_COLUMNS to select (``created_at``/``id`` are always included)
+        """
+        if columns:
+            unknown = set(columns) - set(CLUSTER_COLUMNS)
+            if unknown:
+                raise ValueError(f"Unknown cluster columns: {', '.join(sorted(unknown))}")
+            selected = list(dict.fromkeys(["id", "created_at", *columns]))
+            select = ", ".join(selected)
+        else:
+            select = "*"
+
+        where = []
+        params: List[Any] = []
+        for column, value in (
+            ("provider", provider),
+            ("desired_state", desired_state),
+            ("actual_state", actual_state),
+        ):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if name_prefix:
+            # Range scan instead of LIKE so idx_clusters_name can be used
+            where.append("name >= ? AND name < ?")
+            params.extend([name_prefix, name_prefix + "\uffff"])
+        if after is not None:
+            where.append("(created_at, id) < (?, ?)")
+            params.extend(after)
+
+        sql = f"SELECT {select} FROM clusters"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self._get_conn(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
             return [dict(row) for row in cursor.fetchall()]
     
     def insert_cluster(self, cluster: Dict[str, Any]) -> int:
@@ -207,15 +807,95 @@ class Database:
         with self._get_conn() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM clusters WHERE name = ?", (name,))
-            return cursor.rowcount > 0
+            deleted = cursor.rowcount > 0
+            cursor.execute("DELETE FROM allocations WHERE owner = ?", (name,))
+            return deleted
     
     def cluster_exists(self, name: str) -> bool:
         """Check if cluster exists"""
-        with self._get_conn() as conn:
+        with self._get_conn(readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT 1 FROM clusters WHERE name = ? LIMIT 1", (name,))
             return cursor.fetchone() is not None
     
+    # Port/subnet allocation
+    
+    @staticmethod
+    def _find_free(conn, pool: str, lo: int, hi: int) -> Optional[int]:
+        """Lowest value in ``[lo, hi]`` not used by a cluster or a reservation
+        
+        One gap-finding query: used values (plus a ``lo - 1`` sentinel) are
+        sorted once and the first value whose successor is missing wins.
+        """
+        used = " UNION ".join(
+            ["SELECT :lo - 1", "SELECT value FROM allocations WHERE pool = :pool AND value BETWEEN :lo AND :hi"]
+            + [sql for _, sql in ALLOCATION_SOURCES[pool]]
+        )
+        row = conn.execute(f"""
+            WITH used(v) AS ({used})
+            SELECT v + 1 AS free_value FROM (SELECT v, LEAD(v) OVER (ORDER BY v) AS next FROM used)
+            WHERE (next IS NULL OR next > v + 1) AND v + 1 <= :hi
+            ORDER BY v LIMIT 1
+        """, {"pool": pool, "lo": lo, "hi": hi}).fetchone()
+        return row[0] if row else None
+    
+    def allocate(self, pool: str, owner: str, purpose: str, lo: int, hi: int) -> int:
+        """Reserve the lowest free value of ``pool`` in ``[lo, hi]`` for ``owner``
+        
+        Runs under ``BEGIN IMMEDIATE`` so concurrent allocators (backend or
+        scripts) serialise. Idempotent: an existing reservation of the same
+        owner and purpose is returned as is.
+        
+        Raises:
+            ValueError: The range is exhausted
+        """
+        if pool not in ALLOCATION_SOURCES:
+            raise ValueError(f"Unknown allocation pool: {pool}")
+        with self._get_conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT value FROM allocations WHERE owner = ? AND purpose = ?", (owner, purpose)
+            ).fetchone()
+            if row:
+                return row[0]
+            value = self._find_free(conn, pool, lo, hi)
+            if value is None:
+                raise ValueError(f"No free {pool} in {lo}-{hi}")
+            conn.execute(
+                "INSERT INTO allocations (pool, value, owner, purpose) VALUES (?, ?, ?, ?)",
+                (pool, value, owner, purpose),
+            )
+            return value
+    
+    def allocate_port(self, owner: str, purpose: str) -> int:
+        """Reserve a host port for ``purpose`` (``pf_port``, ``http_port``, ``https_port``)"""
+        lo, hi = PORT_RANGES[purpose]
+        return self.allocate("port", owner, purpose, lo, hi)
+    
+    def allocate_subnet(self, owner: str) -> str:
+        """Reserve a 10.<n>.0.0/16 cluster subnet"""
+        return subnet_cidr(self.allocate("subnet", owner, "subnet", *SUBNET_RANGE))
+    
+    def release(self, owner: str, purpose: Optional[str] = None) -> int:
+        """Release the reservations of ``owner`` (all, or one purpose)"""
+        with self._get_conn() as conn:
+            if purpose is None:
+                cursor = conn.execute("DELETE FROM allocations WHERE owner = ?", (owner,))
+            else:
+                cursor = conn.execute(
+                    "DELETE FROM allocations WHERE owner = ? AND purpose = ?", (owner, purpose)
+                )
+            return cursor.rowcount
+    
+    def list_allocations(self, owner: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._get_conn(readonly=True) as conn:
+            cursor = conn.execute("""
+                SELECT pool, value, owner, purpose, allocated_at FROM allocations
+                WHERE ? IS NULL OR owner = ?
+                ORDER BY pool, value
+            """, (owner, owner))
+            return [dict(row) for row in cursor.fetchall()]
+    
     # Operation logging
     
     def log_operation_start(self, cluster_name: str, operation: str) -> int:
@@ -229,112 +909,424 @@ class Database:
             return cursor.lastrowid
     
     def log_operation_complete(self, operation_id: int, status: str, log_output: str = None, error_message: str = None):
-        """Log operation completion"""
+        """Log operation completion
+        
+        ``log_output`` is optional: transcripts are normally streamed with
+        ``append_operation_log`` while the operation runs.
+        """
+        if log_output:
+            self.append_operation_log(operation_id, log_output)
         with self._get_conn() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE operations
-                SET status = ?, completed_at = ?, log_output = ?, error_message = ?
+                SET status = ?, completed_at = ?, error_message = ?
                 WHERE id = ?
-            """, (status, datetime.now().isoformat(), log_output, error_message, operation_id))
+            """, (status, datetime.now().isoformat(), error_message, operation_id))
+            self._index_operation(conn, operation_id)
     
-    def get_cluster_operations(self, cluster_name: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get operations for a cluster"""
+    def append_operation_log(self, operation_id: int, content: str):
+        """Append one compressed chunk to an operation's transcript"""
+        raw = content.encode("utf-8")
+        if not raw:
+            return
+        data = zlib.compress(raw, LOG_COMPRESSION_LEVEL)
         with self._get_conn() as conn:
+            conn.execute("""
+                INSERT INTO operation_log_chunks (operation_id, seq, offset, raw_size, data)
+                SELECT ?, COALESCE(MAX(seq) + 1, 0), COALESCE(MAX(offset + raw_size), 0), ?, ?
+                FROM operation_log_chunks WHERE operation_id = ?
+            """, (operation_id, len(raw), data, operation_id))
+    
+    def get_operation(self, operation_id: int) -> Optional[Dict[str, Any]]:
+        """Operation metadata with ``log_size`` (bytes of the transcript)"""
+        with self._get_conn(readonly=True) as conn:
+            row = conn.execute(f"""
+                SELECT {OPERATION_METADATA_SELECT}
+                FROM operations o WHERE o.id = ?
+            """, (operation_id,)).fetchone()
+            return dict(row) if row else None
+    
+    def read_operation_log(self, operation_id: int, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Bytes ``[start, end)`` of an operation's UTF-8 transcript
+        
+        Only the chunks overlapping the range are read and decompressed.
+        """
+        with self._get_conn(readonly=True) as conn:
+            return self._read_log_chunks(conn, operation_id, start, end)
+    
+    def get_operation_log_chunks(
+        self, operation_id: int, start: int = 0, end: Optional[int] = None
+    ) -> List[Tuple[int, int, bytes]]:
+        """Compressed chunks ``(offset, raw_size, data)`` overlapping bytes ``[start, end)``
+        
+        A snapshot for streaming: chunks pruned later cannot shorten a
+        response built from it (see ``slice_log_chunk``).
+        """
+        with self._get_conn(readonly=True) as conn:
+            return [tuple(row) for row in self._select_log_chunks(conn, operation_id, start, end)]
+    
+    @staticmethod
+    def _select_log_chunks(conn, operation_id: int, start: int, end: Optional[int]):
+        return conn.execute("""
+            SELECT offset, raw_size, data FROM operation_log_chunks
+            WHERE operation_id = ? AND offset + raw_size > ? AND (? IS NULL OR offset < ?)
+            ORDER BY seq
+        """, (operation_id, start, end, end))
+    
+    @classmethod
+    def _read_log_chunks(cls, conn, operation_id: int, start: int = 0, end: Optional[int] = None) -> bytes:
+        return b"".join(
+            slice_log_chunk(row[0], row[2], start, end)
+            for row in cls._select_log_chunks(conn, operation_id, start, end)
+        )
+    
+    def get_operation_log(self, operation_id: int) -> str:
+        """Full transcript of an operation"""
+        return self.read_operation_log(operation_id).decode("utf-8", errors="replace")
+    
+    def get_cluster_operations(self, cluster_name: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get operations for a cluster (metadata only; see ``read_operation_log``)"""
+        with self._get_conn(readonly=True) as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT * FROM operations
-                WHERE cluster_name = ?
-                ORDER BY started_at DESC
+            cursor.execute(f"""
+                SELECT {OPERATION_METADATA_SELECT}
+                FROM operations o
+                WHERE o.cluster_name = ?
+                ORDER BY o.started_at DESC
                 LIMIT ?
             """, (cluster_name, limit))
             return [dict(row) for row in cursor.fetchall()]
     
+    def prune_operations(self, older_than: str) -> int:
+        """Delete finished operations started before ``older_than`` and their transcripts"""
+        with self._get_conn() as conn:
+            conn.execute("""
+                DELETE FROM operation_log_chunks WHERE operation_id IN (
+                    SELECT id FROM operations WHERE status != 'running' AND started_at < ?
+                )
+            """, (older_than,))
+            conn.execute("""
+                DELETE FROM operation_search WHERE rowid IN (
+                    SELECT id FROM operations WHERE status != 'running' AND started_at < ?
+                )
+            """, (older_than,))
+            cursor = conn.execute(
+                "DELETE FROM operations WHERE status != 'running' AND started_at < ?", (older_than,)
+            )
+            return cursor.rowcount
+    
+    # Search
+    
+    def _index_operation(self, conn, operation_id: int):
+        """(Re)index a finished operation's transcript and error message"""
+        row = conn.execute("SELECT error_message FROM operations WHERE id = ?", (operation_id,)).fetchone()
+        conn.execute("DELETE FROM operation_search WHERE rowid = ?", (operation_id,))
+        if row is None:
+            return
+        log = self._read_log_chunks(conn, operation_id).decode("utf-8", errors="replace")
+        conn.execute(
+            "INSERT INTO operation_search (rowid, log, error) VALUES (?, ?, ?)",
+            (operation_id, _search_text(log), _search_text(row[0])),
+        )
+    
+    def search_operations(
+        self,
+        query: str,
+        kind: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Dict[str, Any]:
+        """Full-text search over operation transcripts and cluster reconcile errors
+        
+        Args:
+            query: Words that must all occur; a query wrapped in double quotes
+                is matched as one phrase
+            kind: Restrict to ``operation`` or ``cluster`` hits
+            limit/offset: Page of hits, best match first
+        
+        Returns:
+            ``{"items": [...], "total": n}``; ``snippet`` is HTML-escaped
+            text with matches wrapped in ``<mark>``/``</mark>``
+        """
+        match = fts_query(query)
+        if not match:
+            return {"items": [], "total": 0}
+        
+        delimiters = f"char({ord(SNIPPET_OPEN)}), char({ord(SNIPPET_CLOSE)})"
+        sources = []
+        if kind in (None, "operation"):
+            sources.append(f"""
+                SELECT 'operation' AS kind, o.id AS id, o.cluster_name AS cluster_name,
+                       o.operation AS operation, o.status AS status,
+                       COALESCE(o.completed_at, o.started_at) AS timestamp,
+                       snippet(operation_search, -1, {delimiters}, '…', {SEARCH_SNIPPET_TOKENS}) AS snippet,
+                       bm25(operation_search) AS rank
+                FROM operation_search JOIN operations o ON o.id = operation_search.rowid
+                WHERE operation_search MATCH :q
+            """)
+        if kind in (None, "cluster"):
+            sources.append(f"""
+                SELECT 'cluster' AS kind, c.id AS id, c.name AS cluster_name,
+                       'reconcile' AS operation, c.actual_state AS status,
+                       COALESCE(c.last_reconciled_at, c.updated_at) AS timestamp,
+                       snippet(cluster_error_search, 0, {delimiters}, '…', {SEARCH_SNIPPET_TOKENS}) AS snippet,
+                       bm25(cluster_error_search) AS rank
+                FROM cluster_error_search JOIN clusters c ON c.id = cluster_error_search.rowid
+                WHERE cluster_error_search MATCH :q
+            """)
+        if not sources:
+            raise ValueError(f"Unknown search kind: {kind}")
+        union = " UNION ALL ".join(sources)
+        
+        with self._get_conn(readonly=True) as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM ({union})", {"q": match}).fetchone()[0]
+            rows = conn.execute(f"""
+                SELECT kind, id, cluster_name, operation, status, timestamp, snippet
+                FROM ({union})
+                ORDER BY rank, timestamp DESC
+                LIMIT :limit OFFSET :offset
+            """, {"q": match, "limit": limit, "offset": offset}).fetchall()
+        items = [dict(row) for row in rows]
+        for item in items:
+            item["snippet"] = highlight_snippet(item["snippet"] or "")
+        return {"items": items, "total": total}
+    
+    # Task store
+    
+    def save_tasks(self, tasks: List[Dict[str, Any]], chunks: List[Tuple[str, int, int, List[str]]]):
+        """Upsert task rows and append log chunks in one transaction
+        
+        Args:
+            tasks: Task dicts (TASK_COLUMNS keys)
+            chunks: ``(task_id, first_seq, last_seq, lines)`` tuples
+        """
+        if not tasks and not chunks:
+            return
+        with self._get_conn() as conn:
+            if tasks:
+                placeholders = ", ".join("?" for _ in TASK_COLUMNS)
+                updates = ", ".join(f"{col} = excluded.{col}" for col in TASK_COLUMNS if col != "task_id")
+                conn.executemany(
+                    f"INSERT INTO tasks ({', '.join(TASK_COLUMNS)}) VALUES ({placeholders}) "
+                    f"ON CONFLICT(task_id) DO UPDATE SET {updates}",
+                    [tuple(task.get(col) for col in TASK_COLUMNS) for task in tasks],
+                )
+            if chunks:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO task_log_chunks (task_id, first_seq, last_seq, lines) VALUES (?, ?, ?, ?)",
+                    [(task_id, first, last, json.dumps(lines)) for task_id, first, last, lines in chunks],
+                )
+    
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a persisted task row"""
+        with self._get_conn(readonly=True) as conn:
+            row = conn.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            return dict(row) if row else None
+    
+    def get_task_log_tail(self, task_id: str, max_lines: int) -> List[Tuple[int, str]]:
+        """Last ``max_lines`` persisted log lines of a task as ``(seq, line)``"""
+        tail: List[Tuple[int, str]] = []
+        with self._get_conn(readonly=True) as conn:
+            cursor = conn.execute("""
+                SELECT first_seq, lines FROM task_log_chunks
+                WHERE task_id = ?
+                ORDER BY first_seq DESC
+            """, (task_id,))
+            for row in cursor:
+                lines = json.loads(row["lines"])
+                tail[:0] = [(row["first_seq"] + i, line) for i, line in enumerate(lines)]
+                if len(tail) >= max_lines:
+                    break
+        return tail[-max_lines:] if max_lines else []
+    
+    def fail_unfinished_tasks(self, error: str) -> int:
+        """Mark tasks left pending/running by a previous process as failed"""
+        now = datetime.utcnow().isoformat()
+        with self._get_conn() as conn:
+            cursor = conn.execute("""
+                UPDATE tasks SET status = 'failed', error = ?, updated_at = ?, completed_at = ?
+                WHERE status IN ('pending', 'running')
+            """, (error, now, now))
+            return cursor.rowcount
+    
+    def delete_tasks_before(self, cutoff: str) -> int:
+        """Delete finished tasks (and their logs) completed before ``cutoff``"""
+        with self._get_conn() as conn:
+            conn.execute("""
+                DELETE FROM task_log_chunks WHERE task_id IN (
+                    SELECT task_id FROM tasks
+                    WHERE status IN ('completed', 'failed') AND completed_at < ?
+                )
+            """, (cutoff,))
+            cursor = conn.execute("""
+                DELETE FROM tasks WHERE status IN ('completed', 'failed') AND completed_at < ?
+            """, (cutoff,))
+            return cursor.rowcount
+    
     # CSV synchronization
     
-    def sync_from_csv(self, csv_file: str):
-        """Sync clusters from environments.csv (one-way: CSV → SQLite)"""
+    def _get_sync_state(self, source: str) -> Optional[Dict[str, Any]]:
+        """Get last recorded import state for a sync source"""
+        with self._get_conn(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM sync_state WHERE source = ?", (source,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    
+    @staticmethod
+    def _parse_csv_rows(content: str) -> List[Dict[str, Any]]:
+        """Parse environments.csv content into cluster rows"""
         import csv
+        import io
         
-        if not os.path.exists(csv_file):
-            return
+        all_lines = content.splitlines(keepends=True)
         
-        with open(csv_file, 'r') as f:
-            # Read all lines
-            all_lines = f.readlines()
-            
-            # Find header: look for "# env,provider,..." pattern in comments
-            header_line = None
-            for line in all_lines:
-                stripped = line.strip()
-                if stripped.startswith('#') and 'env' in stripped and 'provider' in stripped:
-                    # Extract header from comment line
-                    header_line = stripped[1:].strip()  # Remove leading '#'
-                    break
-            
-            # If no header in comments, use first non-comment line
-            if not header_line:
-                for line in all_lines:
-                    stripped = line.strip()
-                    if stripped and not stripped.startswith('#'):
-                        header_line = stripped
-                        break
-            
-            if not header_line:
-                return
-            
-            # Find data lines (non-comment, non-empty)
-            data_lines = []
+        # Find header: look for "# env,provider,..." pattern in comments
+        header_line = None
+        for line in all_lines:
+            stripped = line.strip()
+            if stripped.startswith('#') and 'env' in stripped and 'provider' in stripped:
+                # Extract header from comment line
+                header_line = stripped[1:].strip()  # Remove leading '#'
+                break
+        
+        # If no header in comments, use first non-comment line
+        if not header_line:
             for line in all_lines:
                 stripped = line.strip()
                 if stripped and not stripped.startswith('#'):
-                    data_lines.append(line)
-            
-            if not data_lines:
-                return
-            
-            # Create a file-like object with header + data
-            import io
-            csv_content = header_line + '\n' + ''.join(data_lines)
-            reader = csv.DictReader(io.StringIO(csv_content))
-            
-            for row in reader:
-                if 'env' not in row or not row['env']:
-                    continue
-                cluster_name = row['env']
-                
-                # Check if exists
-                existing = self.get_cluster(cluster_name)
-                if existing:
-                    # Update if CSV has changes
-                    self.update_cluster(cluster_name, {
-                        'provider': row['provider'],
-                        'node_port': int(row['node_port']) if row.get('node_port') else None,
-                        'pf_port': int(row['pf_port']) if row.get('pf_port') else None,
-                        'http_port': int(row['http_port']) if row.get('http_port') else None,
-                        'https_port': int(row['https_port']) if row.get('https_port') else None,
-                    })
-                else:
-                    # Insert new
-                    self.insert_cluster({
-                        'name': cluster_name,
-                        'provider': row['provider'],
-                        'node_port': int(row['node_port']) if row.get('node_port') else None,
-                        'pf_port': int(row['pf_port']) if row.get('pf_port') else None,
-                        'http_port': int(row['http_port']) if row.get('http_port') else None,
-                        'https_port': int(row['https_port']) if row.get('https_port') else None,
-                        'status': 'unknown'  # Will be updated by actual cluster check
-                    })
+                    header_line = stripped
+                    break
+        
+        if not header_line:
+            return []
+        
+        # Find data lines (non-comment, non-empty)
+        data_lines = []
+        for line in all_lines:
+            stripped = line.strip()
+            if stripped and not stripped.startswith('#'):
+                data_lines.append(line if line.endswith('\n') else line + '\n')
+        
+        if not data_lines:
+            return []
+        
+        # Create a file-like object with header + data
+        csv_content = header_line + '\n' + ''.join(data_lines)
+        reader = csv.DictReader(io.StringIO(csv_content))
+        
+        def _port(value):
+            return int(value) if value else None
+        
+        rows = []
+        for row in reader:
+            if 'env' not in row or not row['env']:
+                continue
+            rows.append({
+                'name': row['env'],
+                'provider': row['provider'],
+                'node_port': _port(row.get('node_port')),
+                'pf_port': _port(row.get('pf_port')),
+                'http_port': _port(row.get('http_port')),
+                'https_port': _port(row.get('https_port')),
+            })
+        return rows
+    
+    def sync_from_csv(self, csv_file: str, force: bool = False) -> int:
+        """Sync clusters from environments.csv (one-way: CSV → SQLite)
+        
+        The import is gated on the file's mtime/size and content hash recorded
+        in ``sync_state``: an unchanged file costs one stat() and one indexed
+        lookup. When the content did change, only rows that differ from the
+        database are upserted, in a single transaction.
+        
+        Returns:
+            Number of cluster rows inserted or updated
+        """
+        import hashlib
+        
+        try:
+            st = os.stat(csv_file)
+        except FileNotFoundError:
+            return 0
+        
+        source = os.path.abspath(csv_file)
+        state = None if force else self._get_sync_state(source)
+        if state and state['mtime_ns'] == st.st_mtime_ns and state['size'] == st.st_size:
+            return 0
+        
+        with open(csv_file, 'rb') as f:
+            raw = f.read()
+        content_hash = hashlib.sha256(raw).hexdigest()
+        
+        if state and state['content_hash'] == content_hash:
+            # Touched but not modified: just remember the new mtime
+            self._record_sync_state(source, st, content_hash)
+            return 0
+        
+        rows = self._parse_csv_rows(raw.decode('utf-8', errors='replace'))
+        columns = ('name', 'provider', 'node_port', 'pf_port', 'http_port', 'https_port')
+        
+        with self._get_conn() as conn:
+            cursor = conn.cursor()
+            existing = {
+                r['name']: tuple(r[c] for c in columns)
+                for r in cursor.execute(f"SELECT {', '.join(columns)} FROM clusters")
+            }
+            changed = [
+                tuple(row[c] for c in columns)
+                for row in rows
+                if existing.get(row['name']) != tuple(row[c] for c in columns)
+            ]
+            if changed:
+                # New rows start as 'unknown' (updated by actual cluster check);
+                # existing rows only get CSV-owned columns refreshed.
+                cursor.executemany("""
+                    INSERT INTO clusters (name, provider, node_port, pf_port, http_port, https_port, status)
+                    VALUES (?, ?, ?, ?, ?, ?, 'unknown')
+                    ON CONFLICT(name) DO UPDATE SET
+                        provider = excluded.provider,
+                        node_port = excluded.node_port,
+                        pf_port = excluded.pf_port,
+                        http_port = excluded.http_port,
+                        https_port = excluded.https_port,
+                        updated_at = datetime('now')
+                """, changed)
+            self._record_sync_state(source, st, content_hash, conn=conn)
+        
+        return len(changed)
+    
+    def _record_sync_state(self, source: str, st: os.stat_result, content_hash: str, conn=None):
+        """Remember the imported file's mtime/size/hash"""
+        sql = """
+            INSERT INTO sync_state (source, mtime_ns, size, content_hash, synced_at)
+            VALUES (?, ?, ?, ?, datetime('now'))
+            ON CONFLICT(source) DO UPDATE SET
+                mtime_ns = excluded.mtime_ns,
+                size = excluded.size,
+                content_hash = excluded.content_hash,
+                synced_at = excluded.synced_at
+        """
+        params = (source, st.st_mtime_ns, st.st_size, content_hash)
+        if conn is not None:
+            conn.execute(sql, params)
+            return
+        with self._get_conn() as own_conn:
+            own_conn.execute(sql, params)
 
 
 # Global database instance
 _db_instance: Optional[Database] = None
+_db_instance_lock = threading.Lock()
 
 
 def get_db() -> Database:
     """Get or create global database instance"""
     global _db_instance
     if _db_instance is None:
-        db_path = os.getenv("DB_PATH", "/data/kindler-webui/kindler.db")
-        _db_instance = Database(db_path)
+        with _db_instance_lock:
+            if _db_instance is None:
+                db_path = os.getenv("DB_PATH", "/data/kindler-webui/kindler.db")
+                _db_instance = Database(db_path)
     return _db_instance
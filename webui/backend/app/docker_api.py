@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Docker Engine API client over the Unix socket (stdlib only).
+
+Used by the backend (provider inventory) as a library and by the host
+scripts as a CLI, replacing per-call ``docker inspect`` subprocesses:
+
+    python3 webui/backend/app/docker_api.py node-ips [--provider k3d] [--cluster NAME] [--json]
+    python3 webui/backend/app/docker_api.py ip NAME
+
+Node containers of k3d/kind clusters are listed with one
+``GET /containers/json`` per provider, filtered by the provider's cluster
+label (Docker ANDs several ``label`` filters, so providers cannot share one
+call); the routing IP of every cluster comes out of that single listing.
+Keep it importable without the ``app`` package and runnable by the host's
+python3 (no third-party modules, no 3.9+ only syntax).
+"""
+
+import argparse
+import http.client
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+
+# Label carrying the cluster name on node containers, per provider
+PROVIDER_LABELS = {
+    "k3d": "k3d.cluster",
+    "kind": "io.x-k8s.kind.cluster",
+}
+ROLE_LABELS = {
+    "k3d": "k3d.role",
+    "kind": "io.x-k8s.kind.role",
+}
+DEFAULT_SOCKET = "/var/run/docker.sock"
+
+
+def default_socket_path() -> str:
+    """Socket from DOCKER_SOCKET, else a unix:// DOCKER_HOST, else the default"""
+    path = os.getenv("DOCKER_SOCKET")
+    if path:
+        return path
+    host = os.getenv("DOCKER_HOST", "")
+    if host.startswith("unix://"):
+        return host[len("unix://"):]
+    return DEFAULT_SOCKET
+
+
+class DockerAPIError(Exception):
+    """Non-2xx answer from the Docker Engine API"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Docker API error {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP/1.1 connection to a Unix socket (keep-alive, reused by the pool)"""
+
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class DockerClient:
+    """Docker Engine API client with a bounded pool of keep-alive connections
+
+    Connections are opened lazily up to ``pool_size`` and handed out LIFO;
+    when all are busy callers wait up to ``timeout`` seconds. A request on a
+    kept-alive connection the daemon already closed is retried once on a
+    fresh connection (all requests made here are idempotent GETs).
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, pool_size: int = 4, timeout: float = 10.0):
+        self.socket_path = socket_path or default_socket_path()
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[UnixHTTPConnection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        # Counters reported by stats()
+        self._requests = 0
+        self._connects = 0
+        self._retries = 0
+
+    # -- pool ------------------------------------------------------------
+
+    def _acquire(self) -> UnixHTTPConnection:
+        if self._closed:
+            raise RuntimeError("Docker client is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.pool_size
+            if create:
+                self._created += 1
+                self._connects += 1
+        if create:
+            return UnixHTTPConnection(self.socket_path, self.timeout)
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Timed out after {self.timeout}s waiting for a Docker API connection")
+
+    def _release(self, conn: UnixHTTPConnection, discard: bool = False):
+        if discard or self._closed:
+            with self._lock:
+                self._created -= 1
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    def close(self):
+        """Close idle connections; busy ones are closed on release"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "socket": self.socket_path,
+                "pool_size": self.pool_size,
+                "open": self._created,
+                "idle": self._idle.qsize(),
+                "requests": self._requests,
+                "connects": self._connects,
+                "retries": self._retries,
+            }
+
+    # -- requests --------------------------------------------------------
+
+    def get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """GET ``path`` and decode the JSON answer (DockerAPIError on non-2xx)"""
+        url = path + ("?" + urlencode(params) if params else "")
+        retry = True
+        while True:
+            conn = self._acquire()
+            reused = conn.sock is not None
+            try:
+                conn.request("GET", url, headers={"Host": "docker"})
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self._release(conn, discard=True)
+                # Kept-alive connection closed by the daemon: retry once on a new one
+                if not (reused and retry):
+                    raise
+                retry = False
+                with self._lock:
+                    self._retries += 1
+                continue
+            except BaseException:
+                self._release(conn, discard=True)
+                raise
+            break
+        self._release(conn, discard=response.will_close)
+        with self._lock:
+            self._requests += 1
+        if response.status >= 300:
+            try:
+                message = json.loads(body).get("message", "")
+            except ValueError:
+                message = body.decode("utf-8", errors="replace")
+            raise DockerAPIError(response.status, message or response.reason)
+        return json.loads(body) if body else None
+
+    def containers(self, filters: Optional[Dict[str, List[str]]] = None, all: bool = True) -> List[Dict[str, Any]]:
+        """``GET /containers/json`` (``all`` includes stopped containers)"""
+        params: Dict[str, Any] = {"all": "1" if all else "0"}
+        if filters:
+            params["filters"] = json.dumps(filters)
+        return self.get("/containers/json", params) or []
+
+    def inspect(self, container: str) -> Optional[Dict[str, Any]]:
+        """``GET /containers/{id}/json``; None if the container does not exist"""
+        try:
+            return self.get(f"/containers/{quote(container, safe='')}/json")
+        except DockerAPIError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def events(self, filters: Optional[Dict[str, List[str]]] = None) -> "EventStream":
+        """Open ``GET /events`` on a dedicated connection (not pooled)
+
+        Returns once the response headers arrived, i.e. after the daemon
+        subscribed: every event from then on is delivered by the stream.
+        """
+        conn = UnixHTTPConnection(self.socket_path, self.timeout)
+        try:
+            conn.request("GET", "/events" + ("?" + urlencode({"filters": json.dumps(filters)}) if filters else ""),
+                         headers={"Host": "docker"})
+            response = conn.getresponse()
+            if response.status >= 300:
+                raise DockerAPIError(response.status, response.read().decode("utf-8", errors="replace").strip())
+            # Events can be minutes apart: only the connect/headers phase is bounded
+            conn.sock.settimeout(None)
+        except BaseException:
+            conn.close()
+            raise
+        with self._lock:
+            self._requests += 1
+        return EventStream(conn, response)
+
+    def node_containers(self, provider: Optional[str] = None, cluster: Optional[str] = None) -> List["NodeContainer"]:
+        """k3d/kind node containers, one listing call per provider"""
+        nodes: List[NodeContainer] = []
+        for name, label in PROVIDER_LABELS.items():
+            if provider is not None and name != provider:
+                continue
+            selector = f"{label}={cluster}" if cluster else label
+            for summary in self.containers({"label": [selector]}):
+                node = node_from_summary(summary)
+                if node:
+                    nodes.append(node)
+        return nodes
+
+
+class EventStream:
+    """Open ``GET /events`` response (newline-delimited JSON, chunked)"""
+
+    def __init__(self, conn: UnixHTTPConnection, response: http.client.HTTPResponse):
+        self._conn = conn
+        self._response = response
+
+    def next(self) -> Optional[Dict[str, Any]]:
+        """Block for the next event; None once the stream ended or was closed"""
+        while True:
+            try:
+                line = self._response.readline()
+            except (http.client.HTTPException, OSError, ValueError):
+                return None
+            if not line:
+                return None
+            try:
+                return json.loads(line)
+            except ValueError:
+                continue
+
+    def close(self):
+        """Close the stream; also wakes a thread blocked in ``next()``"""
+        sock = self._conn.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._conn.close()
+
+
+@dataclass
+class NodeContainer:
+    """One k3d/kind node container"""
+    id: str
+    name: str
+    provider: str
+    cluster: str
+    role: Optional[str]
+    state: str
+    # network name -> IPv4 address, sorted by network name (as Docker returns them)
+    networks: Dict[str, str] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _node(cid: str, name: str, labels: Dict[str, str], state: str, networks: Dict[str, Any]) -> Optional[NodeContainer]:
+    for provider, label in PROVIDER_LABELS.items():
+        if labels.get(label):
+            break
+    else:
+        return None
+    return NodeContainer(
+        id=cid,
+        name=name.lstrip("/"),
+        provider=provider,
+        cluster=labels[label],
+        role=labels.get(ROLE_LABELS[provider]),
+        state=state,
+        networks={net: info["IPAddress"] for net, info in networks.items() if (info or {}).get("IPAddress")},
+    )
+
+
+def node_from_inspect(data: Dict[str, Any]) -> Optional[NodeContainer]:
+    """Build a node from one ``docker inspect`` object (None if not a k3d/kind node)"""
+    return _node(
+        data["Id"],
+        data.get("Name", ""),
+        (data.get("Config") or {}).get("Labels") or {},
+        (data.get("State") or {}).get("Status", "unknown"),
+        (data.get("NetworkSettings") or {}).get("Networks") or {},
+    )
+
+
+def node_from_summary(data: Dict[str, Any]) -> Optional[NodeContainer]:
+    """Build a node from one ``GET /containers/json`` entry (None if not a k3d/kind node)"""
+    return _node(
+        data["Id"],
+        (data.get("Names") or [""])[0],
+        data.get("Labels") or {},
+        data.get("State") or "unknown",
+        (data.get("NetworkSettings") or {}).get("Networks") or {},
+    )
+
+
+def route_ip(provider: str, cluster: str, nodes: Iterable[NodeContainer]) -> Optional[str]:
+    """IP HAProxy should route to (same preference as ``haproxy_route.sh add_backend``)
+
+    kind: control-plane node on the ``kind`` network, else its first IP.
+    k3d: ``server-0`` on ``k3d-<name>``, then ``k3d-shared``, else its first IP.
+    """
+    if provider == "kind":
+        node_name, preferred = f"{cluster}-control-plane", ["kind"]
+    else:
+        node_name, preferred = f"k3d-{cluster}-server-0", [f"k3d-{cluster}", "k3d-shared"]
+    for node in nodes:
+        if node.name != node_name:
+            continue
+        for network in preferred:
+            if node.networks.get(network):
+                return node.networks[network]
+        return next(iter(node.networks.values()), None)
+    return None
+
+
+def cluster_ips(nodes: Iterable[NodeContainer]) -> Dict[Tuple[str, str], Optional[str]]:
+    """Routing IP per ``(provider, cluster)``, sorted by cluster then provider
+
+    Keyed by both: a k3d and a kind cluster may share a name.
+    """
+    grouped: Dict[Tuple[str, str], List[NodeContainer]] = {}
+    for node in nodes:
+        grouped.setdefault((node.provider, node.cluster), []).append(node)
+    return {
+        (provider, cluster): route_ip(provider, cluster, members)
+        for (provider, cluster), members in sorted(grouped.items(), key=lambda item: item[0][::-1])
+    }
+
+
+_client: Optional[DockerClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> DockerClient:
+    """Get or create the shared client (DOCKER_SOCKET / DOCKER_API_POOL_SIZE)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = DockerClient(
+                    pool_size=int(os.getenv("DOCKER_API_POOL_SIZE", "4")),
+                    timeout=float(os.getenv("DOCKER_API_TIMEOUT", "10")),
+                )
+    return _client
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Resolve k3d/kind node IPs via the Docker Engine API")
+    parser.add_argument("--socket", help=f"Docker socket (default: DOCKER_SOCKET, DOCKER_HOST or {DEFAULT_SOCKET})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ips = sub.add_parser("node-ips", help="routing IP of every cluster: '<cluster> <provider> <ip>' per line")
+    ips.add_argument("--provider", choices=sorted(PROVIDER_LABELS))
+    ips.add_argument("--cluster")
+    ips.add_argument("--json", action="store_true", help="print the node containers as JSON")
+    one = sub.add_parser("ip", help="routing IP of one cluster (exit 1 if unknown)")
+    one.add_argument("cluster")
+    one.add_argument("--provider", choices=sorted(PROVIDER_LABELS))
+    args = parser.parse_args(argv)
+
+    client = DockerClient(socket_path=args.socket, pool_size=1)
+    started = time.monotonic()
+    try:
+        nodes = client.node_containers(provider=args.provider, cluster=args.cluster)
+    except (OSError, DockerAPIError, ValueError) as e:
+        print(f"[docker_api] {e}", file=sys.stderr)
+        return 2
+    finally:
+        client.close()
+
+    resolved = cluster_ips(nodes)
+    if args.command == "ip":
+        ips = [ip for (_, cluster), ip in resolved.items() if cluster == args.cluster and ip]
+        if len(ips) > 1:
+            print(f"[docker_api] {args.cluster} exists for several providers; pass --provider", file=sys.stderr)
+        if len(ips) != 1:
+            return 1
+        print(ips[0])
+        return 0
+    if args.json:
+        print(json.dumps({
+            "clusters": [
+                {"provider": provider, "cluster": cluster, "ip": ip}
+                for (provider, cluster), ip in resolved.items()
+            ],
+            "nodes": [node.to_dict() for node in nodes],
+            "requests": client.stats()["requests"],
+            "duration_seconds": round(time.monotonic() - started, 4),
+        }, indent=2))
+        return 0
+    for (provider, cluster), ip in resolved.items():
+        if ip:
+            print(f"{cluster} {provider} {ip}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,17 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .api import clusters, tasks, websocket
+from .api import clusters, inventory, operations, reconcile, services, tasks, websocket
+from .db import PORT_RANGES, get_db
+from .services.db_service import db_service, shutdown_db_executor
+from .services.health_monitor import health_monitor
+from .services.inventory_service import provider_inventory
+from .services.operation_scheduler import operation_scheduler
+from .services.prober import http_prober
+from .services.reconcile_service import reconciler
+from .services.task_manager import task_manager
+from .services.watch_service import cluster_watch
+from .websocket.manager import ws_manager
 
 # Configure logging
 logging.basicConfig(
@@ -29,8 +39,64 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Database initialization failed: {e}")
     
+    # environments.csv -> clusters, on the DB executor (cluster API calls re-check it)
+    await db_service.sync_from_csv()
+    
+    # Task store: write-behind, memory eviction and retention
+    try:
+        await task_manager.start()
+    except Exception as e:
+        logger.error(f"Failed to start task store: {e}")
+    
+    # Single change detector behind GET /api/clusters/watch
+    try:
+        await cluster_watch.start()
+    except Exception as e:
+        logger.error(f"Failed to start cluster watch: {e}")
+    
+    # Cluster changes -> WebSocket topics "clusters" and "cluster:<name>"
+    def push_cluster_event(event):
+        message = {"type": "cluster_event", "event": event.type,
+                   "resource_version": event.resource_version, "object": event.object}
+        name = event.object.get("name")
+        ws_manager.publish("clusters", message, key=name)
+        if name:
+            ws_manager.publish(f"cluster:{name}", message, key="state")
+    
+    cluster_watch.add_listener(push_cluster_event)
+    
+    # k3d/kind clusters and node IPs, kept current from the Docker event stream
+    try:
+        await provider_inventory.start()
+    except Exception as e:
+        logger.error(f"Failed to start provider inventory: {e}")
+    
+    # Desired-state changes (API, scripts) -> incremental reconcile of those clusters
+    try:
+        await reconciler.start()
+        cluster_watch.add_listener(reconciler.on_cluster_event)
+    except Exception as e:
+        logger.error(f"Failed to start reconciler: {e}")
+    
+    # Background probes of global services; push status changes to the "services" topic
+    async def push_service_status(service: dict):
+        ws_manager.publish("services", {"type": "service_status", "service": service}, key=service["name"])
+    
+    health_monitor.add_listener(push_service_status)
+    await health_monitor.start()
+    
     yield
     logger.info("Shutting down Kindler Web GUI Backend")
+    await operation_scheduler.shutdown()
+    await reconciler.stop()
+    await provider_inventory.stop()
+    await health_monitor.stop()
+    await cluster_watch.stop()
+    await ws_manager.shutdown()
+    await task_manager.stop()
+    await http_prober.close()
+    shutdown_db_executor()
+    get_db().close()
 
 
 # Create FastAPI app
@@ -48,10 +114,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Include routers
 app.include_router(clusters.router)
+app.include_router(inventory.router)
+app.include_router(operations.router)
+app.include_router(reconcile.router)
+app.include_router(services.router)
 app.include_router(tasks.router)
 app.include_router(websocket.router)
 
@@ -66,6 +137,18 @@ async def health_check():
     }
 
 
+@app.get("/api/db/stats")
+async def db_stats():
+    """SQLite connection pool statistics (hits, waits, open connections)"""
+    return get_db().pool_stats()
+
+
+@app.get("/api/ws/stats")
+async def ws_stats():
+    """WebSocket send queue depth, drops, coalescing and slow-client evictions"""
+    return ws_manager.stats()
+
+
 @app.get("/api/config")
 async def get_config():
     """Get system configuration"""
@@ -74,9 +157,7 @@ async def get_config():
         "providers": ["kind", "k3d"],
         "default_provider": "k3d",
         "default_node_port": 30080,
-        "default_pf_port_range": [19001, 19999],
-        "default_http_port_range": [18090, 18999],
-        "default_https_port_range": [18443, 18999]
+        **{f"default_{purpose}_range": list(PORT_RANGES[purpose]) for purpose in PORT_RANGES},
     }
 
 
@@ -1,5 +1,5 @@
 """Cluster data models"""
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field, field_validator
 import re
 
@@ -54,6 +54,8 @@ class ClusterInfo(ClusterBase):
     actual_state: Optional[str] = Field(default=None)   # unknown | creating | running | failed | deleting
     last_reconciled_at: Optional[str] = None
     reconcile_error: Optional[str] = None
+    # Change version of the row (bumped on every write; used for ETags/watch)
+    resource_version: Optional[int] = None
 
 
 class ClusterStatus(BaseModel):
@@ -64,4 +66,39 @@ class ClusterStatus(BaseModel):
     nodes_total: int = 0
     portainer_status: str = "unknown"  # online, offline, unknown
     argocd_status: str = "unknown"  # healthy, degraded, unknown
+    # When the older of the two service checks above was made
+    services_checked_at: Optional[str] = None
+    services_age_seconds: Optional[float] = None
     error_message: Optional[str] = None
+
+
+def cluster_to_info_dict(cluster: Dict[str, Any], fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Map a clusters row to the ClusterInfo shape (optionally projected)
+
+    Builds plain dicts instead of validating a ClusterInfo per row; rows
+    come from our own database so validation is pure overhead on list calls.
+    """
+    info = {
+        "name": cluster["name"],
+        "provider": cluster.get("provider"),
+        "node_port": cluster.get("node_port") or 30080,
+        "pf_port": cluster.get("pf_port") or 19000,
+        "http_port": cluster.get("http_port") or 18080,
+        "https_port": cluster.get("https_port") or 18443,
+        "cluster_subnet": cluster.get("subnet"),
+        "register_portainer": True,
+        "haproxy_route": True,
+        "register_argocd": True,
+        # 统一以 actual_state 为准，避免旧的 status 字段造成误判
+        "status": cluster.get("actual_state") or "unknown",
+        "created_at": cluster.get("created_at"),
+        "updated_at": cluster.get("updated_at"),
+        "desired_state": cluster.get("desired_state"),
+        "actual_state": cluster.get("actual_state"),
+        "last_reconciled_at": cluster.get("last_reconciled_at"),
+        "reconcile_error": cluster.get("reconcile_error"),
+        "resource_version": cluster.get("resource_version"),
+    }
+    if fields:
+        return {f: info[f] for f in fields}
+    return info
@@ -11,10 +11,16 @@ class TaskStatus(BaseModel):
     progress: int = Field(default=0, ge=0, le=100)
     message: Optional[str] = None
     logs: List[str] = Field(default_factory=list)
+    # Sequence number of the newest log line (lines are numbered from 1)
+    log_seq: int = 0
     error: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     completed_at: Optional[datetime] = None
+    # Operation scheduler: 1-based queue position while queued, 0 once running
+    queue_position: Optional[int] = None
+    queued_at: Optional[datetime] = None
+    wait_seconds: Optional[float] = None
 
 
 class TaskCreate(BaseModel):
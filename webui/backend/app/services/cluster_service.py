@@ -1,14 +1,90 @@
 """Cluster management service - Real cluster operations via subprocess"""
 import asyncio
+import codecs
 import logging
 import os
-from typing import Optional, Dict, Callable
+from typing import Optional, Dict, Callable, List
 from pathlib import Path
-from .db_service import DBService
+from .db_service import db_service, run_db
 from ..db import get_db
 
 logger = logging.getLogger(__name__)
 
+# Bytes requested per read() of the script's stdout
+READ_CHUNK_SIZE = int(os.getenv("OPERATION_READ_CHUNK", "65536"))
+# A line longer than this is emitted in pieces instead of buffering forever
+MAX_LINE_BYTES = 1024 * 1024
+# Operation log text buffered before it is appended to SQLite
+LOG_CHUNK_BYTES = int(os.getenv("OPERATION_LOG_CHUNK_BYTES", "65536"))
+# Kindler checkout on the host (scripts run there as the ``cloud`` user)
+HOST_PROJECT_ROOT = "/home/cloud/github/hofmannhe/kindler"
+
+
+def host_command(command: str) -> List[str]:
+    """Wrap a shell command so it runs in the host namespaces, in the project root"""
+    return [
+        "nsenter", "-t", "1", "-m", "-u", "-i", "-n",
+        "su", "-", "cloud", "-c",
+        f"cd {HOST_PROJECT_ROOT} && {command}"
+    ]
+
+
+class LineSplitter:
+    """Split a byte stream into text lines (incremental UTF-8 decoding)
+    
+    Bytes accumulate in a ``bytearray``; complete lines are cut at the last
+    newline of each chunk and decoded in one call. A newline byte never occurs
+    inside a multi-byte UTF-8 sequence, and the incremental decoder carries
+    partial sequences across the forced split of an over-long line.
+    """
+    
+    def __init__(self):
+        self._buffer = bytearray()
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    
+    def feed(self, data: bytes) -> List[str]:
+        self._buffer += data
+        end = self._buffer.rfind(b"\n")
+        if end < 0:
+            if len(self._buffer) < MAX_LINE_BYTES:
+                return []
+            end = len(self._buffer) - 1
+        with memoryview(self._buffer) as view:
+            text = self._decoder.decode(view[:end + 1])
+        del self._buffer[:end + 1]
+        return text.splitlines(keepends=True)
+    
+    def close(self) -> List[str]:
+        """Flush the trailing partial line"""
+        with memoryview(self._buffer) as view:
+            text = self._decoder.decode(view, final=True)
+        self._buffer.clear()
+        return [text] if text else []
+
+
+class OperationLogWriter:
+    """Append operation output to ``operation_log_chunks`` in compressed batches"""
+    
+    def __init__(self, db, operation_id: int, chunk_bytes: int = LOG_CHUNK_BYTES):
+        self.db = db
+        self.operation_id = operation_id
+        self.chunk_bytes = chunk_bytes
+        self._parts: List[str] = []
+        self._size = 0
+    
+    async def write(self, text: str):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.chunk_bytes:
+            await self.flush()
+    
+    async def flush(self):
+        if not self._parts:
+            return
+        content = "".join(self._parts)
+        self._parts, self._size = [], 0
+        await run_db(self.db.append_operation_log, self.operation_id, content)
+
 
 class ClusterService:
     """Service for cluster operations using real scripts"""
@@ -18,6 +94,7 @@ class ClusterService:
         self.scripts_dir = os.getenv("SCRIPTS_DIR", "/app/scripts")
         self.timeout = int(os.getenv("OPERATION_TIMEOUT", "300"))  # 5 minutes default
         self.db = get_db()
+        self.db_service = db_service
         
         # Verify scripts directory exists
         if not os.path.isdir(self.scripts_dir):
@@ -53,24 +130,50 @@ class ClusterService:
         # This matches EXACTLY how predefined clusters are created (direct host execution)
         
         # Log operation start
-        op_id = self.db.log_operation_start(cluster_name, operation)
+        op_id = await run_db(self.db.log_operation_start, cluster_name, operation)
         
         # Build command to execute on host using nsenter
         # nsenter -t 1 -m -u -n -i executes in host's namespaces
-        script_path = f"/home/cloud/github/hofmannhe/kindler/scripts/{script_name}"
-        
-        # Build full command
-        cmd = [
-            "nsenter", "-t", "1", "-m", "-u", "-i", "-n",
-            "su", "-", "cloud", "-c",
-            f"cd /home/cloud/github/hofmannhe/kindler && {script_path} {' '.join(args)}"
-        ]
+        script_path = f"{HOST_PROJECT_ROOT}/scripts/{script_name}"
+        cmd = host_command(f"{script_path} {' '.join(args)}")
         
         logger.info(f"Executing on host (nsenter): {script_name} {' '.join(args)}")
         
         if progress_callback:
             await progress_callback(f"[INFO] Executing on host: {script_name} {' '.join(args)}\n")
         
+        return await self._execute(cmd, op_id, progress_callback)
+    
+    async def _execute(
+        self,
+        cmd: List[str],
+        op_id: int,
+        progress_callback: Optional[Callable] = None
+    ) -> bool:
+        """
+        Run ``cmd`` and stream its output
+        
+        stdout is read in large chunks and split into lines incrementally;
+        lines go to ``progress_callback`` and, in batches, to the operation
+        log in SQLite. The whole run (including exit) has one deadline of
+        ``OPERATION_TIMEOUT`` seconds.
+        """
+        log_writer = OperationLogWriter(self.db, op_id)
+        splitter = LineSplitter()
+        process = None
+        
+        async def emit(lines: List[str]):
+            for line in lines:
+                await log_writer.write(line)
+                if progress_callback:
+                    await progress_callback(line)
+        
+        async def finish(status: str, error_message: Optional[str], message: Optional[str] = None):
+            if message:
+                await emit([message])
+            await log_writer.flush()
+            await run_db(self.db.log_operation_complete, op_id, status, None, error_message)
+        
         try:
             # Create subprocess
             process = await asyncio.create_subprocess_exec(
@@ -79,80 +182,53 @@ class ClusterService:
                 stderr=asyncio.subprocess.STDOUT
             )
             
-            # Stream output
-            full_output = []
-            while True:
-                try:
-                    # Read with timeout
-                    line = await asyncio.wait_for(
-                        process.stdout.readline(),
-                        timeout=self.timeout
-                    )
-                    
-                    if not line:
+            async with asyncio.timeout(self.timeout):
+                while True:
+                    chunk = await process.stdout.read(READ_CHUNK_SIZE)
+                    if not chunk:
                         break
-                    
-                    decoded_line = line.decode('utf-8', errors='replace')
-                    full_output.append(decoded_line)
-                    
-                    # Send to callback
-                    if progress_callback:
-                        await progress_callback(decoded_line)
-                
-                except asyncio.TimeoutError:
-                    error_msg = f"Operation timeout after {self.timeout}s"
-                    logger.error(error_msg)
-                    if progress_callback:
-                        await progress_callback(f"[ERROR] {error_msg}\n")
-                    
-                    # Kill the process
-                    process.kill()
-                    await process.wait()
-                    
-                    # Log failure
-                    self.db.log_operation_complete(
-                        op_id,
-                        "timeout",
-                        ''.join(full_output),
-                        error_msg
-                    )
-                    return False
-            
-            # Wait for process to complete
-            returncode = await process.wait()
-            
-            # Log completion
-            log_output = ''.join(full_output)
-            status = "success" if returncode == 0 else "failed"
-            error_message = None if returncode == 0 else f"Exit code: {returncode}"
-            
-            self.db.log_operation_complete(op_id, status, log_output, error_message)
-            
-            if returncode == 0:
-                if progress_callback:
-                    await progress_callback(f"[SUCCESS] Operation completed successfully\n")
-                return True
-            else:
-                error_msg = f"Script failed with exit code {returncode}"
-                logger.error(error_msg)
-                if progress_callback:
-                    await progress_callback(f"[ERROR] {error_msg}\n")
-                return False
+                    await emit(splitter.feed(chunk))
+                await emit(splitter.close())
+                returncode = await process.wait()
+        
+        except asyncio.CancelledError:
+            # Cancelled by the operation scheduler: do not leave the script running
+            await self._kill(process)
+            await finish("cancelled", "Cancelled", "[ERROR] Operation cancelled\n")
+            raise
+        
+        except TimeoutError:
+            error_msg = f"Operation timeout after {self.timeout}s"
+            logger.error(error_msg)
+            await self._kill(process)
+            await emit(splitter.close())
+            await finish("timeout", error_msg, f"[ERROR] {error_msg}\n")
+            return False
         
         except Exception as e:
             error_msg = f"Failed to execute script: {e}"
             logger.exception(error_msg)
-            if progress_callback:
-                await progress_callback(f"[ERROR] {error_msg}\n")
-            
-            # Log failure
-            self.db.log_operation_complete(
-                op_id,
-                "error",
-                ''.join(full_output) if 'full_output' in locals() else "",
-                error_msg
-            )
+            await self._kill(process)
+            await finish("error", error_msg, f"[ERROR] {error_msg}\n")
             return False
+        
+        if returncode == 0:
+            await finish("success", None, "[SUCCESS] Operation completed successfully\n")
+            return True
+        
+        error_msg = f"Script failed with exit code {returncode}"
+        logger.error(error_msg)
+        await finish("failed", f"Exit code: {returncode}", f"[ERROR] {error_msg}\n")
+        return False
+    
+    @staticmethod
+    async def _kill(process):
+        if process is not None and process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
     
     async def create_cluster(
         self,
@@ -181,10 +257,14 @@ class ClusterService:
         ]
         
         # Add optional parameters
-        if "node_port" in cluster_data:
-            args.extend(["--node-port", str(cluster_data["node_port"])])
-        if "pf_port" in cluster_data:
-            args.extend(["--pf-port", str(cluster_data["pf_port"])])
+        for key, flag in (
+            ("node_port", "--node-port"),
+            ("pf_port", "--pf-port"),
+            ("http_port", "--http-port"),
+            ("https_port", "--https-port"),
+        ):
+            if cluster_data.get(key) is not None:
+                args.extend([flag, str(cluster_data[key])])
         
         # Execute creation script
         # Note: create_env.sh already writes to SQLite database, so we don't need to write again
@@ -201,8 +281,7 @@ class ClusterService:
         if success:
             # Verify that the cluster was actually created and recorded in database
             # This ensures script completion (including IP allocation)
-            db_service = DBService()
-            cluster = await db_service.get_cluster(name)
+            cluster = await self.db_service.get_cluster(name)
             if not cluster:
                 logger.warning(f"Cluster {name} created but not found in database - script may have failed")
                 return False
@@ -271,8 +350,7 @@ class ClusterService:
         
         if success:
             # Update status in database
-            db_service = DBService()
-            await db_service.update_cluster(name, {"status": "running"})
+            await self.db_service.update_cluster(name, {"status": "running"})
         
         return success
     
@@ -305,8 +383,7 @@ class ClusterService:
         
         if success:
             # Update status in database
-            db_service = DBService()
-            await db_service.update_cluster(name, {"status": "stopped"})
+            await self.db_service.update_cluster(name, {"status": "stopped"})
         
         return success
     
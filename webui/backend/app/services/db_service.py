@@ -1,11 +1,45 @@
-"""Database service - interacts with SQLite database"""
+"""Database service - interacts with SQLite database
+
+All SQLite calls are dispatched to a dedicated executor so that queries never
+block the event loop (WebSocket fan-out, health checks, other requests).
+"""
+import asyncio
+import functools
 import logging
 import os
-from typing import Optional, List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, List, Dict
 from ..db import get_db
 
 logger = logging.getLogger(__name__)
 
+# Dedicated DB executor: its work queue serialises requests onto a small set of
+# threads that matches the SQLite connection pool size.
+_db_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Get or create the shared DB executor"""
+    global _db_executor
+    if _db_executor is None:
+        workers = int(os.getenv("DB_EXECUTOR_WORKERS", os.getenv("DB_READ_POOL_SIZE", "8")))
+        _db_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kindler-db")
+    return _db_executor
+
+
+async def run_db(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking Database call on the DB executor and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_db_executor():
+    """Stop the DB executor (called on application shutdown)"""
+    global _db_executor
+    if _db_executor is not None:
+        _db_executor.shutdown(wait=True)
+        _db_executor = None
+
 
 class DBService:
     """Service to interact with Kindler SQLite database"""
@@ -13,31 +47,41 @@ class DBService:
     def __init__(self):
         # Initialize SQLite database
         self.db = get_db()
+        self.csv_path = os.getenv("CSV_PATH", "/app/config/environments.csv")
         logger.info("DBService initialized with SQLite database")
+    
+    async def sync_from_csv(self) -> int:
+        """Import CSV_PATH if it exists (one-way: CSV → SQLite)
         
-        # Sync from CSV if exists (one-way: CSV → SQLite)
-        csv_path = os.getenv("CSV_PATH", "/app/config/environments.csv")
-        if os.path.exists(csv_path):
-            try:
-                self.db.sync_from_csv(csv_path)
-                logger.info(f"Synced clusters from {csv_path}")
-            except Exception as e:
-                logger.warning(f"Failed to sync from CSV: {e}")
+        Called at startup and before cluster API calls, so CSV edits are
+        picked up while running. Cheap when unchanged: gated on mtime/hash
+        recorded in sync_state.
+        """
+        if not os.path.exists(self.csv_path):
+            return 0
+        try:
+            changed = await run_db(self.db.sync_from_csv, self.csv_path)
+            if changed:
+                logger.info(f"Synced {changed} cluster(s) from {self.csv_path}")
+            return changed
+        except Exception as e:
+            logger.warning(f"Failed to sync from CSV: {e}")
+            return 0
     
     async def is_available(self) -> bool:
         """Check if database is available"""
         try:
             # Simple test query
-            self.db.list_clusters()
+            await run_db(self.db.list_clusters)
             return True
         except Exception as e:
             logger.error(f"Database not available: {e}")
             return False
     
-    async def list_clusters(self) -> List[Dict[str, any]]:
-        """List all clusters from database"""
+    async def list_clusters(self, **filters) -> List[Dict[str, any]]:
+        """List clusters from database (filters/pagination: see Database.list_clusters)"""
         try:
-            return self.db.list_clusters()
+            return await run_db(self.db.list_clusters, **filters)
         except Exception as e:
             logger.error(f"Failed to list clusters: {e}")
             return []
@@ -45,15 +89,31 @@ class DBService:
     async def get_cluster(self, name: str) -> Optional[Dict[str, any]]:
         """Get cluster by name"""
         try:
-            return self.db.get_cluster(name)
+            return await run_db(self.db.get_cluster, name)
         except Exception as e:
             logger.error(f"Failed to get cluster {name}: {e}")
             return None
     
+    async def get_change_version(self) -> Optional[int]:
+        """Current clusters change version (None if unavailable)"""
+        try:
+            return await run_db(self.db.get_change_version, "clusters")
+        except Exception as e:
+            logger.error(f"Failed to get clusters change version: {e}")
+            return None
+    
+    async def get_cluster_version(self, name: str) -> Optional[int]:
+        """resource_version of a cluster (None if missing or unavailable)"""
+        try:
+            return await run_db(self.db.get_cluster_version, name)
+        except Exception as e:
+            logger.error(f"Failed to get version of cluster {name}: {e}")
+            return None
+    
     async def cluster_exists(self, name: str) -> bool:
         """Check if cluster exists in database"""
         try:
-            return self.db.cluster_exists(name)
+            return await run_db(self.db.cluster_exists, name)
         except Exception as e:
             logger.error(f"Failed to check cluster existence {name}: {e}")
             return False
@@ -61,7 +121,7 @@ class DBService:
     async def create_cluster(self, cluster_data: Dict) -> bool:
         """Create a new cluster record in database"""
         try:
-            self.db.insert_cluster(cluster_data)
+            await run_db(self.db.insert_cluster, cluster_data)
             logger.info(f"Created cluster record: {cluster_data['name']}")
             return True
         except Exception as e:
@@ -71,7 +131,7 @@ class DBService:
     async def update_cluster(self, name: str, updates: Dict) -> bool:
         """Update cluster record in database"""
         try:
-            result = self.db.update_cluster(name, updates)
+            result = await run_db(self.db.update_cluster, name, updates)
             if result:
                 logger.info(f"Updated cluster: {name}")
             return result
@@ -82,7 +142,7 @@ class DBService:
     async def delete_cluster(self, name: str) -> bool:
         """Delete a cluster record from database"""
         try:
-            result = self.db.delete_cluster(name)
+            result = await run_db(self.db.delete_cluster, name)
             if result:
                 logger.info(f"Deleted cluster record: {name}")
             return result
@@ -90,3 +150,42 @@ class DBService:
             logger.error(f"Failed to delete cluster {name}: {e}")
             return False
 
+    
+    async def allocate_port(self, owner: str, purpose: str) -> int:
+        """Reserve a free host port for a cluster (ValueError when the range is exhausted)"""
+        return await run_db(self.db.allocate_port, owner, purpose)
+    
+    async def release_allocations(self, owner: str) -> int:
+        """Release every port/subnet reservation of a cluster"""
+        try:
+            return await run_db(self.db.release, owner)
+        except Exception as e:
+            logger.error(f"Failed to release allocations of {owner}: {e}")
+            return 0
+    
+    async def log_operation_start(self, cluster_name: str, operation: str) -> Optional[int]:
+        """Record the start of an operation"""
+        try:
+            return await run_db(self.db.log_operation_start, cluster_name, operation)
+        except Exception as e:
+            logger.error(f"Failed to log operation start for {cluster_name}: {e}")
+            return None
+    
+    async def log_operation_complete(
+        self,
+        operation_id: Optional[int],
+        status: str,
+        log_output: str = None,
+        error_message: str = None
+    ):
+        """Record the completion of an operation"""
+        if operation_id is None:
+            return
+        try:
+            await run_db(self.db.log_operation_complete, operation_id, status, log_output, error_message)
+        except Exception as e:
+            logger.error(f"Failed to log operation completion {operation_id}: {e}")
+
+
+# Singleton instance shared by API modules, services and the app lifespan
+db_service = DBService()
@@ -0,0 +1,177 @@
+"""Background health monitor for global services (Portainer/ArgoCD/HAProxy/Git)
+
+Probes every target on its own schedule (``HEALTH_CHECK_INTERVAL`` with
+random jitter, exponential backoff while a target is down) and keeps the
+latest status, a latency histogram and the last status-change time in memory.
+``GET /api/services`` then becomes a dictionary read, and status changes are
+pushed to registered listeners (WebSocket broadcast).
+"""
+
+import asyncio
+import logging
+import os
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .prober import http_prober
+
+logger = logging.getLogger(__name__)
+
+# Latency histogram bucket upper bounds (ms); the last bucket is +Inf
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000)
+
+
+@dataclass
+class MonitoredTarget:
+    """Latest known state of one monitored service"""
+    key: str
+    name: str
+    url: str
+    status: str = "unknown"  # healthy, degraded, offline, unknown
+    message: Optional[str] = "Not checked yet"
+    latency_ms: Optional[float] = None
+    last_checked_at: Optional[str] = None
+    last_change_at: Optional[str] = None
+    consecutive_failures: int = 0
+    checks: int = 0
+    histogram: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+
+    def age_seconds(self) -> Optional[float]:
+        """Seconds since the last check (None if never checked)"""
+        if self.last_checked_at is None:
+            return None
+        return (datetime.now(timezone.utc) - datetime.fromisoformat(self.last_checked_at)).total_seconds()
+
+    def observe_latency(self, latency_ms: float):
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.histogram[i] += 1
+                return
+        self.histogram[-1] += 1
+
+    def to_dict(self, with_histogram: bool = False) -> Dict[str, Any]:
+        data = {
+            "name": self.name,
+            "status": self.status,
+            "url": self.url,
+            "message": self.message,
+            "latency_ms": self.latency_ms,
+            "last_checked_at": self.last_checked_at,
+            "last_change_at": self.last_change_at,
+        }
+        if with_histogram:
+            data["consecutive_failures"] = self.consecutive_failures
+            data["checks"] = self.checks
+            data["latency_histogram_ms"] = {
+                **{str(bound): count for bound, count in zip(LATENCY_BUCKETS_MS, self.histogram)},
+                "+Inf": self.histogram[-1],
+            }
+        return data
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class HealthMonitor:
+    """Periodically probes global services and caches their status"""
+
+    def __init__(self):
+        self.base_domain = os.getenv("BASE_DOMAIN", "192.168.51.30.sslip.io")
+        self.interval = float(os.getenv("HEALTH_CHECK_INTERVAL", "15"))
+        # Fraction of the interval used as +/- random jitter
+        self.jitter = float(os.getenv("HEALTH_CHECK_JITTER", "0.2"))
+        self.max_backoff = float(os.getenv("HEALTH_CHECK_MAX_BACKOFF", "300"))
+        self.targets: Dict[str, MonitoredTarget] = {
+            "portainer": MonitoredTarget("portainer", "Portainer", f"http://portainer.devops.{self.base_domain}"),
+            "argocd": MonitoredTarget("argocd", "ArgoCD", f"http://argocd.devops.{self.base_domain}"),
+            "haproxy": MonitoredTarget("haproxy", "HAProxy", f"http://haproxy.devops.{self.base_domain}/stat"),
+            "git": MonitoredTarget("git", "Git", f"http://git.devops.{self.base_domain}"),
+        }
+        self._listeners: List[Callable[[Dict[str, Any]], Awaitable[None]]] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], Awaitable[None]]):
+        """Register an async callback invoked with a target dict on status change"""
+        self._listeners.append(callback)
+
+    @property
+    def running(self) -> bool:
+        return any(not t.done() for t in self._tasks)
+
+    async def start(self):
+        """Start one probe loop per target (called from the app lifespan)"""
+        if self.running:
+            return
+        self._tasks = [asyncio.create_task(self._monitor(target)) for target in self.targets.values()]
+        logger.info("[Health] Monitoring %d services every ~%ss", len(self.targets), self.interval)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def next_delay(self, target: MonitoredTarget) -> float:
+        """Jittered interval, doubled per consecutive failure up to max_backoff"""
+        delay = self.interval
+        if target.consecutive_failures:
+            delay = min(self.max_backoff, self.interval * (2 ** target.consecutive_failures))
+        return max(0.1, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    async def check(self, target: MonitoredTarget):
+        """Probe a target once and record the result"""
+        result = await http_prober.probe(target.url, max_age=0)
+        if result.status_code is None:
+            status, message = "offline", result.error
+        else:
+            status = "healthy" if result.reachable else "degraded"
+            message = f"HTTP {result.status_code}"
+
+        now = _now_iso()
+        changed = status != target.status
+        target.checks += 1
+        target.message = message
+        target.latency_ms = round(result.latency_ms, 2) if result.latency_ms is not None else None
+        target.last_checked_at = now
+        if result.latency_ms is not None:
+            target.observe_latency(result.latency_ms)
+        target.consecutive_failures = 0 if status == "healthy" else target.consecutive_failures + 1
+        if changed:
+            target.status = status
+            target.last_change_at = now
+            logger.info("[Health] %s is now %s (%s)", target.name, status, message)
+            await self._notify(target)
+
+    async def _notify(self, target: MonitoredTarget):
+        payload = target.to_dict()
+        for callback in list(self._listeners):
+            try:
+                await callback(payload)
+            except Exception as e:
+                logger.error("[Health] Listener failed: %s", e)
+
+    async def _monitor(self, target: MonitoredTarget):
+        # Spread the first round so targets are not probed in lockstep
+        await asyncio.sleep(random.uniform(0, min(1.0, self.interval * self.jitter)))
+        while True:
+            try:
+                await self.check(target)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("[Health] Check of %s failed: %s", target.name, e)
+            await asyncio.sleep(self.next_delay(target))
+
+    def get(self, key: str) -> Optional[MonitoredTarget]:
+        return self.targets.get(key)
+
+    def snapshot(self, with_histogram: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Current state of every target (O(1) memory read)"""
+        return {key: target.to_dict(with_histogram) for key, target in self.targets.items()}
+
+
+# Singleton instance shared by API modules and the app lifespan
+health_monitor = HealthMonitor()
@@ -0,0 +1,262 @@
+"""Provider inventory - live k3d/kind clusters and their node containers
+
+Instead of every caller shelling out to ``k3d cluster list`` / ``kind get
+clusters`` / ``docker inspect``, one in-memory inventory is maintained from
+Docker itself:
+
+- the Docker event stream (``GET /events`` for containers and networks,
+  through the Docker socket client, ``app/docker_api.py``): node containers
+  are re-inspected (``GET /containers/{id}/json``) on create/start/die and
+  network (dis)connect, and dropped on destroy,
+- a full relist (one label-filtered ``GET /containers/json`` per provider)
+  once the stream is subscribed, after every reconnect, and every
+  ``INVENTORY_RELIST_SECONDS`` to correct drift.
+
+Events and relists are applied by the same task, one after the other, so a
+listing taken before an event can never overwrite it.
+
+A cluster exists while at least one of its node containers exists (running
+or not), which is what ``k3d cluster list`` and ``kind get clusters`` report.
+Queries return None unless the event stream is connected and a relist
+succeeded since it connected, so callers fall back to the provider CLIs
+instead of acting on stale state.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from ..docker_api import (
+    PROVIDER_LABELS,
+    DockerAPIError,
+    DockerClient,
+    NodeContainer,
+    get_client,
+    node_from_inspect,
+    route_ip,
+)
+
+logger = logging.getLogger(__name__)
+
+# Container actions that change what we know about a node
+REFRESH_ACTIONS = {"create", "start", "die", "rename"}
+EVENT_FILTERS = {"type": ["container", "network"]}
+
+
+class AmbiguousClusterError(LookupError):
+    """A cluster name exists for more than one provider and none was given"""
+
+    def __init__(self, name: str, providers: List[str]):
+        super().__init__(f"Cluster {name} exists for several providers ({', '.join(providers)}); pass provider")
+        self.providers = providers
+
+
+class ProviderInventory:
+    """In-memory k3d/kind inventory kept current from the Docker event stream"""
+
+    def __init__(self, client: Optional[DockerClient] = None):
+        self._client = client
+        self.relist_seconds = float(os.getenv("INVENTORY_RELIST_SECONDS", "300"))
+        self.enabled = os.getenv("INVENTORY_ENABLED", "1") != "0"
+        self._nodes: Dict[str, NodeContainer] = {}  # container id -> node
+        self._events_task: Optional[asyncio.Task] = None
+        self._events_connected = False
+        # A relist succeeded since the stream (re)connected
+        self._synced = False
+        self._last_relist_at: Optional[str] = None
+        self.stats = {"relists": 0, "relist_failures": 0, "events": 0, "reconnects": 0}
+
+    # -- lifecycle -------------------------------------------------------
+
+    async def start(self):
+        """Start the event stream and periodic relist (called from the app lifespan)"""
+        if not self.enabled or (self._events_task and not self._events_task.done()):
+            return
+        self._events_task = asyncio.create_task(self._events_loop())
+
+    async def stop(self):
+        if self._events_task and not self._events_task.done():
+            self._events_task.cancel()
+            await asyncio.gather(self._events_task, return_exceptions=True)
+        self._events_task = None
+        self._events_connected = self._synced = False
+
+    # -- docker access ---------------------------------------------------
+
+    @property
+    def client(self) -> DockerClient:
+        if self._client is None:
+            self._client = get_client()
+        return self._client
+
+    # -- maintenance -----------------------------------------------------
+
+    async def relist(self) -> bool:
+        """Rebuild the inventory from scratch; False if Docker could not be queried
+
+        Only called from the events task (or with no stream running), so no
+        event is applied while the listing is in flight.
+        """
+        try:
+            listed = await asyncio.to_thread(self.client.node_containers)
+        except (OSError, DockerAPIError, ValueError) as e:
+            self.stats["relist_failures"] += 1
+            logger.warning(f"[Inventory] Relist failed: {e}")
+            return False
+        self._nodes = {node.id: node for node in listed}
+        self._last_relist_at = datetime.utcnow().isoformat()
+        self.stats["relists"] += 1
+        return True
+
+    async def _refresh(self, container_id: str):
+        """Re-inspect one container after an event"""
+        try:
+            data = await asyncio.to_thread(self.client.inspect, container_id)
+        except (OSError, DockerAPIError, ValueError) as e:
+            logger.warning(f"[Inventory] Failed to inspect {container_id[:12]}: {e}")
+            return
+        # None when the container is already gone
+        node = node_from_inspect(data) if data else None
+        if node:
+            self._nodes[node.id] = node
+        else:
+            self._nodes.pop(container_id, None)
+
+    async def handle_event(self, event: Dict[str, Any]):
+        """Apply one ``docker events`` JSON object"""
+        action = (event.get("Action") or event.get("status") or "").split(":")[0]
+        actor = event.get("Actor") or {}
+        attributes = actor.get("Attributes") or {}
+        if event.get("Type") == "network":
+            container_id = attributes.get("container")
+            if action in ("connect", "disconnect") and container_id in self._nodes:
+                self.stats["events"] += 1
+                await self._refresh(container_id)
+            return
+        container_id = actor.get("ID") or event.get("id")
+        if not container_id or not any(label in attributes for label in PROVIDER_LABELS.values()):
+            return
+        self.stats["events"] += 1
+        if action == "destroy":
+            self._nodes.pop(container_id, None)
+        elif action in REFRESH_ACTIONS:
+            await self._refresh(container_id)
+
+    async def _events_loop(self):
+        backoff = 1.0
+        while True:
+            stream = None
+            try:
+                # Returns after the response headers: the daemon has subscribed,
+                # so nothing falls between the subscription and the relist
+                stream = await asyncio.to_thread(self.client.events, EVENT_FILTERS)
+                self._events_connected = True
+                if await self.relist():
+                    self._synced = True
+                    backoff = 1.0
+                    await self._consume(stream)
+                    logger.warning("[Inventory] Docker event stream ended")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[Inventory] Docker event stream failed: {e}")
+            finally:
+                self._events_connected = self._synced = False
+                if stream is not None:
+                    stream.close()
+            self.stats["reconnects"] += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    async def _consume(self, stream):
+        """Apply events until the stream ends; relist every ``relist_seconds`` in between"""
+        read: Optional[asyncio.Future] = None
+        next_relist = time.monotonic() + self.relist_seconds
+        try:
+            while True:
+                if read is None:
+                    read = asyncio.ensure_future(asyncio.to_thread(stream.next))
+                timeout = max(0.0, next_relist - time.monotonic()) if self.relist_seconds > 0 else None
+                done, _ = await asyncio.wait({read}, timeout=timeout)
+                if not done:
+                    # Events arriving meanwhile wait in the stream and are applied after it
+                    await self.relist()
+                    next_relist = time.monotonic() + self.relist_seconds
+                    continue
+                event, read = read.result(), None
+                if event is None:
+                    return
+                await self.handle_event(event)
+        finally:
+            # The blocked reader thread is woken by stream.close()
+            if read is not None and not read.done():
+                read.cancel()
+
+    # -- queries ---------------------------------------------------------
+
+    @property
+    def fresh(self) -> bool:
+        """Whether answers can be trusted: events flowing and relisted since connecting"""
+        return self._events_connected and self._synced
+
+    def clusters(self, provider: Optional[str] = None) -> Optional[Set[str]]:
+        """Names of existing clusters (of ``provider``); None if not fresh"""
+        if not self.fresh:
+            return None
+        return {
+            node.cluster for node in self._nodes.values()
+            if provider is None or node.provider == provider
+        }
+
+    def nodes(self, cluster: str, provider: Optional[str] = None) -> List[NodeContainer]:
+        return sorted(
+            (
+                node for node in self._nodes.values()
+                if node.cluster == cluster and (provider is None or node.provider == provider)
+            ),
+            key=lambda node: node.name,
+        )
+
+    def cluster(self, name: str, provider: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Provider, nodes and routing IP of one cluster (None if it does not exist)
+        
+        Raises AmbiguousClusterError when ``provider`` is omitted and a k3d and
+        a kind cluster share the name.
+        """
+        nodes = self.nodes(name, provider)
+        if not nodes:
+            return None
+        providers = sorted({node.provider for node in nodes})
+        if len(providers) > 1:
+            raise AmbiguousClusterError(name, providers)
+        provider = providers[0]
+        return {
+            "name": name,
+            "provider": provider,
+            "running": any(node.state == "running" for node in nodes),
+            "ip": route_ip(provider, name, nodes),
+            "nodes": [node.to_dict() for node in nodes],
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        clusters: Dict[str, List[str]] = {provider: [] for provider in PROVIDER_LABELS}
+        for provider, name in sorted({(node.provider, node.cluster) for node in self._nodes.values()}):
+            clusters[provider].append(name)
+        return {
+            "enabled": self.enabled,
+            "fresh": self.fresh,
+            "events_connected": self._events_connected,
+            "last_relist_at": self._last_relist_at,
+            "relist_seconds": self.relist_seconds,
+            "nodes": len(self._nodes),
+            "clusters": clusters,
+            **self.stats,
+            "docker_api": self.client.stats(),
+        }
+
+
+# Singleton instance shared by the API, the reconcile engine and the app lifespan
+provider_inventory = ProviderInventory()
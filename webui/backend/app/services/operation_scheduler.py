@@ -0,0 +1,255 @@
+"""Operation scheduler in front of ClusterService
+
+Cluster operations (``cluster.sh``/``create_env.sh`` on the host) are queued
+instead of being started immediately:
+
+- at most ``OPERATION_MAX_CONCURRENCY`` run at once (default: half the host
+  cores, capped at 4, since each one drives Docker and k3d/kind),
+- operations on the same cluster run one at a time, in submission order,
+- among runnable clusters, ``delete > stop > start > create`` wins, then FIFO
+  (start/stop come from the cluster API as tasks, create/delete from the
+  reconcile engine through ``run()``),
+- queued or running operations can be cancelled.
+
+Queue position, queue time and wait time are published on the task.
+``run()`` queues a call without a task (reconcile engine actions) under the
+same limit and per-cluster order and returns its result.
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .task_manager import task_manager
+
+logger = logging.getLogger(__name__)
+
+# Lower value runs first
+OPERATION_PRIORITIES = {"delete": 0, "stop": 1, "start": 2, "create": 3}
+
+
+def _default_concurrency() -> int:
+    return max(1, min(4, (os.cpu_count() or 2) // 2))
+
+
+@dataclass
+class ScheduledOperation:
+    """One queued cluster operation, bound to a task or awaited by its caller"""
+    task_id: Optional[str]
+    cluster: str
+    operation: str
+    func: Callable
+    kwargs: Dict[str, Any]
+    priority: int
+    seq: int
+    enqueued_at: float = field(default_factory=time.monotonic)
+    runner: Optional[asyncio.Task] = None
+    # Result of a task-less operation (run())
+    future: Optional[asyncio.Future] = None
+
+    @property
+    def sort_key(self):
+        return (self.priority, self.seq)
+
+
+class OperationScheduler:
+    """Bounded-concurrency scheduler with per-cluster serialisation"""
+
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self.max_concurrency = max_concurrency or int(
+            os.getenv("OPERATION_MAX_CONCURRENCY", str(_default_concurrency()))
+        )
+        self._queues: Dict[str, Deque[ScheduledOperation]] = {}  # cluster -> pending ops
+        self._running: Dict[str, ScheduledOperation] = {}  # cluster -> running op
+        self._by_task: Dict[str, ScheduledOperation] = {}
+        self._seq = itertools.count()
+        self.stats = {"submitted": 0, "completed": 0, "cancelled": 0, "max_wait_seconds": 0.0}
+
+    def _enqueue(self, task_id: Optional[str], cluster: str, operation: str, func: Callable,
+                 kwargs: Dict[str, Any]) -> ScheduledOperation:
+        op = ScheduledOperation(
+            task_id=task_id,
+            cluster=cluster,
+            operation=operation,
+            func=func,
+            kwargs=kwargs,
+            priority=OPERATION_PRIORITIES.get(operation, len(OPERATION_PRIORITIES)),
+            seq=next(self._seq),
+        )
+        self._queues.setdefault(cluster, deque()).append(op)
+        if task_id is not None:
+            self._by_task[task_id] = op
+        self.stats["submitted"] += 1
+        logger.info(f"Queued {operation} of {cluster} (task {task_id})")
+        return op
+
+    async def submit(self, task_id: str, cluster: str, operation: str, func: Callable, **kwargs) -> int:
+        """Queue ``func(**kwargs)`` for ``task_id``; return the initial queue position"""
+        self._enqueue(task_id, cluster, operation, func, kwargs)
+        await task_manager.update_task(task_id, queued_at=datetime.utcnow())
+        await self._dispatch()
+        return self.queue_position(task_id) or 0
+
+    async def run(self, cluster: str, operation: str, func: Callable, **kwargs) -> Any:
+        """Queue ``func(**kwargs)`` without a task and wait for its result
+
+        Cancelling the caller withdraws the queued operation or cancels the
+        running one.
+        """
+        op = self._enqueue(None, cluster, operation, func, kwargs)
+        op.future = asyncio.get_running_loop().create_future()
+        await self._dispatch()
+        try:
+            return await asyncio.shield(op.future)
+        except asyncio.CancelledError:
+            if op.runner is not None:
+                op.runner.cancel()
+            else:
+                self._withdraw(op)
+                self.stats["cancelled"] += 1
+                await self._publish_positions()
+            raise
+
+    def _withdraw(self, op: ScheduledOperation):
+        queue = self._queues.get(op.cluster)
+        if queue is not None and op in queue:
+            queue.remove(op)
+            if not queue:
+                del self._queues[op.cluster]
+
+    def _next_runnable(self) -> Optional[ScheduledOperation]:
+        heads = [q[0] for cluster, q in self._queues.items() if q and cluster not in self._running]
+        return min(heads, key=lambda op: op.sort_key, default=None)
+
+    def pending(self) -> List[ScheduledOperation]:
+        """Pending operations in estimated dispatch order"""
+        order: List[ScheduledOperation] = []
+        queues = {cluster: list(q) for cluster, q in self._queues.items() if q}
+        while queues:
+            cluster = min(queues, key=lambda c: queues[c][0].sort_key)
+            order.append(queues[cluster].pop(0))
+            if not queues[cluster]:
+                del queues[cluster]
+        return order
+
+    def queue_position(self, task_id: str) -> Optional[int]:
+        """1-based position among pending operations (0 = running, None = unknown)"""
+        op = self._by_task.get(task_id)
+        if op is None:
+            return None
+        if op.runner is not None:
+            return 0
+        for position, pending in enumerate(self.pending(), start=1):
+            if pending is op:
+                return position
+        return None
+
+    async def _dispatch(self):
+        while len(self._running) < self.max_concurrency:
+            op = self._next_runnable()
+            if op is None:
+                break
+            self._queues[op.cluster].popleft()
+            if not self._queues[op.cluster]:
+                del self._queues[op.cluster]
+            self._running[op.cluster] = op
+            waited = time.monotonic() - op.enqueued_at
+            self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+            op.runner = asyncio.create_task(self._run(op, waited))
+        await self._publish_positions()
+
+    async def _publish_positions(self):
+        for position, op in enumerate(self.pending(), start=1):
+            if op.task_id is None:
+                continue
+            await task_manager.update_task(
+                op.task_id,
+                queue_position=position,
+                message=f"Queued: {op.operation} {op.cluster} (position {position})",
+            )
+
+    async def _run(self, op: ScheduledOperation, waited: float):
+        try:
+            if op.future is not None:
+                await self._call(op)
+            else:
+                await task_manager.update_task(op.task_id, queue_position=0, wait_seconds=round(waited, 3))
+                await task_manager.run_task(op.task_id, op.func, **op.kwargs)
+            self.stats["completed"] += 1
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            if op.future is not None:
+                op.future.cancel()
+            else:
+                await task_manager.flush_logs(op.task_id)
+                await task_manager.update_task(op.task_id, status="failed", progress=100, error="Cancelled")
+        finally:
+            self._running.pop(op.cluster, None)
+            self._by_task.pop(op.task_id, None)
+            await self._dispatch()
+
+    async def _call(self, op: ScheduledOperation):
+        try:
+            result = await op.func(**op.kwargs)
+        except Exception as e:
+            if not op.future.done():
+                op.future.set_exception(e)
+        else:
+            if not op.future.done():
+                op.future.set_result(result)
+
+    async def cancel(self, task_id: str) -> bool:
+        """Cancel a queued or running operation; False if it is not scheduled"""
+        op = self._by_task.get(task_id)
+        if op is None:
+            return False
+
+        if op.runner is not None:
+            logger.info(f"Cancelling running {op.operation} of {op.cluster} (task {task_id})")
+            op.runner.cancel()
+            return True
+
+        self._withdraw(op)
+        self._by_task.pop(task_id, None)
+        self.stats["cancelled"] += 1
+        await task_manager.update_task(task_id, status="failed", progress=100, error="Cancelled")
+        await self._publish_positions()
+        return True
+
+    async def shutdown(self):
+        """Cancel everything (called on application shutdown)"""
+        runners = [op.runner for op in self._running.values() if op.runner]
+        for op in self.pending():
+            if op.task_id is None:
+                self._withdraw(op)
+                op.future.cancel()
+            else:
+                await self.cancel(op.task_id)
+        for runner in runners:
+            runner.cancel()
+        await asyncio.gather(*runners, return_exceptions=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": [
+                {"task_id": op.task_id, "cluster": op.cluster, "operation": op.operation}
+                for op in self._running.values()
+            ],
+            "pending": [
+                {"task_id": op.task_id, "cluster": op.cluster, "operation": op.operation,
+                 "wait_seconds": round(time.monotonic() - op.enqueued_at, 3)}
+                for op in self.pending()
+            ],
+            **self.stats,
+        }
+
+
+# Singleton instance shared by API modules and the app lifespan
+operation_scheduler = OperationScheduler()
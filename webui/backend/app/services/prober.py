@@ -0,0 +1,122 @@
+"""Shared HTTP prober for global service reachability checks
+
+One app-lifetime ``httpx.AsyncClient`` (connection-pooled, keep-alive) is used
+for every probe. Results are cached per URL for ``PROBE_CACHE_TTL`` seconds and
+concurrent probes of the same URL share one in-flight request (single-flight),
+so a refresh storm of N pages costs at most one request per target per TTL.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProbeResult:
+    """Outcome of one HTTP probe"""
+    url: str
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    latency_ms: Optional[float] = None
+    checked_at: float = 0.0
+
+    @property
+    def reachable(self) -> bool:
+        """Reachable and not a server error (<500)"""
+        return self.status_code is not None and self.status_code < 500
+
+
+class HttpProber:
+    """Pooled HTTP prober with TTL cache and single-flight deduplication"""
+
+    def __init__(self):
+        self.timeout = float(os.getenv("PROBE_TIMEOUT", "5"))
+        self.ttl = float(os.getenv("PROBE_CACHE_TTL", "10"))
+        self.max_connections = int(os.getenv("PROBE_MAX_CONNECTIONS", "20"))
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache: Dict[str, ProbeResult] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"probes": 0, "cache_hits": 0, "coalesced": 0}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                verify=False,
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def close(self):
+        """Close the shared client (called on application shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _probe_uncached(self, url: str) -> ProbeResult:
+        self.stats["probes"] += 1
+        started = time.monotonic()
+        try:
+            response = await self._get_client().get(url)
+            return ProbeResult(
+                url=url,
+                status_code=response.status_code,
+                latency_ms=(time.monotonic() - started) * 1000.0,
+                checked_at=time.time(),
+            )
+        except Exception as e:
+            return ProbeResult(
+                url=url,
+                error=str(e)[:100] or type(e).__name__,
+                latency_ms=(time.monotonic() - started) * 1000.0,
+                checked_at=time.time(),
+            )
+
+    async def probe(self, url: str, max_age: Optional[float] = None) -> ProbeResult:
+        """Probe ``url``, serving a cached result younger than ``max_age`` (default TTL)"""
+        ttl = self.ttl if max_age is None else max_age
+        cached = self._cache.get(url)
+        if cached is not None and time.time() - cached.checked_at < ttl:
+            self.stats["cache_hits"] += 1
+            return cached
+
+        inflight = self._inflight.get(url)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        try:
+            result = await self._probe_uncached(url)
+            self._cache[url] = result
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            # Cancellation of the leader must not strand the followers
+            if not future.done():
+                future.set_exception(e if isinstance(e, Exception) else RuntimeError("probe cancelled"))
+                future.exception()  # mark retrieved
+            raise
+        finally:
+            self._inflight.pop(url, None)
+
+    async def probe_many(self, urls: List[str], max_age: Optional[float] = None) -> Dict[str, ProbeResult]:
+        """Probe several URLs concurrently"""
+        results = await asyncio.gather(*(self.probe(url, max_age) for url in urls))
+        return dict(zip(urls, results))
+
+
+# Singleton instance shared by API modules
+http_prober = HttpProber()
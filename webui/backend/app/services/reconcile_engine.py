@@ -0,0 +1,380 @@
+"""In-process reconcile engine (desired state in SQLite -> k3d/kind clusters)
+
+The Python counterpart of ``reconcile.sh --from-db``:
+
+- a full pass reads every cluster row and lists each provider once, an
+  incremental pass only the given clusters and their providers; ``plan()``
+  then diffs desired against actual state (``devops`` is skipped),
+- create/delete actions run concurrently through ``operation_scheduler``, so
+  they share its global limit (``OPERATION_MAX_CONCURRENCY``) and per-cluster
+  ordering with API start/stop operations; at most
+  ``RECONCILE_<PROVIDER>_CONCURRENCY`` run per provider,
+- a failed action is retried up to ``RECONCILE_MAX_ATTEMPTS`` times with
+  exponential backoff (``RECONCILE_BACKOFF_BASE`` doubling up to
+  ``RECONCILE_BACKOFF_MAX`` seconds, jittered); the waiting action gives its
+  slot back to the others,
+- results are written back exactly like ``update_cluster_record`` in the
+  script: running/Ready, absent/Removed, unknown/Warning or failed/Failed
+  with the last 20 output lines in ``reconcile_error``.
+
+Rows that are already converged are only written when their state changed,
+so an idle pass does not emit watch events. A provider whose listing fails is
+left alone for the pass instead of being treated as empty.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import Counter, deque
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from ..db import get_db
+from .cluster_service import host_command
+from .db_service import run_db
+from .inventory_service import provider_inventory
+from .operation_scheduler import operation_scheduler
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = ("k3d", "kind")
+INVENTORY_COMMANDS = {
+    "k3d": "k3d cluster list -o json",
+    "kind": "kind get clusters",
+}
+# Clusters managed outside the reconcile loop
+RESERVED_CLUSTERS = {"devops"}
+# Output lines kept for reconcile_error (same as ``tail -20`` in reconcile.sh)
+ERROR_TAIL_LINES = 20
+INVENTORY_TIMEOUT = 30
+
+# Action -> (actual_state, status) written when it succeeds
+ACTION_STATES = {
+    "mark_running": ("running", "Ready"),
+    "mark_absent": ("absent", "Removed"),
+    "create": ("running", "Ready"),
+    "delete": ("absent", "Removed"),
+}
+
+Lister = Callable[[str], Awaitable[Optional[Set[str]]]]
+
+
+class ReconcileBusyError(RuntimeError):
+    """An executing pass is already running"""
+
+
+@dataclass
+class ReconcileAction:
+    """One planned change for a cluster row"""
+    name: str
+    provider: str
+    action: str  # create | delete | mark_running | mark_absent
+    cluster: Dict[str, Any]
+    result: Optional[str] = None  # created | deleted | ok | warning | error | planned
+    message: Optional[str] = None
+    attempts: int = 0
+
+    @property
+    def executes(self) -> bool:
+        return self.action in ("create", "delete")
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        del data["cluster"]
+        return data
+
+
+def parse_inventory(provider: str, output: str) -> Set[str]:
+    """Cluster names from ``k3d cluster list -o json`` / ``kind get clusters``"""
+    if provider == "k3d":
+        return {item["name"] for item in json.loads(output or "[]") if item.get("name")}
+    return {line.strip() for line in output.splitlines() if line.strip()}
+
+
+async def list_provider_clusters(provider: str) -> Optional[Set[str]]:
+    """Clusters of ``provider`` on the host; None if they could not be listed
+
+    Answered from the Docker-event-driven inventory when it is fresh, else by
+    running the provider CLI on the host.
+    """
+    names = provider_inventory.clusters(provider)
+    if names is not None:
+        return names
+    process = None
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *host_command(f"{INVENTORY_COMMANDS[provider]} 2>/dev/null"),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        async with asyncio.timeout(INVENTORY_TIMEOUT):
+            stdout, _ = await process.communicate()
+        if process.returncode != 0:
+            logger.warning(f"Listing {provider} clusters exited with code {process.returncode}")
+            return None
+        return parse_inventory(provider, stdout.decode("utf-8", errors="replace"))
+    except (TimeoutError, OSError, ValueError) as e:
+        logger.warning(f"Failed to list {provider} clusters: {e}")
+        if process is not None and process.returncode is None:
+            process.kill()
+            await process.wait()
+        return None
+
+
+def plan(rows: Iterable[Dict[str, Any]], inventory: Dict[str, Optional[Set[str]]]) -> List[ReconcileAction]:
+    """Diff cluster rows against the provider inventory (``reconcile_from_database``)
+
+    ``inventory`` maps provider -> existing cluster names, or None when the
+    provider could not be listed (its rows get no action). Unknown providers
+    have no clusters, as in the script.
+    """
+    actions = []
+    for row in rows:
+        name = row["name"]
+        if name in RESERVED_CLUSTERS:
+            continue
+        provider = row.get("provider") or "k3d"
+        desired = row.get("desired_state") or "present"
+        names = inventory.get(provider, set())
+        if names is None:
+            continue
+        exists = name in names
+
+        if desired == "present":
+            action = "mark_running" if exists else "create"
+        elif desired == "absent":
+            action = "delete" if exists else "mark_absent"
+        else:
+            continue
+        actions.append(ReconcileAction(name=name, provider=provider, action=action, cluster=row))
+    return actions
+
+
+def _now() -> str:
+    # Same format as SQLite's datetime('now') used by reconcile.sh
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ReconcileEngine:
+    """Diff SQLite against k3d/kind and converge with a bounded worker pool"""
+
+    def __init__(self, lister: Optional[Lister] = None, cluster_service=None, scheduler=None):
+        self.provider_limits = {
+            provider: max(1, int(os.getenv(f"RECONCILE_{provider.upper()}_CONCURRENCY", "2")))
+            for provider in PROVIDERS
+        }
+        self.max_attempts = max(1, int(os.getenv("RECONCILE_MAX_ATTEMPTS", "3")))
+        self.backoff_base = float(os.getenv("RECONCILE_BACKOFF_BASE", "5"))
+        self.backoff_max = float(os.getenv("RECONCILE_BACKOFF_MAX", "60"))
+        self._lister = lister or list_provider_clusters
+        self._cluster_service = cluster_service
+        self.scheduler = scheduler or operation_scheduler
+        self._lock = asyncio.Lock()
+        self.last_result: Optional[Dict[str, Any]] = None
+
+    @property
+    def cluster_service(self):
+        # Created lazily: ClusterService needs SCRIPTS_DIR, planning does not
+        if self._cluster_service is None:
+            from .cluster_service import get_cluster_service
+            self._cluster_service = get_cluster_service()
+        return self._cluster_service
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Delay before retry number ``attempt`` (1-based), with +-25% jitter"""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return delay * random.uniform(0.75, 1.25)
+
+    async def inventory(self, providers: Iterable[str] = PROVIDERS) -> Dict[str, Optional[Set[str]]]:
+        """List every provider concurrently"""
+        providers = list(providers)
+        results = await asyncio.gather(*(self._lister(provider) for provider in providers))
+        return dict(zip(providers, results))
+
+    async def claim(self):
+        """Reserve the next executing pass, started later with ``run(claimed=True)``
+
+        Raises ReconcileBusyError instead of waiting when a pass runs or is
+        claimed. The check and the acquire happen without yielding (a free
+        asyncio.Lock is taken immediately), so two callers cannot both win.
+        """
+        if self._lock.locked():
+            raise ReconcileBusyError("A reconcile pass is already running")
+        await self._lock.acquire()
+
+    async def run(self, names: Optional[Iterable[str]] = None, dry_run: bool = False,
+                  claimed: bool = False) -> Dict[str, Any]:
+        """One reconcile pass; returns a summary (also kept in ``last_result``)
+
+        With ``names`` only those clusters are read and only their providers
+        are listed, so the pass costs the same whatever the fleet size.
+        Passes that execute actions run one at a time (``claimed``: the
+        caller already holds the slot via ``claim()``); a dry run only plans
+        and never waits for them.
+        """
+        if dry_run:
+            return await self._pass(names, dry_run=True)
+        if not claimed:
+            await self._lock.acquire()
+        try:
+            self.last_result = await self._pass(names, dry_run=False)
+            return self.last_result
+        finally:
+            self._lock.release()
+
+    async def _pass(self, names: Optional[Iterable[str]], dry_run: bool) -> Dict[str, Any]:
+        started = time.monotonic()
+        started_at = _now()
+        db = get_db()
+        if names is None:
+            rows = await run_db(db.list_clusters)
+            providers = PROVIDERS
+        else:
+            rows = await run_db(db.get_clusters, names)
+            used = {row.get("provider") or "k3d" for row in rows}
+            providers = [provider for provider in PROVIDERS if provider in used]
+        inventory = await self.inventory(providers)
+        actions = plan(rows, inventory)
+
+        if dry_run:
+            for action in actions:
+                action.result = "planned" if action.executes else "ok"
+        else:
+            await self._execute(actions)
+
+        result = {
+            "dry_run": dry_run,
+            "scope": "full" if names is None else "incremental",
+            "clusters": len(rows),
+            "started_at": started_at,
+            "duration_seconds": round(time.monotonic() - started, 3),
+            "inventory": {
+                provider: None if names is None else len(names) for provider, names in inventory.items()
+            },
+            "counts": dict(Counter(action.result for action in actions)),
+            "actions": [action.to_dict() for action in actions],
+        }
+        if not dry_run:
+            logger.info(f"[ReconcileEngine] Pass finished: {result['counts']} in {result['duration_seconds']}s")
+        return result
+
+    async def _execute(self, actions: List[ReconcileAction]):
+        # Provider slot first, then the scheduler: an action waiting for its
+        # provider does not hold a scheduler slot another provider could use
+        providers: Dict[str, asyncio.Semaphore] = {}
+
+        def provider_slot(provider: str) -> asyncio.Semaphore:
+            if provider not in providers:
+                providers[provider] = asyncio.Semaphore(self.provider_limits.get(provider, 1))
+            return providers[provider]
+
+        async with asyncio.TaskGroup() as group:
+            for action in actions:
+                if action.executes:
+                    group.create_task(self._run_action(action, provider_slot(action.provider)))
+                else:
+                    group.create_task(self._mark(action))
+
+    async def _mark(self, action: ReconcileAction):
+        """Converged row: record the observed state if it differs"""
+        actual, status = ACTION_STATES[action.action]
+        row = action.cluster
+        action.result = "ok"
+        action.message = "cluster healthy" if action.action == "mark_running" else "already absent"
+        if (row.get("actual_state"), row.get("status"), row.get("reconcile_error")) != (actual, status, None):
+            await self._record(action.name, actual, status, None)
+
+    async def _run_action(self, action: ReconcileAction, provider_slot: asyncio.Semaphore):
+        output: deque = deque(maxlen=ERROR_TAIL_LINES)
+
+        async def collect(line: str):
+            output.append(line.rstrip("\n"))
+
+        success = False
+        while action.attempts < self.max_attempts:
+            action.attempts += 1
+            async with provider_slot:
+                try:
+                    # Global limit and per-cluster order shared with API start/stop
+                    success = await self.scheduler.run(
+                        action.name, action.action, self._perform, action=action, progress_callback=collect,
+                    )
+                except Exception as e:
+                    logger.exception(f"[ReconcileEngine] {action.action} {action.name} raised")
+                    output.append(f"[ERROR] {e}")
+            if success:
+                break
+            if action.attempts < self.max_attempts:
+                delay = self.backoff_delay(action.attempts)
+                logger.warning(
+                    f"[ReconcileEngine] {action.action} {action.name} failed "
+                    f"(attempt {action.attempts}/{self.max_attempts}); retrying in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+        if not success:
+            action.result = "error"
+            action.message = " ".join(output) or "command failed"
+            await self._record(action.name, "failed", "Failed", action.message)
+            return
+
+        if action.action == "delete":
+            action.result, action.message = "deleted", "cluster removed"
+            await self._record(action.name, "absent", "Removed", None)
+            return
+
+        names = await self._lister(action.provider)
+        if names is not None and action.name in names:
+            action.result, action.message = "created", "cluster online"
+            await self._record(action.name, "running", "Ready", None)
+        else:
+            action.result, action.message = "warning", "create succeeded but cluster not detected"
+            await self._record(action.name, "unknown", "Warning", action.message)
+
+    async def _perform(self, action: ReconcileAction, progress_callback) -> bool:
+        if action.action == "delete":
+            return await self.cluster_service.delete_cluster(action.name, progress_callback=progress_callback)
+        cluster = {
+            key: action.cluster.get(key)
+            for key in ("node_port", "pf_port", "http_port", "https_port")
+            if action.cluster.get(key) is not None
+        }
+        return await self.cluster_service.create_cluster(
+            {"name": action.name, "provider": action.provider, **cluster},
+            progress_callback=progress_callback,
+        )
+
+    async def _record(self, name: str, actual: str, status: str, error: Optional[str]):
+        updates = {
+            "actual_state": actual,
+            "status": status,
+            "last_reconciled_at": _now(),
+            "reconcile_error": error,
+        }
+        try:
+            await run_db(get_db().update_cluster, name, updates)
+        except Exception as e:
+            logger.error(f"[ReconcileEngine] Failed to record state of {name}: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "max_concurrency": self.scheduler.max_concurrency,
+            "provider_limits": self.provider_limits,
+            "max_attempts": self.max_attempts,
+            "backoff_base": self.backoff_base,
+            "backoff_max": self.backoff_max,
+            "last_result": self.last_result,
+        }
+
+
+# Singleton instance shared by the reconciler and the API
+reconcile_engine = ReconcileEngine()
@@ -1,53 +1,177 @@
-"""Debounced reconciler integration for WebUI backend
+"""Coalescing reconciler integration for WebUI backend
 
-This service schedules a debounced execution of scripts/reconcile.sh on the host
-after batch operations (e.g., multiple create/delete) to converge Git branches,
-ArgoCD ApplicationSet, and HAProxy routes in a single pass.
+This service runs scripts/reconcile.sh on the host after batch operations
+(e.g., multiple create/delete) to converge Git branches, ArgoCD
+ApplicationSet, and HAProxy routes in a single pass.
 
-Non-blocking, idempotent, and safe to call multiple times in quick succession.
+Triggers are coalesced instead of restarting a timer:
+
+- a run starts once no trigger arrived for ``RECONCILE_DEBOUNCE_SECONDS``,
+  but never later than ``RECONCILE_MAX_WAIT_SECONDS`` after the first trigger
+  of the batch, so a steady stream of API calls cannot postpone it forever,
+- at most one run is in flight; triggers received meanwhile form a single
+  queued follow-up run,
+- each run records how many triggers it absorbed and why (reasons), kept in
+  a short history exposed by ``snapshot()``.
+
+The in-process engine is an opt-in preview (``RECONCILE_ENGINE=1``; off by
+default because the host reconcile loop started by bootstrap also creates and
+deletes clusters from the same rows). When enabled, cluster rows are converged
+in-process and only the clusters that changed are looked at: API calls name
+the cluster they declared, and a ``cluster_watch`` listener adds clusters whose
+desired spec (provider, desired_state) changed in SQLite, whoever wrote it.
+The final sync of an incremental pass only touches the HAProxy routes of the
+clusters it created or deleted (``reconcile.sh --clusters``). Triggers without
+names and a periodic full resync (``RECONCILE_FULL_RESYNC_SECONDS``) still
+reconcile the whole fleet, with a pruning HAProxy sync, as a safety net.
 """
 
 import asyncio
+import itertools
 import logging
 import os
-from typing import Optional
+import shlex
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from ..db import get_db
+from .cluster_service import host_command
+from .db_service import run_db
+from .reconcile_engine import reconcile_engine
 
 logger = logging.getLogger(__name__)
 
+# Distinct reasons kept per run record (the trigger count stays exact)
+MAX_RUN_REASONS = 50
 
-class DebouncedReconciler:
-    """Schedules reconcile.sh with debounce to coalesce frequent updates"""
+
+class CoalescingReconciler:
+    """Debounce with a max-wait bound, one run in flight, one queued follow-up"""
 
     def __init__(self):
-        # Debounce interval in seconds. Reconcile runs when no new triggers arrive within this window.
-        self.debounce_seconds = int(os.getenv("RECONCILE_DEBOUNCE_SECONDS", "5"))
+        # Quiet period: a run starts when no new trigger arrived within this window
+        self.debounce_seconds = float(os.getenv("RECONCILE_DEBOUNCE_SECONDS", "5"))
+        # Upper bound on how long the first trigger of a batch waits
+        self.max_wait_seconds = float(os.getenv("RECONCILE_MAX_WAIT_SECONDS", "30"))
         # Optional flag to disable auto reconcile (set to "0" to disable)
         self.auto_enabled = os.getenv("AUTO_RECONCILE", "1") != "0"
-        # Internal state
-        self._pending: Optional[asyncio.Task] = None
-        self._lock = asyncio.Lock()
-        self._last_reason: Optional[str] = None
+        # Opt-in preview: converge cluster rows in-process (reconcile_engine) before the final-sync script
+        self.engine_enabled = os.getenv("RECONCILE_ENGINE", "0") == "1"
+        # Full engine pass at this interval even without triggers (0 disables)
+        self.full_resync_seconds = int(os.getenv("RECONCILE_FULL_RESYNC_SECONDS", "600"))
+        # Run records kept for the state API
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=int(os.getenv("RECONCILE_HISTORY", "20")))
+        # Queued batch: triggers received since the last run started
+        self._reasons: Counter = Counter()
+        self._trigger_count = 0
+        self._first_trigger: Optional[float] = None
+        self._last_trigger: Optional[float] = None
+        self._first_trigger_at: Optional[str] = None
+        self._wakeup = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._current: Optional[Dict[str, Any]] = None
+        self._run_ids = itertools.count(1)
+        # Clusters to reconcile in the next pass; _full = whole fleet
+        self._dirty: Set[str] = set()
+        self._full = False
+        # Last seen desired spec per cluster (watch events that keep it are ignored)
+        self._specs: Dict[str, Tuple[Any, Any]] = {}
+        self._resync_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _spec(cluster: Dict[str, Any]) -> Tuple[Any, Any]:
+        return cluster.get("provider"), cluster.get("desired_state")
+
+    @property
+    def dirty(self) -> Set[str]:
+        return set(self._dirty)
+
+    @property
+    def queued(self) -> bool:
+        return self._trigger_count > 0
+
+    @property
+    def running(self) -> bool:
+        return self._current is not None
+
+    async def start(self):
+        """Load desired specs and start the periodic full resync (app lifespan)"""
+        if not self.auto_enabled:
+            return
+        self._ensure_loop()
+        if not self.engine_enabled:
+            return
+        rows = await run_db(get_db().list_clusters, columns=["name", "provider", "desired_state"])
+        self._specs = {row["name"]: self._spec(row) for row in rows}
+        if self.full_resync_seconds > 0 and not self._resync_task:
+            self._resync_task = asyncio.create_task(self._resync_loop())
+
+    async def stop(self):
+        tasks = [t for t in (self._resync_task, self._loop_task) if t and not t.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._resync_task = None
+        self._loop_task = None
+
+    def _ensure_loop(self):
+        if self._loop_task is None or self._loop_task.done():
+            # Fresh event bound to the running loop; keep a batch queued before it
+            self._wakeup = asyncio.Event()
+            if self.queued:
+                self._wakeup.set()
+            self._loop_task = asyncio.create_task(self._run_loop())
+
+    async def _resync_loop(self):
+        while True:
+            await asyncio.sleep(self.full_resync_seconds)
+            self.trigger(reason="periodic full resync")
+
+    def on_cluster_event(self, event):
+        """cluster_watch listener: mark clusters whose desired spec changed
+
+        State written back by the engine keeps the spec, so it never
+        re-triggers a pass.
+        """
+        name = event.object.get("name")
+        if not name or not (self.auto_enabled and self.engine_enabled):
+            return
+        if event.type == "DELETED":
+            self._specs.pop(name, None)
+            return
+        spec = self._spec(event.object)
+        if self._specs.get(name) == spec:
+            return
+        self._specs[name] = spec
+        if name not in self._dirty:
+            self.trigger(reason=f"changed:{name}", names=[name])
+
+    def _take_dirty(self) -> Tuple[Optional[Set[str]], bool]:
+        names, full = self._dirty, self._full
+        self._dirty, self._full = set(), False
+        return (None if full else names), full
+
+    def _restore_dirty(self, names: Optional[Set[str]], full: bool):
+        if full:
+            self._full = True
+        else:
+            self._dirty |= names
+
+    async def _run_reconcile(self, clusters: Optional[List[str]] = None) -> bool:
+        """Execute reconcile.sh on host via nsenter (non-blocking); True on success
 
-    async def _run_reconcile(self):
-        """Execute reconcile.sh on host via nsenter (non-blocking)"""
+        ``clusters`` limits the HAProxy part of the final sync to those
+        clusters; without it routes are fully resynced and pruned.
+        """
+        command = "./scripts/reconcile.sh"
+        if clusters is not None:
+            command += f" --clusters {shlex.quote(','.join(clusters))}"
         # Build host execution command (same approach as ClusterService)
-        project_root = "/home/cloud/github/hofmannhe/kindler"
-        cmd = [
-            "nsenter",
-            "-t",
-            "1",
-            "-m",
-            "-u",
-            "-i",
-            "-n",
-            "su",
-            "-",
-            "cloud",
-            "-c",
-            f"cd {project_root} && ./scripts/reconcile.sh",
-        ]
-
-        logger.info("[Reconciler] Executing scripts/reconcile.sh on host (debounced)")
+        cmd = host_command(command)
+
+        logger.info("[Reconciler] Executing scripts/reconcile.sh on host")
         try:
             proc = await asyncio.create_subprocess_exec(
                 *cmd,
@@ -63,42 +187,161 @@ class DebouncedReconciler:
             rc = await proc.wait()
             if rc != 0:
                 logger.error("[Reconciler] reconcile.sh exited with code %s", rc)
-            else:
-                logger.info("[Reconciler] reconcile.sh completed successfully")
+                return False
+            logger.info("[Reconciler] reconcile.sh completed successfully")
+            return True
         except Exception as e:
             logger.error("[Reconciler] Failed to execute reconcile.sh: %s", e)
+            return False
+
+    async def _run_engine(self, record: Dict[str, Any]) -> Tuple[bool, Optional[List[str]]]:
+        """Engine pass over the dirty clusters
+
+        Returns whether the final sync should run and the clusters it covers
+        (None: the whole fleet, routes pruned).
+        """
+        names, full = self._take_dirty()
+        record["scope"] = "full" if full else "incremental"
+        record["clusters"] = None if full else sorted(names)
+        if not full and not names:
+            return False, None
+        try:
+            result = await reconcile_engine.run(names=names)
+        except asyncio.CancelledError:
+            self._restore_dirty(names, full)
+            raise
+        except Exception as e:
+            logger.error("[Reconciler] Reconcile engine pass failed: %s", e)
+            self._restore_dirty(names, full)
+            record["error"] = str(e)
+            return True, record["clusters"]
+        record["engine"] = result["counts"]
+        if full:
+            # Full passes always end in the pruning resync (safety net for drifted routes)
+            return True, None
+        # GitOps/HAProxy only need a sync when clusters were created or deleted
+        changed = sorted({action["name"] for action in result["actions"] if action["action"] in ("create", "delete")})
+        return bool(changed), changed
+
+    def _due_in(self) -> float:
+        """Seconds until the queued batch may run (debounce, capped by max wait)"""
+        due = min(
+            self._last_trigger + self.debounce_seconds,
+            self._first_trigger + self.max_wait_seconds,
+        )
+        return max(0.0, due - time.monotonic())
+
+    async def _run_loop(self):
+        while True:
+            await self._wakeup.wait()
+            # Each trigger sets the event again, re-arming the quiet-period wait
+            while True:
+                self._wakeup.clear()
+                delay = self._due_in()
+                if delay <= 0:
+                    break
+                try:
+                    async with asyncio.timeout(delay):
+                        await self._wakeup.wait()
+                except TimeoutError:
+                    pass
+            await self._run_batch()
 
-    async def _debounced_worker(self, reason: Optional[str]):
-        # Small delay to gather further triggers
-        await asyncio.sleep(self.debounce_seconds)
-        await self._run_reconcile()
-        # Clear pending after completion
-        async with self._lock:
-            self._pending = None
-            self._last_reason = None
-
-    async def schedule(self, reason: Optional[str] = None):
-        """Public API: schedule a debounced reconcile if enabled"""
+    async def _run_batch(self):
+        record = {
+            "id": next(self._run_ids),
+            "triggers": self._trigger_count,
+            "reasons": dict(self._reasons),
+            "first_trigger_at": self._first_trigger_at,
+            "waited_seconds": round(time.monotonic() - self._first_trigger, 3),
+            "started_at": datetime.utcnow().isoformat(),
+            "status": "running",
+        }
+        # Triggers from here on belong to the follow-up run
+        self._reasons = Counter()
+        self._trigger_count = 0
+        self._first_trigger = self._last_trigger = self._first_trigger_at = None
+        self._current = record
+        started = time.monotonic()
+        logger.info("[Reconciler] Run %s started (%s trigger(s))", record["id"], record["triggers"])
+        try:
+            sync, clusters = await self._run_engine(record) if self.engine_enabled else (True, None)
+            record["final_sync"] = sync
+            record["final_sync_clusters"] = clusters if sync else None
+            ok = await self._run_reconcile(clusters) if sync else True
+            record["status"] = "completed" if ok and "error" not in record else "failed"
+        except asyncio.CancelledError:
+            record["status"] = "cancelled"
+            raise
+        except Exception as e:
+            logger.error("[Reconciler] Run %s failed: %s", record["id"], e)
+            record["status"] = "failed"
+            record["error"] = str(e)
+        finally:
+            record["finished_at"] = datetime.utcnow().isoformat()
+            record["duration_seconds"] = round(time.monotonic() - started, 3)
+            self._current = None
+            self.history.appendleft(record)
+
+    def trigger(self, reason: Optional[str] = None, names: Optional[Iterable[str]] = None):
+        """Record a trigger in the queued batch (non-blocking)"""
         if not self.auto_enabled:
             logger.info("[Reconciler] AUTO_RECONCILE=0; skipping schedule (%s)", reason or "no reason")
             return
-        async with self._lock:
-            self._last_reason = reason
-            # If a task is already pending, restart debounce window by cancelling and re-scheduling
-            if self._pending and not self._pending.done():
-                try:
-                    self._pending.cancel()
-                except Exception:
-                    pass
-            # Schedule new debounce worker
-            self._pending = asyncio.create_task(self._debounced_worker(reason))
-            logger.info(
-                "[Reconciler] Scheduled reconcile in %ss (reason=%s)",
-                self.debounce_seconds,
-                reason or "n/a",
-            )
+        if names is None:
+            self._full = True
+        else:
+            self._dirty.update(names)
 
+        now = time.monotonic()
+        if self._first_trigger is None:
+            self._first_trigger = now
+            self._first_trigger_at = datetime.utcnow().isoformat()
+        self._last_trigger = now
+        self._trigger_count += 1
+        reason = reason or "n/a"
+        if reason in self._reasons or len(self._reasons) < MAX_RUN_REASONS:
+            self._reasons[reason] += 1
+        self._ensure_loop()
+        self._wakeup.set()
+        logger.info(
+            "[Reconciler] Queued reconcile (reason=%s, %s trigger(s) pending%s)",
+            reason,
+            self._trigger_count,
+            ", run in flight" if self.running else "",
+        )
 
-# Singleton instance for import from API modules
-reconciler = DebouncedReconciler()
+    async def schedule(self, reason: Optional[str] = None, names: Optional[Iterable[str]] = None):
+        """Public API: schedule a coalesced reconcile if enabled
+
+        ``names`` limits the engine pass to those clusters; without it the
+        next pass covers the whole fleet.
+        """
+        self.trigger(reason=reason, names=names)
+
+    def snapshot(self) -> Dict[str, Any]:
+        queued = None
+        if self.queued:
+            queued = {
+                "triggers": self._trigger_count,
+                "reasons": dict(self._reasons),
+                "first_trigger_at": self._first_trigger_at,
+                # Queued behind a running pass: starts when that one finishes, at the earliest
+                "due_in_seconds": round(self._due_in(), 3),
+            }
+        return {
+            "auto_enabled": self.auto_enabled,
+            "engine_enabled": self.engine_enabled,
+            "debounce_seconds": self.debounce_seconds,
+            "max_wait_seconds": self.max_wait_seconds,
+            "full_resync_seconds": self.full_resync_seconds,
+            "running": self._current,
+            "queued": queued,
+            "dirty": sorted(self._dirty),
+            "full_pending": self._full,
+            "history": list(self.history),
+        }
 
+
+# Singleton instance for import from API modules
+reconciler = CoalescingReconciler()
@@ -1,21 +1,127 @@
-"""Task manager for background operations"""
+"""Task manager for background operations
+
+Hot tasks (running, or recently finished) live in memory. Every change is
+also written behind to SQLite (``tasks`` + append-only ``task_log_chunks``)
+in batches, so finished tasks can be evicted from memory and are lazily
+loaded again by ``load_task`` after eviction or a restart.
+"""
 import asyncio
+import itertools
 import logging
-from datetime import datetime
-from typing import Dict, Optional, Callable
+import os
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Awaitable, Dict, List, Optional, Callable, Set, Tuple
 from uuid import uuid4
 
+from ..db import get_db
 from ..models.task import TaskStatus
+from .db_service import run_db
 
 logger = logging.getLogger(__name__)
 
 
+class TaskLogBuffer:
+    """Bounded ring buffer of log lines tagged with sequence numbers
+    
+    Sequence numbers start at 1 and keep increasing after old lines are
+    evicted, so a subscriber can ask for "everything after seq N".
+    """
+    
+    def __init__(self, max_lines: int):
+        self._lines: deque = deque(maxlen=max_lines)
+        self.last_seq = 0
+    
+    def __len__(self) -> int:
+        return len(self._lines)
+    
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest retained line (last_seq + 1 if empty)"""
+        return self.last_seq - len(self._lines) + 1
+    
+    def append(self, line: str) -> int:
+        """Append a line (O(1), evicting the oldest when full); return its seq"""
+        self.last_seq += 1
+        self._lines.append((self.last_seq, line))
+        return self.last_seq
+    
+    def since(self, seq: int) -> List[Tuple[int, str]]:
+        """Retained lines with sequence number greater than ``seq``"""
+        start = max(0, seq - self.first_seq + 1)
+        return list(itertools.islice(self._lines, start, None))
+    
+    def lines(self) -> List[str]:
+        return [line for _, line in self._lines]
+
+
+class TaskLogBatcher:
+    """Coalesce log lines and flush them every ``flush_ms`` or ``flush_lines``
+    
+    ``write`` only appends to a local list; the task lock and the broadcast
+    are paid once per batch instead of once per line.
+    """
+    
+    def __init__(self, manager: "TaskManager", task_id: str, flush_ms: float, flush_lines: int):
+        self.manager = manager
+        self.task_id = task_id
+        self.flush_ms = flush_ms
+        self.flush_lines = max(1, flush_lines)
+        self._pending: List[str] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+    
+    async def write(self, line: str):
+        self._pending.append(line)
+        if len(self._pending) >= self.flush_lines:
+            await self._flush_pending()
+        elif self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.flush_ms / 1000.0, self._on_timer)
+    
+    def _on_timer(self):
+        self._timer = None
+        task = asyncio.create_task(self._flush_pending())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+    
+    async def _flush_pending(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Swap before awaiting: the lock is FIFO, so batches keep their order
+        lines, self._pending = self._pending, []
+        if lines:
+            await self.manager.append_logs(self.task_id, lines)
+    
+    async def flush(self):
+        """Deliver everything buffered so far, including timer flushes in flight"""
+        await self._flush_pending()
+        if self._flushes:
+            await asyncio.gather(*list(self._flushes), return_exceptions=True)
+
+
 class TaskManager:
     """Manage background tasks with status tracking"""
     
     def __init__(self):
         self.tasks: Dict[str, TaskStatus] = {}
+        self.logs: Dict[str, TaskLogBuffer] = {}  # task_id -> log ring buffer
         self.callbacks: Dict[str, list] = {}  # task_id -> list of callbacks
+        self.batchers: Dict[str, TaskLogBatcher] = {}  # task_id -> log coalescer
+        self.max_log_lines = int(os.getenv("TASK_LOG_MAX_LINES", "500"))
+        self.flush_ms = float(os.getenv("TASK_LOG_FLUSH_MS", "100"))
+        self.flush_lines = int(os.getenv("TASK_LOG_FLUSH_LINES", "200"))
+        # Write-behind to SQLite and memory retention
+        self.store_interval = float(os.getenv("TASK_STORE_FLUSH_INTERVAL", "1"))
+        self.cleanup_interval = float(os.getenv("TASK_CLEANUP_INTERVAL", "300"))
+        self.hot_seconds = float(os.getenv("TASK_HOT_SECONDS", "600"))
+        self.max_hot_tasks = int(os.getenv("TASK_MAX_HOT", "200"))
+        self.retention_days = float(os.getenv("TASK_RETENTION_DAYS", "7"))
+        self.operation_retention_days = float(os.getenv("OPERATION_RETENTION_DAYS", "30"))
+        self._dirty: Set[str] = set()
+        self._unsaved_lines: Dict[str, List[Tuple[int, str]]] = {}
+        self._store_task: Optional[asyncio.Task] = None
         self._lock = asyncio.Lock()
     
     def create_task(self, message: str = "Task created") -> str:
@@ -34,14 +140,86 @@ class TaskManager:
         )
         
         self.tasks[task_id] = task_status
+        self.logs[task_id] = TaskLogBuffer(self.max_log_lines)
         self.callbacks[task_id] = []
+        self._dirty.add(task_id)
         
         logger.info(f"Created task {task_id}: {message}")
         return task_id
     
     def get_task(self, task_id: str) -> Optional[TaskStatus]:
-        """Get task status by ID"""
-        return self.tasks.get(task_id)
+        """Get task status by ID (snapshot including retained logs)"""
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        buffer = self.logs.get(task_id)
+        return task.model_copy(update={"logs": buffer.lines() if buffer else []})
+    
+    def get_logs_since(self, task_id: str, seq: int = 0) -> List[Tuple[int, str]]:
+        """Retained log lines of a task after sequence number ``seq``"""
+        buffer = self.logs.get(task_id)
+        return buffer.since(seq) if buffer else []
+    
+    def replay_messages(self, task_id: str, since: int = 0) -> List[dict]:
+        """Current state plus the log lines after ``since`` for a (re)subscribing client
+        
+        The ``task_logs`` message is marked ``replay``; ``truncated`` is set when
+        lines after ``since`` were already evicted from the ring buffer.
+        """
+        task = self.tasks.get(task_id)
+        if task is None:
+            return []
+        buffer = self.logs[task_id]
+        return self._replay(task, buffer.since(since), buffer.first_seq, since)
+    
+    async def load_replay_messages(self, task_id: str, since: int = 0) -> List[dict]:
+        """``replay_messages``, falling back to the task store for evicted tasks
+        
+        Returns without awaiting when the task is in memory.
+        """
+        messages = self.replay_messages(task_id, since)
+        if messages:
+            return messages
+        db = get_db()
+        row = await run_db(db.get_task, task_id)
+        if row is None:
+            return []
+        tail = await run_db(db.get_task_log_tail, task_id, self.max_log_lines)
+        first_seq = tail[0][0] if tail else row["log_seq"] + 1
+        lines = [(seq, line) for seq, line in tail if seq > since]
+        return self._replay(TaskStatus(**row), lines, first_seq, since)
+    
+    def _replay(self, task: TaskStatus, lines: List[Tuple[int, str]], first_seq: int, since: int) -> List[dict]:
+        logs = self.logs_message(task.task_id, lines)
+        logs["replay"] = True
+        logs["truncated"] = since < first_seq - 1
+        return [self.task_message(task), logs]
+    
+    async def load_task(self, task_id: str) -> Optional[TaskStatus]:
+        """Get a task from memory, or lazily from the task store if evicted"""
+        task = self.get_task(task_id)
+        if task is not None:
+            return task
+        db = get_db()
+        row = await run_db(db.get_task, task_id)
+        if row is None:
+            return None
+        tail = await run_db(db.get_task_log_tail, task_id, self.max_log_lines)
+        return TaskStatus(**row, logs=[line for _, line in tail])
+    
+    @staticmethod
+    def task_message(task: TaskStatus) -> dict:
+        """``task_update`` message: task state without logs (log_seq marks the position)"""
+        return {"type": "task_update", "task": task.model_dump(mode="json", exclude={"logs"})}
+    
+    @staticmethod
+    def logs_message(task_id: str, lines: List[Tuple[int, str]]) -> dict:
+        """``task_logs`` delta message carrying only new lines"""
+        return {
+            "type": "task_logs",
+            "task_id": task_id,
+            "lines": [{"seq": seq, "line": line} for seq, line in lines],
+        }
     
     async def update_task(
         self,
@@ -50,44 +228,119 @@ class TaskManager:
         progress: Optional[int] = None,
         message: Optional[str] = None,
         log_line: Optional[str] = None,
-        error: Optional[str] = None
+        error: Optional[str] = None,
+        queue_position: Optional[int] = None,
+        queued_at: Optional[datetime] = None,
+        wait_seconds: Optional[float] = None
     ):
-        """Update task status and notify callbacks"""
+        """Update task status and notify callbacks
+        
+        Callbacks receive ready-to-send messages: a ``task_update`` when state
+        fields change and a ``task_logs`` delta for new log lines, so the cost
+        per log line does not grow with the size of the log.
+        """
         async with self._lock:
             task = self.tasks.get(task_id)
             if not task:
                 logger.warning(f"Task {task_id} not found")
                 return
             
+            state_changed = False
             if status:
                 task.status = status
+                state_changed = True
                 if status in ("completed", "failed"):
                     task.completed_at = datetime.utcnow()
             
             if progress is not None:
                 task.progress = max(0, min(100, progress))
+                state_changed = True
             
             if message:
                 task.message = message
+                state_changed = True
             
+            new_lines = []
             if log_line:
-                task.logs.append(log_line)
-                # Keep only last 500 lines to prevent memory issues
-                if len(task.logs) > 500:
-                    task.logs = task.logs[-500:]
+                new_lines = self._append_lines(task_id, task, [log_line])
             
             if error:
                 task.error = error
+                state_changed = True
+            
+            if queue_position is not None:
+                task.queue_position = queue_position
+                state_changed = True
+            
+            if queued_at is not None:
+                task.queued_at = queued_at
+                state_changed = True
+            
+            if wait_seconds is not None:
+                task.wait_seconds = wait_seconds
+                state_changed = True
             
             task.updated_at = datetime.utcnow()
+            self._dirty.add(task_id)
             
-            # Notify all callbacks
+            messages = []
+            if new_lines:
+                messages.append(self.logs_message(task_id, new_lines))
+            if state_changed:
+                messages.append(self.task_message(task))
+            
+            await self._notify(task_id, messages)
+    
+    async def append_logs(self, task_id: str, lines: List[str]):
+        """Append several log lines as one ``task_logs`` delta (one lock round-trip)"""
+        if not lines:
+            return
+        async with self._lock:
+            task = self.tasks.get(task_id)
+            if not task:
+                logger.warning(f"Task {task_id} not found")
+                return
+            
+            new_lines = self._append_lines(task_id, task, lines)
+            task.updated_at = datetime.utcnow()
+            self._dirty.add(task_id)
+            await self._notify(task_id, [self.logs_message(task_id, new_lines)])
+    
+    def _append_lines(self, task_id: str, task: TaskStatus, lines: List[str]) -> List[Tuple[int, str]]:
+        buffer = self.logs[task_id]
+        new_lines = [(buffer.append(line), line) for line in lines]
+        task.log_seq = buffer.last_seq
+        self._unsaved_lines.setdefault(task_id, []).extend(new_lines)
+        return new_lines
+    
+    async def _notify(self, task_id: str, messages: List[dict]):
+        """Notify all callbacks (caller holds the lock)"""
+        for update in messages:
             for callback in self.callbacks.get(task_id, []):
                 try:
-                    await callback(task)
+                    await callback(update)
                 except Exception as e:
                     logger.error(f"Error in task callback: {e}")
     
+    def log_writer(self, task_id: str) -> Callable[[str], Awaitable[None]]:
+        """Return a coalescing ``progress_callback`` for a task
+        
+        Lines are buffered and delivered as ``task_logs`` deltas every
+        ``TASK_LOG_FLUSH_MS`` or ``TASK_LOG_FLUSH_LINES`` lines, whichever
+        comes first. ``run_task`` flushes the rest before the final status.
+        """
+        batcher = self.batchers.get(task_id)
+        if batcher is None:
+            batcher = TaskLogBatcher(self, task_id, self.flush_ms, self.flush_lines)
+            self.batchers[task_id] = batcher
+        return batcher.write
+    
+    async def flush_logs(self, task_id: str):
+        """Deliver lines still buffered by the task's log writer"""
+        batcher = self.batchers.get(task_id)
+        if batcher is not None:
+            await batcher.flush()
+    
     def add_callback(self, task_id: str, callback: Callable):
         """Add a callback to be notified when task updates"""
         if task_id not in self.callbacks:
@@ -115,10 +368,20 @@ class TaskManager:
             await self.update_task(task_id, status="running", progress=10)
             
             # Execute the coroutine
-            result = await coro(*args, **kwargs)
+            try:
+                result = await coro(*args, **kwargs)
+            finally:
+                # Buffered log lines must reach subscribers before the final status
+                await self.flush_logs(task_id)
             
             # Mark as completed
-            success, message = result if isinstance(result, tuple) else (True, str(result))
+            if isinstance(result, tuple):
+                success, message = result
+            elif isinstance(result, bool):
+                # ClusterService operations return a bare success flag
+                success, message = result, "Operation completed" if result else "Operation failed"
+            else:
+                success, message = True, str(result)
             
             if success:
                 await self.update_task(
@@ -144,21 +407,118 @@ class TaskManager:
                 error=str(e)
             )
     
+    # Task store (write-behind + retention)
+    
+    async def start(self):
+        """Fail tasks orphaned by a previous process and start the store loop"""
+        if self._store_task and not self._store_task.done():
+            return
+        orphaned = await run_db(get_db().fail_unfinished_tasks, "Interrupted by backend restart")
+        if orphaned:
+            logger.warning(f"Marked {orphaned} unfinished task(s) from a previous run as failed")
+        self._store_task = asyncio.create_task(self._store_loop())
+    
+    async def stop(self):
+        """Stop the store loop and persist whatever is still pending"""
+        if self._store_task:
+            self._store_task.cancel()
+            try:
+                await self._store_task
+            except asyncio.CancelledError:
+                pass
+            self._store_task = None
+        await self.flush()
+    
+    async def flush(self):
+        """Write dirty task rows and unsaved log lines in one transaction"""
+        if not self._dirty and not self._unsaved_lines:
+            return
+        dirty, self._dirty = self._dirty, set()
+        unsaved, self._unsaved_lines = self._unsaved_lines, {}
+        
+        rows = []
+        for task_id in dirty:
+            task = self.tasks.get(task_id)
+            if task is not None:
+                rows.append(self._task_row(task))
+        chunks = [
+            (task_id, lines[0][0], lines[-1][0], [line for _, line in lines])
+            for task_id, lines in unsaved.items() if lines
+        ]
+        try:
+            await run_db(get_db().save_tasks, rows, chunks)
+        except Exception:
+            # Keep the batch for the next attempt (newer changes win for rows)
+            self._dirty |= dirty
+            for task_id, lines in unsaved.items():
+                self._unsaved_lines[task_id] = lines + self._unsaved_lines.get(task_id, [])
+            raise
+    
+    @staticmethod
+    def _task_row(task: TaskStatus) -> dict:
+        row = task.model_dump(exclude={"logs"})
+        for col in ("created_at", "updated_at", "completed_at"):
+            if row[col] is not None:
+                row[col] = row[col].isoformat()
+        return row
+    
+    async def _store_loop(self):
+        last_cleanup = asyncio.get_running_loop().time()
+        while True:
+            try:
+                await asyncio.sleep(self.store_interval)
+                await self.flush()
+                now = asyncio.get_running_loop().time()
+                if now - last_cleanup >= self.cleanup_interval:
+                    last_cleanup = now
+                    await self.run_retention()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Task store flush failed: {e}")
+    
+    async def run_retention(self):
+        """Evict persisted finished tasks from memory and purge expired tasks and operations"""
+        self.cleanup_old_tasks(self.hot_seconds)
+        cutoff = (datetime.utcnow() - timedelta(days=self.retention_days)).isoformat()
+        deleted = await run_db(get_db().delete_tasks_before, cutoff)
+        if deleted:
+            logger.info(f"Deleted {deleted} task(s) older than {self.retention_days} days")
+        # Operation records and transcripts use local timestamps (see Database.log_operation_start)
+        cutoff = (datetime.now() - timedelta(days=self.operation_retention_days)).isoformat()
+        deleted = await run_db(get_db().prune_operations, cutoff)
+        if deleted:
+            logger.info(f"Deleted {deleted} operation(s) older than {self.operation_retention_days} days")
+    
     def cleanup_old_tasks(self, max_age_seconds: int = 3600):
-        """Remove tasks older than max_age_seconds"""
+        """Evict finished tasks from memory
+        
+        A task is evicted once it has been persisted and finished more than
+        ``max_age_seconds`` ago, or when more than ``max_hot_tasks`` finished
+        tasks are held (oldest first). Running tasks always stay in memory.
+        """
         now = datetime.utcnow()
+        finished = [
+            task for task_id, task in self.tasks.items()
+            if task.status in ("completed", "failed")
+            and task_id not in self._dirty and task_id not in self._unsaved_lines
+        ]
+        finished.sort(key=lambda task: task.completed_at or task.updated_at)
+        excess = max(0, len(finished) - self.max_hot_tasks)
         task_ids_to_remove = []
         
-        for task_id, task in self.tasks.items():
-            age = (now - task.created_at).total_seconds()
-            if age > max_age_seconds and task.status in ("completed", "failed"):
-                task_ids_to_remove.append(task_id)
+        for index, task in enumerate(finished):
+            age = (now - (task.completed_at or task.updated_at)).total_seconds()
+            if index < excess or age > max_age_seconds:
+                task_ids_to_remove.append(task.task_id)
         
         for task_id in task_ids_to_remove:
             del self.tasks[task_id]
+            self.logs.pop(task_id, None)
+            self.batchers.pop(task_id, None)
             if task_id in self.callbacks:
                 del self.callbacks[task_id]
-            logger.info(f"Cleaned up old task {task_id}")
+            logger.info(f"Evicted task {task_id} from memory")
 
 
 # Global task manager instance
@@ -0,0 +1,199 @@
+"""Cluster watch hub - Kubernetes-style watch over the clusters table
+
+A single change detector polls the ``change_versions`` counter (one indexed
+lookup per interval, regardless of how many clients are watching). When it
+advances, the new ``cluster_changes`` rows are read once, encoded once and
+fanned out to every watcher's queue.
+
+Writers do not need to cooperate: triggers on ``clusters`` record changes made
+by the API, ``reconcile.sh`` and ``lib_sqlite.sh`` alike.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from ..db import get_db
+from ..models.cluster import cluster_to_info_dict
+from .db_service import run_db
+
+logger = logging.getLogger(__name__)
+
+
+class WatchExpired(Exception):
+    """Requested resource version is older than the retained change log"""
+
+
+@dataclass
+class WatchEvent:
+    """One watch event, pre-encoded as an SSE frame"""
+    type: str  # ADDED | MODIFIED | DELETED | BOOKMARK
+    resource_version: int
+    frame: str
+    object: Dict[str, Any] = field(default_factory=dict)
+
+
+def encode_event(event_type: str, resource_version: int, obj: Dict[str, Any]) -> WatchEvent:
+    """Build an SSE frame (``id`` = resource version, so EventSource can resume)"""
+    data = json.dumps({"type": event_type, "resource_version": resource_version, "object": obj})
+    return WatchEvent(
+        type=event_type,
+        resource_version=resource_version,
+        frame=f"id: {resource_version}\nevent: {event_type}\ndata: {data}\n\n",
+        object=obj,
+    )
+
+
+def _change_to_event(change: Dict[str, Any]) -> WatchEvent:
+    if change["event"] == "DELETED" or change.get("name") is None:
+        # Row is gone (deleted now or later in the log): report a deletion
+        obj = {"name": change["cluster_name"]}
+        event_type = "DELETED"
+    else:
+        obj = cluster_to_info_dict(change)
+        event_type = change["event"]
+    return encode_event(event_type, change["change_version"], obj)
+
+
+class ClusterWatchHub:
+    """Single change detector with per-watcher bounded queues"""
+
+    def __init__(self):
+        self.poll_interval = float(os.getenv("WATCH_POLL_INTERVAL", "0.5"))
+        # Change log rows kept for resuming watches (?since=)
+        self.retention = int(os.getenv("WATCH_RETENTION", "10000"))
+        self.queue_size = int(os.getenv("WATCH_QUEUE_SIZE", "1000"))
+        self.heartbeat_seconds = float(os.getenv("WATCH_HEARTBEAT_SECONDS", "15"))
+        self._watchers: Set[asyncio.Queue] = set()
+        self._listeners: List[Callable[[WatchEvent], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        """Last change version seen by the detector"""
+        return self._version
+
+    async def start(self):
+        """Start the change detector (called from the app lifespan)"""
+        if self._task and not self._task.done():
+            return
+        db = get_db()
+        version = await run_db(db.get_change_version, "clusters")
+        if self._task and not self._task.done():
+            return  # started concurrently while we were awaiting
+        self._version = version
+        self._task = asyncio.create_task(self._detect_changes())
+        logger.info("[Watch] Change detector started at version %s", self._version)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _detect_changes(self):
+        db = get_db()
+        polls = 0
+        while True:
+            try:
+                await asyncio.sleep(self.poll_interval)
+                current = await run_db(db.get_change_version, "clusters")
+                while current > self._version:
+                    changes = await run_db(db.list_cluster_changes, self._version, 500)
+                    if not changes:
+                        # Log pruned underneath us; nothing left to replay
+                        self._version = current
+                        break
+                    for change in changes:
+                        self._publish(_change_to_event(change))
+                    self._version = changes[-1]["change_version"]
+
+                polls += 1
+                if polls % 600 == 0:
+                    await run_db(db.prune_cluster_changes, self.retention)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("[Watch] Change detection failed: %s", e)
+
+    def add_listener(self, callback: Callable[[WatchEvent], None]):
+        """Register a non-blocking callback invoked with every detected change"""
+        self._listeners.append(callback)
+
+    def _publish(self, event: WatchEvent):
+        for callback in self._listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error("[Watch] Listener failed: %s", e)
+        for queue in list(self._watchers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow consumer: drop it; the client resumes with Last-Event-ID
+                self._watchers.discard(queue)
+                logger.warning("[Watch] Dropping slow watcher (queue full)")
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._watchers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._watchers.discard(queue)
+
+    def is_subscribed(self, queue: asyncio.Queue) -> bool:
+        return queue in self._watchers
+
+    async def initial_events(self, since: Optional[int]) -> List[WatchEvent]:
+        """Snapshot (since=None) or replay of the change log after ``since``
+
+        Raises:
+            WatchExpired: ``since`` predates the retained change log
+        """
+        db = get_db()
+        if since is None:
+            # Version first: rows may be newer than it, never older
+            version = await run_db(db.get_change_version, "clusters")
+            rows = await run_db(db.list_clusters)
+            events = [encode_event("ADDED", row.get("resource_version") or 0, cluster_to_info_dict(row))
+                      for row in reversed(rows)]
+            # The snapshot reflects every change up to its newest row
+            version = max([version] + [e.resource_version for e in events])
+            events.append(encode_event("BOOKMARK", version, {}))
+            return events
+
+        current = await run_db(db.get_change_version, "clusters")
+        if since >= current:
+            return []
+        oldest = await run_db(db.get_oldest_change_version)
+        if oldest is None or since < oldest - 1:
+            raise WatchExpired(f"resource version {since} is too old (oldest retained: {oldest})")
+
+        events = []
+        cursor = since
+        while cursor < current:
+            changes = await run_db(db.list_cluster_changes, cursor, 500)
+            if not changes:
+                break
+            events.extend(_change_to_event(change) for change in changes)
+            cursor = changes[-1]["change_version"]
+        return events
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "watchers": len(self._watchers),
+            "version": self._version,
+            "running": bool(self._task and not self._task.done()),
+        }
+
+
+# Singleton instance for import from API modules
+cluster_watch = ClusterWatchHub()
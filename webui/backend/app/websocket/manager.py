@@ -1,90 +1,317 @@
-"""WebSocket connection manager"""
+"""WebSocket connection manager - topic based pub/sub hub
+
+Clients multiplex any number of topic subscriptions over one socket:
+
+- ``task:<task_id>``   task state (``task_update``) and log deltas (``task_logs``)
+- ``cluster:<name>``   change events of one cluster (``cluster_event``)
+- ``clusters``         change events of every cluster
+- ``services``         global service status changes (``service_status``)
+
+A message is serialised once per topic (with a ``topic`` field added) and the
+same payload is queued for every subscriber. Every connection owns a bounded outbound queue drained by its own writer
+task, so a broadcast only enqueues a pre-serialised frame and never waits on
+a socket. When a queue fills up, intermediate log deltas are dropped first,
+state messages with the same key (e.g. the latest ``task_update`` of a task)
+replace each other (the newest moving to the tail, so it is never sent ahead
+of frames queued before it), and a client that still cannot keep up (queue
+full of state, or a send exceeding ``WS_SEND_TIMEOUT``) is disconnected.
+"""
+import asyncio
+import json
 import logging
-from typing import Dict, Set
+import os
+import re
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
 from fastapi import WebSocket
 
 logger = logging.getLogger(__name__)
 
+TOPIC_PATTERN = re.compile(r"^(clusters|services|task:[A-Za-z0-9._-]{1,128}|cluster:[A-Za-z0-9._-]{1,64})$")
+
+
+def is_valid_topic(topic: Any) -> bool:
+    return isinstance(topic, str) and bool(TOPIC_PATTERN.match(topic))
+
+
+class _Frame:
+    """Queued outbound message"""
+    __slots__ = ("text", "key", "droppable")
+
+    def __init__(self, text: str, key: Optional[str], droppable: bool):
+        self.text = text
+        self.key = key
+        self.droppable = droppable
+
+
+class ClientConnection:
+    """Outbound side of one WebSocket: bounded queue + writer task"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_queue: int,
+        send_timeout: float,
+        on_evict: Optional[Callable[[], None]] = None,
+    ):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.on_evict = on_evict
+        self._queue: deque = deque()
+        self._by_key: Dict[str, _Frame] = {}
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self.closed = False
+        self._close_sent = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, text: str, key: Optional[str] = None, droppable: bool = False) -> bool:
+        """Queue a frame without blocking; return False if the client must be evicted"""
+        if self.closed:
+            return True
+
+        if key is not None:
+            pending = self._by_key.get(key)
+            if pending is not None:
+                # Newer state supersedes the one still waiting to be sent; it is
+                # queued at the tail so it cannot overtake later frames
+                self._queue.remove(pending)
+                self.coalesced += 1
+
+        if len(self._queue) >= self.max_queue:
+            if droppable:
+                self.dropped += 1
+                return True
+            if not self._drop_oldest_droppable():
+                return False
+
+        frame = _Frame(text, key, droppable)
+        self._queue.append(frame)
+        if key is not None:
+            self._by_key[key] = frame
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._ready.set()
+        return True
+
+    def _drop_oldest_droppable(self) -> bool:
+        for frame in self._queue:
+            if frame.droppable:
+                self._queue.remove(frame)
+                self.dropped += 1
+                return True
+        return False
+
+    async def _write_loop(self):
+        try:
+            while True:
+                await self._ready.wait()
+                while self._queue:
+                    frame = self._queue.popleft()
+                    if frame.key is not None and self._by_key.get(frame.key) is frame:
+                        del self._by_key[frame.key]
+                    async with asyncio.timeout(self.send_timeout):
+                        await self.websocket.send_text(frame.text)
+                    self.sent += 1
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning("Evicting slow WebSocket client (send timed out)")
+            if self.on_evict:
+                self.on_evict()
+            await self.close(code=1013)
+        except Exception as e:
+            logger.error(f"Error sending to WebSocket: {e}")
+            self.closed = True
+
+    async def close(self, code: int = 1000):
+        """Stop accepting frames and close the socket (the receive loop then disconnects)"""
+        self.closed = True
+        if self._close_sent:
+            return
+        self._close_sent = True
+        self._queue.clear()
+        self._by_key.clear()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def stop(self):
+        self.closed = True
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
 
 class WebSocketManager:
-    """Manage WebSocket connections for real-time updates"""
-    
+    """Topic hub: connections, subscriptions and fan-out"""
+
     def __init__(self):
+        self.max_queue = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+        self.send_timeout = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+
         # All active connections
-        self.active_connections: Set[WebSocket] = set()
-        
-        # Task subscriptions: task_id -> set of websockets
-        self.task_subscriptions: Dict[str, Set[WebSocket]] = {}
-    
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+
+        # topic -> set of websockets, websocket -> set of topics
+        self.subscriptions: Dict[str, Set[WebSocket]] = {}
+        self.connection_topics: Dict[WebSocket, Set[str]] = {}
+
+        self.published = 0
+        self.evicted = 0
+        self._closing: Set[asyncio.Task] = set()
+
     async def connect(self, websocket: WebSocket):
-        """Accept a new WebSocket connection"""
+        """Accept a new WebSocket connection and start its writer"""
         await websocket.accept()
-        self.active_connections.add(websocket)
+        connection = ClientConnection(websocket, self.max_queue, self.send_timeout, self._count_eviction)
+        connection.start()
+        self.active_connections[websocket] = connection
+        self.connection_topics[websocket] = set()
         logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
-    
+
     def disconnect(self, websocket: WebSocket):
-        """Remove a WebSocket connection"""
-        self.active_connections.discard(websocket)
-        
-        # Remove from all subscriptions
-        for task_id, subscribers in list(self.task_subscriptions.items()):
+        """Remove a WebSocket connection and all its subscriptions"""
+        connection = self.active_connections.pop(websocket, None)
+        if connection is not None:
+            self._spawn(connection.stop())
+
+        for topic in self.connection_topics.pop(websocket, set()):
+            self._remove_subscriber(topic, websocket)
+
+        logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
+
+    def _count_eviction(self):
+        self.evicted += 1
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]) -> List[str]:
+        """Subscribe a WebSocket to topics; return the valid ones"""
+        accepted = []
+        for topic in topics:
+            if not is_valid_topic(topic):
+                continue
+            self.subscriptions.setdefault(topic, set()).add(websocket)
+            self.connection_topics.setdefault(websocket, set()).add(topic)
+            accepted.append(topic)
+        logger.debug(f"WebSocket subscribed to {accepted}")
+        return accepted
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]) -> List[str]:
+        """Unsubscribe a WebSocket from topics"""
+        removed = []
+        for topic in topics:
+            self._remove_subscriber(topic, websocket)
+            self.connection_topics.get(websocket, set()).discard(topic)
+            removed.append(topic)
+        logger.debug(f"WebSocket unsubscribed from {removed}")
+        return removed
+
+    def _remove_subscriber(self, topic: str, websocket: WebSocket):
+        subscribers = self.subscriptions.get(topic)
+        if subscribers is not None:
             subscribers.discard(websocket)
             if not subscribers:
-                del self.task_subscriptions[task_id]
-        
-        logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
-    
-    def subscribe_task(self, websocket: WebSocket, task_id: str):
-        """Subscribe a WebSocket to task updates"""
-        if task_id not in self.task_subscriptions:
-            self.task_subscriptions[task_id] = set()
-        
-        self.task_subscriptions[task_id].add(websocket)
-        logger.debug(f"WebSocket subscribed to task {task_id}")
-    
-    def unsubscribe_task(self, websocket: WebSocket, task_id: str):
-        """Unsubscribe a WebSocket from task updates"""
-        if task_id in self.task_subscriptions:
-            self.task_subscriptions[task_id].discard(websocket)
-            if not self.task_subscriptions[task_id]:
-                del self.task_subscriptions[task_id]
-        
-        logger.debug(f"WebSocket unsubscribed from task {task_id}")
-    
-    async def broadcast_task_update(self, task_id: str, data: dict):
-        """Send task update to all subscribed WebSockets"""
-        if task_id not in self.task_subscriptions:
+                del self.subscriptions[topic]
+
+    def has_subscribers(self, topic: str) -> bool:
+        return bool(self.subscriptions.get(topic))
+
+    def _deliver(self, websocket: WebSocket, text: str, key: Optional[str] = None, droppable: bool = False):
+        connection = self.active_connections.get(websocket)
+        if connection is None:
             return
-        
-        dead_connections = set()
-        
-        for websocket in self.task_subscriptions[task_id]:
-            try:
-                await websocket.send_json(data)
-            except Exception as e:
-                logger.error(f"Error sending to WebSocket: {e}")
-                dead_connections.add(websocket)
-        
-        # Clean up dead connections
-        for websocket in dead_connections:
-            self.disconnect(websocket)
-    
-    async def broadcast_all(self, data: dict):
-        """Broadcast message to all connected WebSockets"""
-        dead_connections = set()
-        
-        for websocket in self.active_connections:
-            try:
-                await websocket.send_json(data)
-            except Exception as e:
-                logger.error(f"Error broadcasting to WebSocket: {e}")
-                dead_connections.add(websocket)
-        
-        # Clean up dead connections
-        for websocket in dead_connections:
+        if not connection.enqueue(text, key, droppable):
+            logger.warning("Evicting slow WebSocket client (send queue full)")
+            self._count_eviction()
+            self._spawn(connection.close(code=1013))
             self.disconnect(websocket)
 
+    def send(self, websocket: WebSocket, data: dict):
+        """Queue a message for one connection (in order with published messages)"""
+        self._deliver(websocket, json.dumps(data))
 
-# Global WebSocket manager instance
-ws_manager = WebSocketManager()
+    def publish(self, topic: str, data: dict, key: Optional[str] = None, droppable: bool = False):
+        """Queue a message for every subscriber of ``topic`` without waiting on sockets
+
+        Args:
+            topic: Topic name (``task:<id>``, ``cluster:<name>``, ``clusters``, ``services``)
+            data: Message; serialised once with ``topic`` added
+            key: Pending frames with the same key are replaced (latest state wins)
+            droppable: May be dropped when a subscriber's queue is full
+        """
+        subscribers = self.subscriptions.get(topic)
+        if not subscribers:
+            return
 
+        text = json.dumps({**data, "topic": topic})
+        frame_key = f"{topic}|{key}" if key is not None else None
+        self.published += 1
+        for websocket in list(subscribers):
+            self._deliver(websocket, text, frame_key, droppable)
+
+    def publish_task(self, task_id: str, data: dict):
+        """Publish a task message: ``task_logs`` deltas are droppable, state coalesces"""
+        if data.get("type") == "task_logs":
+            self.publish(f"task:{task_id}", data, droppable=True)
+        else:
+            self.publish(f"task:{task_id}", data, key="state")
+
+    async def shutdown(self):
+        """Stop every writer task (called on application shutdown)"""
+        connections = list(self.active_connections.values())
+        self.active_connections.clear()
+        self.subscriptions.clear()
+        self.connection_topics.clear()
+        await asyncio.gather(*(c.stop() for c in connections), return_exceptions=True)
+        if self._closing:
+            await asyncio.gather(*list(self._closing), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Send queue depth, subscription and drop/eviction counters"""
+        connections = list(self.active_connections.values())
+        depths = [c.depth for c in connections]
+        return {
+            "connections": len(connections),
+            "topics": len(self.subscriptions),
+            "subscriptions": sum(len(s) for s in self.subscriptions.values()),
+            "published": self.published,
+            "queue_limit": self.max_queue,
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "dropped": sum(c.dropped for c in connections),
+            "coalesced": sum(c.coalesced for c in connections),
+            "evicted": self.evicted,
+        }
+
+
+# Global WebSocket hub instance
+ws_manager = WebSocketManager()
@@ -11,9 +11,10 @@ const apiClient = axios.create({
 
 // Cluster API
 export const clusterAPI = {
-  // List all clusters
-  list() {
-    return apiClient.get('/clusters')
+  // List clusters (optional params: limit, after, provider, desired_state,
+  // actual_state, prefix, fields; next page cursor in X-Next-Cursor header)
+  list(params = {}) {
+    return apiClient.get('/clusters', { params })
   },
   
   // Get cluster by name
@@ -44,6 +45,19 @@ export const clusterAPI = {
   // Stop cluster
   stop(name) {
     return apiClient.post(`/clusters/${name}/stop`)
+  },
+  
+  // Watch cluster changes via Server-Sent Events.
+  // handler(type, payload) receives ADDED/MODIFIED/DELETED/BOOKMARK events;
+  // EventSource resumes automatically (Last-Event-ID). Call .close() to stop.
+  watch(handler, since = null) {
+    const url = since !== null ? `/api/clusters/watch?since=${since}` : '/api/clusters/watch'
+    const source = new EventSource(url)
+    const eventTypes = ['ADDED', 'MODIFIED', 'DELETED', 'BOOKMARK']
+    eventTypes.forEach(type => {
+      source.addEventListener(type, event => handler(type, JSON.parse(event.data)))
+    })
+    return source
   }
 }
 
@@ -67,12 +81,66 @@ export class TaskWebSocket {
   constructor() {
     this.ws = null
     this.listeners = new Map()
+    this.topicListeners = new Map()  // topic -> callbacks (clusters, cluster:<name>, services)
+    this.tasks = new Map()  // taskId -> task state merged from task_update/task_logs
+    this.resyncing = new Set()  // taskIds waiting for a replay after a gap
+    this.maxLogLines = 500
     this.reconnectTimer = null
   }
   
+  // Merge a message into the local task state and notify listeners with the
+  // full task (logs included), so views keep working with task.logs
+  _apply(taskId, patch, lines = []) {
+    const current = this.tasks.get(taskId) || { task_id: taskId, logs: [], log_seq: 0 }
+    const task = { ...current, ...patch, logs: current.logs, log_seq: current.log_seq }
+    
+    const fresh = lines.filter(item => item.seq > task.log_seq)
+    if (fresh.length > 0) {
+      task.logs = task.logs.concat(fresh.map(item => item.line)).slice(-this.maxLogLines)
+      task.log_seq = fresh[fresh.length - 1].seq
+    }
+    this.tasks.set(taskId, task)
+    
+    const callbacks = this.listeners.get(taskId)
+    if (callbacks) {
+      callbacks.forEach(callback => callback(task))
+    }
+  }
+  
+  _lastSeq(taskId) {
+    const task = this.tasks.get(taskId)
+    return task ? task.log_seq : 0
+  }
+  
+  _sendSubscribe(taskId) {
+    if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+      this.ws.send(JSON.stringify({
+        type: 'subscribe',
+        task_id: taskId,
+        since: this._lastSeq(taskId)
+      }))
+    }
+  }
+  
+  _applyLogs(data) {
+    const taskId = data.task_id
+    const lines = data.lines || []
+    if (data.replay) {
+      this.resyncing.delete(taskId)
+    } else if (this.resyncing.has(taskId)) {
+      return  // covered by the replay that is on its way
+    } else if (lines.length > 0 && lines[0].seq > this._lastSeq(taskId) + 1) {
+      // Deltas were dropped for this slow client: ask for the missing range
+      this.resyncing.add(taskId)
+      this._sendSubscribe(taskId)
+      return
+    }
+    this._apply(taskId, {}, lines)
+  }
+  
   connect() {
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:'
-    const wsUrl = `${protocol}//${window.location.host}/ws/tasks`
+    const wsUrl = `${protocol}//${window.location.host}/ws`
     
     this.ws = new WebSocket(wsUrl)
     
@@ -84,6 +152,11 @@ export class TaskWebSocket {
           this.ws.send(JSON.stringify({ type: 'ping' }))
         }
       }, 30000)
+      // Re-subscribe after a reconnect, replaying only the lines we missed
+      this.listeners.forEach((_, taskId) => this._sendSubscribe(taskId))
+      if (this.topicListeners.size > 0) {
+        this.ws.send(JSON.stringify({ type: 'subscribe', topics: [...this.topicListeners.keys()] }))
+      }
     }
     
     this.ws.onmessage = (event) => {
@@ -91,11 +164,13 @@ export class TaskWebSocket {
         const data = JSON.parse(event.data)
         
         if (data.type === 'task_update' && data.task) {
-          const taskId = data.task.task_id
-          const callbacks = this.listeners.get(taskId)
-          if (callbacks) {
-            callbacks.forEach(callback => callback(data.task))
-          }
+          // State only: log lines arrive separately as task_logs deltas
+          const { logs, log_seq, ...state } = data.task
+          this._apply(data.task.task_id, state)
+        } else if (data.type === 'task_logs' && data.task_id) {
+          this._applyLogs(data)
+        } else if (data.topic && this.topicListeners.has(data.topic)) {
+          this.topicListeners.get(data.topic).forEach(callback => callback(data))
         }
       } catch (error) {
         console.error('WebSocket message error:', error)
@@ -122,13 +197,8 @@ export class TaskWebSocket {
     }
     this.listeners.get(taskId).push(callback)
     
-    // Send subscription message
-    if (this.ws && this.ws.readyState === WebSocket.OPEN) {
-      this.ws.send(JSON.stringify({
-        type: 'subscribe',
-        task_id: taskId
-      }))
-    }
+    // Send subscription message (the server replays lines after `since`)
+    this._sendSubscribe(taskId)
   }
   
   unsubscribe(taskId, callback) {
@@ -141,6 +211,8 @@ export class TaskWebSocket {
       
       if (callbacks.length === 0) {
         this.listeners.delete(taskId)
+        this.tasks.delete(taskId)
+        this.resyncing.delete(taskId)
         
         // Send unsubscription message
         if (this.ws && this.ws.readyState === WebSocket.OPEN) {
@@ -153,6 +225,33 @@ export class TaskWebSocket {
     }
   }
   
+  // Subscribe to a non-task topic: 'clusters', 'cluster:<name>' or 'services'
+  subscribeTopic(topic, callback) {
+    if (!this.topicListeners.has(topic)) {
+      this.topicListeners.set(topic, [])
+    }
+    this.topicListeners.get(topic).push(callback)
+    
+    if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+      this.ws.send(JSON.stringify({ type: 'subscribe', topics: [topic] }))
+    }
+  }
+  
+  unsubscribeTopic(topic, callback) {
+    const callbacks = this.topicListeners.get(topic)
+    if (!callbacks) return
+    const index = callbacks.indexOf(callback)
+    if (index > -1) {
+      callbacks.splice(index, 1)
+    }
+    if (callbacks.length === 0) {
+      this.topicListeners.delete(topic)
+      if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+        this.ws.send(JSON.stringify({ type: 'unsubscribe', topics: [topic] }))
+      }
+    }
+  }
+  
   disconnect() {
     if (this.reconnectTimer) {
       clearTimeout(this.reconnectTimer)
@@ -0,0 +1,207 @@
+"""Fake Docker Engine API on a Unix socket, for tests
+
+Serves ``GET /containers/json`` (``all`` and ``label`` filters, labels ANDed
+as in Docker) and ``GET /containers/{id}/json`` from a dict of inspect-style
+container objects, over HTTP/1.1 keep-alive like dockerd, plus a chunked
+``GET /events`` stream fed by ``emit()``. Counts requests and accepted
+connections so tests can assert on pooling.
+
+Run standalone to point scripts at it::
+
+    python3 fake_docker.py /tmp/docker.sock containers.json
+"""
+import json
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+def container(cid, name, labels, state="running", networks=None):
+    """Inspect-style container object (``networks``: network name -> IP)"""
+    return {
+        "Id": cid,
+        "Name": f"/{name}",
+        "Config": {"Labels": dict(labels)},
+        "State": {"Status": state},
+        "NetworkSettings": {
+            "Networks": {net: {"IPAddress": ip} for net, ip in sorted((networks or {}).items())},
+        },
+    }
+
+
+def _summary(data):
+    """``/containers/json`` entry for an inspect-style object"""
+    return {
+        "Id": data["Id"],
+        "Names": [data["Name"]],
+        "Labels": data["Config"]["Labels"],
+        "State": data["State"]["Status"],
+        "NetworkSettings": data["NetworkSettings"],
+    }
+
+
+def _matches(labels, selector):
+    key, sep, value = selector.partition("=")
+    return key in labels and (not sep or labels[key] == value)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.fake.lock:
+            self.server.fake.connections += 1
+            self.server.fake.sockets.add(self.connection)
+
+    def finish(self):
+        super().finish()
+        with self.server.fake.lock:
+            self.server.fake.sockets.discard(self.connection)
+
+    def log_message(self, format, *args):
+        pass
+
+    def address_string(self):
+        return "unix"
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self, types):
+        fake = self.server.fake
+        events = queue.Queue()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        # Subscribed once the headers are out, as in dockerd
+        with fake.lock:
+            fake.subscribers.append(events)
+        self.close_connection = True
+        try:
+            while not fake.stopping:
+                try:
+                    event = events.get(timeout=0.02)
+                except queue.Empty:
+                    continue
+                if types and event.get("Type") not in types:
+                    continue
+                data = (json.dumps(event) + "\n").encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        except OSError:
+            pass
+        finally:
+            with fake.lock:
+                fake.subscribers.remove(events)
+
+    def do_GET(self):
+        fake = self.server.fake
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        with fake.lock:
+            fake.requests.append(self.path)
+            containers = list(fake.containers.values())
+        parts = url.path.strip("/").split("/")
+        if parts == ["events"]:
+            self._stream_events(json.loads(query.get("filters", ["{}"])[0]).get("type"))
+        elif parts == ["containers", "json"]:
+            # The answer reflects the state when the request arrived
+            time.sleep(fake.list_delay)
+            filters = json.loads(query.get("filters", ["{}"])[0])
+            include_stopped = query.get("all", ["0"])[0] in ("1", "true")
+            result = [
+                _summary(data) for data in containers
+                if (include_stopped or data["State"]["Status"] == "running")
+                and all(_matches(data["Config"]["Labels"], s) for s in filters.get("label", []))
+            ]
+            self._send(200, result)
+        elif len(parts) == 3 and parts[0] == "containers" and parts[2] == "json":
+            ref = unquote(parts[1])
+            for data in containers:
+                if data["Id"] == ref or data["Name"] == f"/{ref}":
+                    self._send(200, data)
+                    return
+            self._send(404, {"message": f"No such container: {ref}"})
+        else:
+            self._send(404, {"message": "page not found"})
+
+
+class FakeDockerAPI:
+    """Threaded fake dockerd; use as a context manager"""
+
+    def __init__(self, socket_path, containers=()):
+        self.socket_path = socket_path
+        self.containers = {c["Id"]: c for c in containers}
+        self.requests = []
+        self.connections = 0
+        self.sockets = set()
+        self.subscribers = []
+        self.stopping = False
+        # Seconds each /containers/json answer is held back
+        self.list_delay = 0.0
+        self.lock = threading.Lock()
+        self._server = None
+
+    def emit(self, event):
+        """Send one event to every ``/events`` subscriber"""
+        with self.lock:
+            for events in self.subscribers:
+                events.put(event)
+
+    def start(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.stopping = False
+        self._server = _Server(self.socket_path, _Handler)
+        self._server.fake = self
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopping = True
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        # Like a daemon restart: kept-alive client connections are closed too
+        with self.lock:
+            sockets, self.sockets = list(self.sockets), set()
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    with open(sys.argv[2]) as f:
+        fake = FakeDockerAPI(sys.argv[1], json.load(f))
+    fake.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
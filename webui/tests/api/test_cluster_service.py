@@ -0,0 +1,77 @@
+"""Test ClusterService script execution (chunked reader, deadline, log chunks)"""
+import sys
+
+import pytest
+
+from app.db import Database
+from app.services import cluster_service as cluster_service_module
+from app.services.cluster_service import ClusterService, LineSplitter
+
+
+def test_line_splitter_handles_split_lines_and_utf8():
+    """Lines and multi-byte characters may straddle chunk boundaries"""
+    splitter = LineSplitter()
+    data = "héllo\nwörld ✓\nno newline".encode()
+    lines = []
+    for i in range(len(data)):
+        lines.extend(splitter.feed(data[i:i + 1]))
+    lines.extend(splitter.close())
+    assert lines == ["héllo\n", "wörld ✓\n", "no newline"]
+
+
+def test_line_splitter_bounds_overlong_lines(monkeypatch):
+    """A line without newline is emitted once it exceeds MAX_LINE_BYTES"""
+    monkeypatch.setattr(cluster_service_module, "MAX_LINE_BYTES", 8)
+    splitter = LineSplitter()
+    assert splitter.feed(b"abc") == []
+    assert splitter.feed("defgh\xc3".encode("latin-1")) == ["abcdefgh"]
+    assert splitter.feed(b"\xa9\n") == ["é\n"]
+
+
+@pytest.fixture
+def service(tmp_path):
+    database = Database(str(tmp_path / "kindler.db"))
+    svc = ClusterService()
+    svc.db = database
+    yield svc
+    database.close()
+
+
+@pytest.mark.asyncio
+async def test_execute_streams_output_to_callback_and_log_chunks(service):
+    """Output reaches the callback line by line and is stored in chunks"""
+    lines = []
+
+    async def callback(line):
+        lines.append(line)
+
+    op_id = service.db.log_operation_start(None, "start")
+    script = "import sys\nfor i in range(2000): print(f'line {i}')\nsys.exit(0)"
+    ok = await service._execute([sys.executable, "-c", script], op_id, callback)
+
+    assert ok
+    assert lines[0] == "line 0\n" and lines[1999] == "line 1999\n"
+    log = service.db.get_operation_log(op_id)
+    assert log.startswith("line 0\n") and "line 1999\n" in log
+    assert log.endswith("[SUCCESS] Operation completed successfully\n")
+    with service.db._get_conn(readonly=True) as conn:
+        chunks = conn.execute("SELECT COUNT(*) FROM operation_log_chunks WHERE operation_id = ?", (op_id,)).fetchone()[0]
+        status = conn.execute("SELECT status, log_output FROM operations WHERE id = ?", (op_id,)).fetchone()
+    assert chunks >= 1
+    assert status["status"] == "success" and status["log_output"] is None
+
+
+@pytest.mark.asyncio
+async def test_execute_enforces_overall_deadline(service):
+    """A script that keeps printing is still killed at the deadline"""
+    service.timeout = 0.5
+    op_id = service.db.log_operation_start(None, "start")
+    script = "import time\nwhile True:\n    print('tick', flush=True)\n    time.sleep(0.05)"
+
+    ok = await service._execute([sys.executable, "-c", script], op_id)
+
+    assert not ok
+    with service.db._get_conn(readonly=True) as conn:
+        row = conn.execute("SELECT status, error_message FROM operations WHERE id = ?", (op_id,)).fetchone()
+    assert row["status"] == "timeout"
+    assert "tick\n" in service.db.get_operation_log(op_id)
@@ -1,4 +1,6 @@
 """Test cluster API endpoints"""
+import time
+
 import pytest
 from httpx import AsyncClient
 from unittest.mock import patch, AsyncMock
@@ -47,6 +49,70 @@ async def test_list_clusters_with_data(client: AsyncClient):
         assert data[0]["status"] == "running"
 
 
+@pytest.mark.asyncio
+async def test_list_clusters_pagination_and_projection(client: AsyncClient):
+    """Test limit/after cursor and fields projection"""
+    mock_clusters = [
+        {"id": 3, "name": "c3", "provider": "k3d", "actual_state": "running", "created_at": "2024-01-03 00:00:00"},
+        {"id": 2, "name": "c2", "provider": "k3d", "actual_state": "running", "created_at": "2024-01-02 00:00:00"},
+        {"id": 1, "name": "c1", "provider": "k3d", "actual_state": "running", "created_at": "2024-01-01 00:00:00"},
+    ]
+
+    with patch("app.api.clusters.db_service.list_clusters", new_callable=AsyncMock) as mock_list:
+        mock_list.return_value = mock_clusters
+
+        response = await client.get("/api/clusters", params={"limit": 2, "fields": "name,status", "provider": "k3d"})
+        assert response.status_code == 200
+        assert response.json() == [
+            {"name": "c3", "status": "running"},
+            {"name": "c2", "status": "running"},
+        ]
+        # One extra row requested to detect the next page
+        assert mock_list.call_args.kwargs["limit"] == 3
+        assert mock_list.call_args.kwargs["provider"] == "k3d"
+        cursor = response.headers["X-Next-Cursor"]
+
+        mock_list.return_value = mock_clusters[2:]
+        response = await client.get("/api/clusters", params={"limit": 2, "after": cursor})
+        assert response.status_code == 200
+        assert mock_list.call_args.kwargs["after"] == ("2024-01-02 00:00:00", 2)
+        assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_list_clusters_invalid_params(client: AsyncClient):
+    """Test unknown projection fields and malformed cursors are rejected"""
+    response = await client.get("/api/clusters", params={"fields": "name,bogus"})
+    assert response.status_code == 400
+
+    response = await client.get("/api/clusters", params={"after": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_list_clusters_conditional_get(client: AsyncClient):
+    """Test ETag / If-None-Match on the cluster list"""
+    with patch("app.api.clusters.db_service.get_change_version", new_callable=AsyncMock) as mock_version, \
+         patch("app.api.clusters.db_service.list_clusters", new_callable=AsyncMock) as mock_list:
+        mock_version.return_value = 7
+        mock_list.return_value = []
+
+        response = await client.get("/api/clusters")
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert etag.startswith('W/"clusters-7-')
+
+        response = await client.get("/api/clusters", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert mock_list.await_count == 1
+
+        # Any write bumps the version and invalidates the ETag
+        mock_version.return_value = 8
+        response = await client.get("/api/clusters", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+
 @pytest.mark.asyncio
 async def test_create_cluster(client: AsyncClient):
     """Test creating a cluster"""
@@ -75,6 +141,53 @@ async def test_create_cluster(client: AsyncClient):
         assert "new-cluster" in data["message"]
 
 
+@pytest.mark.asyncio
+async def test_create_cluster_allocates_omitted_ports(client: AsyncClient):
+    """Host ports left out of the request come from the allocator"""
+    allocated = {"pf_port": 19005, "http_port": 20003}
+
+    with patch("app.api.clusters.db_service.cluster_exists", new_callable=AsyncMock) as mock_exists, \
+         patch("app.api.clusters.db_service.allocate_port", new_callable=AsyncMock) as mock_allocate, \
+         patch("app.api.clusters.db_service.create_cluster", new_callable=AsyncMock) as mock_create:
+        mock_exists.return_value = False
+        mock_allocate.side_effect = lambda owner, purpose: allocated[purpose]
+
+        response = await client.post("/api/clusters", json={
+            "name": "auto-ports", "provider": "kind", "https_port": 21010
+        })
+        assert response.status_code == 202
+
+        record = mock_create.await_args.args[0]
+        assert (record["pf_port"], record["http_port"], record["https_port"]) == (19005, 20003, 21010)
+        assert {call.args[1] for call in mock_allocate.await_args_list} == {"pf_port", "http_port"}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("create", [AsyncMock(return_value=False), AsyncMock(side_effect=RuntimeError("db down"))])
+async def test_create_cluster_releases_ports_when_not_recorded(client: AsyncClient, create):
+    """Allocated ports do not leak when the cluster row cannot be written"""
+    with patch("app.api.clusters.db_service.cluster_exists", new_callable=AsyncMock) as mock_exists, \
+         patch("app.api.clusters.db_service.allocate_port", new_callable=AsyncMock) as mock_allocate, \
+         patch("app.api.clusters.db_service.release_allocations", new_callable=AsyncMock) as mock_release, \
+         patch("app.api.clusters.db_service.create_cluster", create):
+        mock_exists.return_value = False
+        mock_allocate.return_value = 19005
+
+        response = await client.post("/api/clusters", json={"name": "leaky", "provider": "k3d"})
+        assert response.status_code == 500
+        mock_release.assert_awaited_once_with("leaky")
+
+
+@pytest.mark.asyncio
+async def test_get_config_port_ranges_follow_the_allocator(client: AsyncClient):
+    from app.db import PORT_RANGES
+
+    config = (await client.get("/api/config")).json()
+    assert config["default_http_port_range"] == list(PORT_RANGES["http_port"])
+    assert config["default_https_port_range"] == list(PORT_RANGES["https_port"])
+    assert config["default_pf_port_range"] == list(PORT_RANGES["pf_port"])
+
+
 @pytest.mark.asyncio
 async def test_create_cluster_already_exists(client: AsyncClient):
     """Test creating a cluster that already exists"""
@@ -124,6 +237,21 @@ async def test_get_cluster(client: AsyncClient):
         assert data["status"] == "running"
 
 
+@pytest.mark.asyncio
+async def test_get_cluster_conditional_get(client: AsyncClient):
+    """Test detail ETag is the row's resource_version"""
+    with patch("app.api.clusters.db_service.get_cluster_version", new_callable=AsyncMock) as mock_version, \
+         patch("app.api.clusters.db_service.get_cluster", new_callable=AsyncMock) as mock_get:
+        mock_version.return_value = 42
+
+        # Weak ETag; If-None-Match uses weak comparison, so either form matches
+        for tag in ('W/"dev-42"', '"dev-42"'):
+            response = await client.get("/api/clusters/dev", headers={"If-None-Match": tag})
+            assert response.status_code == 304
+            assert response.headers["ETag"] == 'W/"dev-42"'
+        mock_get.assert_not_awaited()
+
+
 @pytest.mark.asyncio
 async def test_get_cluster_not_found(client: AsyncClient):
     """Test getting a non-existent cluster"""
@@ -182,6 +310,40 @@ async def test_get_cluster_status(client: AsyncClient):
         assert data["nodes_total"] == 0
 
 
+@pytest.mark.asyncio
+async def test_get_cluster_status_probes_when_monitor_result_is_old(client: AsyncClient, monkeypatch):
+    """Monitor results older than the check interval are re-probed, and the age is reported"""
+    from datetime import datetime, timedelta, timezone
+    from app.services.health_monitor import health_monitor
+    from app.services.prober import ProbeResult
+
+    def checked(seconds_ago):
+        return (datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)).isoformat()
+
+    for key in ("portainer", "argocd"):
+        target = health_monitor.get(key)
+        monkeypatch.setattr(target, "status", "healthy")
+        monkeypatch.setattr(target, "last_checked_at", checked(2))
+    cluster = {"name": "dev", "provider": "k3d", "actual_state": "running"}
+
+    with patch("app.api.clusters.db_service.get_cluster", new_callable=AsyncMock) as mock_get, \
+         patch("app.api.clusters.http_prober.probe_many", new_callable=AsyncMock) as mock_probe:
+        mock_get.return_value = cluster
+        data = (await client.get("/api/clusters/dev/status")).json()
+        assert data["portainer_status"] == "online" and 2 <= data["services_age_seconds"] < 10
+        mock_probe.assert_not_awaited()
+
+        # Backed off for minutes: the cached "healthy" is not trusted
+        monkeypatch.setattr(health_monitor.get("argocd"), "last_checked_at", checked(250))
+        now = time.time()
+        mock_probe.side_effect = lambda urls: {
+            url: ProbeResult(url, status_code=502 if "argocd" in url else 200, checked_at=now) for url in urls
+        }
+        data = (await client.get("/api/clusters/dev/status")).json()
+        assert data["argocd_status"] == "degraded" and data["services_age_seconds"] < 2
+        assert data["services_checked_at"]
+
+
 @pytest.mark.asyncio
 async def test_start_cluster(client: AsyncClient):
     """Test starting a cluster"""
@@ -206,3 +368,22 @@ async def test_stop_cluster(client: AsyncClient):
         
         data = response.json()
         assert "task_id" in data
+
+
+@pytest.mark.asyncio
+async def test_csv_edits_after_startup_are_picked_up(client: AsyncClient, tmp_path, monkeypatch):
+    """Clusters added to environments.csv while running reach the API without a restart"""
+    from app.api.clusters import db_service
+
+    header = "# env,provider,node_port,pf_port,register_portainer,haproxy_route,http_port,https_port,cluster_subnet\n"
+    csv_file = tmp_path / "environments.csv"
+    csv_file.write_text(header + "csv-a,k3d,30080,19401,true,true,20401,21401,\n")
+    monkeypatch.setattr(db_service, "csv_path", str(csv_file))
+    await db_service.sync_from_csv()
+
+    csv_file.write_text(header + "csv-a,k3d,30080,19401,true,true,20401,21401,\ncsv-b,kind,30080,19402,true,true,20402,21402,\n")
+    response = await client.get("/api/clusters", params={"prefix": "csv-"})
+    assert sorted(c["name"] for c in response.json()) == ["csv-a", "csv-b"]
+
+    response = await client.get("/api/clusters/csv-b")
+    assert response.status_code == 200 and response.json()["pf_port"] == 19402
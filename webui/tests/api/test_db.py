@@ -0,0 +1,355 @@
+"""Test SQLite database layer"""
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from app.db import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Isolated database instance backed by a temp file"""
+    database = Database(str(tmp_path / "kindler.db"))
+    yield database
+    database.close()
+
+
+def test_wal_mode_enabled(db: Database):
+    """Database file is switched to WAL journaling"""
+    conn = sqlite3.connect(db.db_path)
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    finally:
+        conn.close()
+
+
+def test_pool_reuses_connections(db: Database):
+    """Repeated calls reuse pooled connections instead of reconnecting"""
+    db.insert_cluster({"name": "dev", "provider": "k3d"})
+    for _ in range(20):
+        assert db.get_cluster("dev")["provider"] == "k3d"
+
+    stats = db.pool_stats()
+    assert stats["read"]["misses"] == 1
+    assert stats["read"]["hits"] >= 19
+    assert stats["read"]["in_use"] == 0
+
+
+def test_readonly_connection_rejects_writes(db: Database):
+    """Read-only fast path cannot modify data"""
+    with pytest.raises(sqlite3.OperationalError):
+        with db._get_conn(readonly=True) as conn:
+            conn.execute("DELETE FROM clusters")
+
+
+def test_pool_concurrent_access(db: Database):
+    """Concurrent readers and writers share a bounded pool"""
+    db.insert_cluster({"name": "dev", "provider": "k3d"})
+
+    def worker():
+        for i in range(50):
+            db.update_cluster("dev", {"status": str(i)})
+            db.get_cluster("dev")
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = db.pool_stats()
+    assert stats["write"]["open"] <= stats["write"]["size"]
+    assert stats["read"]["open"] <= stats["read"]["size"]
+    assert stats["write"]["timeouts"] == 0
+
+
+@pytest.mark.asyncio
+async def test_run_db_off_event_loop():
+    """DBService dispatches SQLite calls to the DB executor, not the loop thread"""
+    from app.services.db_service import run_db
+
+    thread_name = await run_db(lambda: threading.current_thread().name)
+    assert thread_name.startswith("kindler-db")
+    assert thread_name != threading.current_thread().name
+
+
+CSV_HEADER = "# env,provider,node_port,pf_port,register_portainer,haproxy_route,http_port,https_port,cluster_subnet\n"
+
+
+def _write_csv(path, rows):
+    path.write_text(CSV_HEADER + "".join(f"{r}\n" for r in rows))
+
+
+def test_sync_from_csv_imports_rows(db: Database, tmp_path):
+    """Initial CSV import inserts every environment"""
+    csv_file = tmp_path / "environments.csv"
+    _write_csv(csv_file, [
+        "dev,k3d,30080,19001,true,true,18091,18443,10.101.0.0/16",
+        "uat,kind,30080,19002,true,true,18092,18444,",
+    ])
+
+    assert db.sync_from_csv(str(csv_file)) == 2
+    assert db.get_cluster("dev")["pf_port"] == 19001
+    assert db.get_cluster("uat")["provider"] == "kind"
+    assert db.get_cluster("uat")["status"] == "unknown"
+
+
+@pytest.mark.asyncio
+async def test_db_service_syncs_csv_only_when_asked(db: Database, tmp_path, monkeypatch):
+    """Constructing DBService does no I/O; the startup sync runs on the DB executor"""
+    from app.services import db_service as db_service_module
+
+    csv_file = tmp_path / "environments.csv"
+    _write_csv(csv_file, ["dev,k3d,30080,19001,true,true,18091,18443,10.101.0.0/16"])
+    monkeypatch.setenv("CSV_PATH", str(csv_file))
+    monkeypatch.setattr(db_service_module, "get_db", lambda: db)
+    threads = []
+    monkeypatch.setattr(db, "sync_from_csv", lambda path, _sync=db.sync_from_csv: (
+        threads.append(threading.current_thread().name) or _sync(path)
+    ))
+
+    service = db_service_module.DBService()
+    assert db.get_cluster("dev") is None
+    assert await service.sync_from_csv() == 1
+    assert db.get_cluster("dev")["pf_port"] == 19001
+    assert threads[0].startswith("kindler-db")
+
+
+def test_sync_from_csv_skips_unchanged_file(db: Database, tmp_path):
+    """Unchanged CSV (same mtime or same content) is not re-imported"""
+    csv_file = tmp_path / "environments.csv"
+    _write_csv(csv_file, ["dev,k3d,30080,19001,true,true,18091,18443,"])
+    assert db.sync_from_csv(str(csv_file)) == 1
+
+    # Local state changes must survive a no-op sync
+    db.update_cluster("dev", {"pf_port": 19500})
+    assert db.sync_from_csv(str(csv_file)) == 0
+
+    # Touch without content change: hash gate short-circuits too
+    os.utime(csv_file, ns=(0, 0))
+    assert db.sync_from_csv(str(csv_file)) == 0
+    assert db.get_cluster("dev")["pf_port"] == 19500
+
+
+def test_sync_from_csv_applies_only_changed_rows(db: Database, tmp_path):
+    """Modified CSV upserts only rows that differ and preserves state columns"""
+    csv_file = tmp_path / "environments.csv"
+    _write_csv(csv_file, [
+        "dev,k3d,30080,19001,true,true,18091,18443,",
+        "uat,k3d,30080,19002,true,true,18092,18444,",
+    ])
+    db.sync_from_csv(str(csv_file))
+    db.update_cluster("dev", {"actual_state": "running"})
+
+    _write_csv(csv_file, [
+        "dev,k3d,30080,19001,true,true,18091,18443,",
+        "uat,k3d,30080,19003,true,true,18092,18444,",
+        "prod,kind,30080,19004,true,true,18093,18445,",
+    ])
+    os.utime(csv_file, ns=(1, 1))
+
+    assert db.sync_from_csv(str(csv_file)) == 2
+    assert db.get_cluster("uat")["pf_port"] == 19003
+    assert db.get_cluster("prod") is not None
+    assert db.get_cluster("dev")["actual_state"] == "running"
+
+
+def test_list_clusters_keyset_pagination(db: Database):
+    """Pages follow (created_at, id) DESC without gaps or duplicates"""
+    for i in range(7):
+        db.insert_cluster({"name": f"c{i}", "provider": "k3d" if i % 2 else "kind"})
+
+    seen = []
+    after = None
+    while True:
+        page = db.list_clusters(limit=3, after=after)
+        if not page:
+            break
+        seen.extend(row["name"] for row in page)
+        after = (page[-1]["created_at"], page[-1]["id"])
+
+    assert seen == [f"c{i}" for i in reversed(range(7))]
+
+
+def test_list_clusters_filters_and_projection(db: Database):
+    """Filters narrow the result and columns limit the selected fields"""
+    db.insert_cluster({"name": "dev", "provider": "k3d", "actual_state": "running"})
+    db.insert_cluster({"name": "dev2", "provider": "kind"})
+    db.insert_cluster({"name": "prod", "provider": "k3d"})
+
+    rows = db.list_clusters(provider="k3d", name_prefix="dev", columns=["name"])
+    assert [r["name"] for r in rows] == ["dev"]
+    assert set(rows[0]) == {"id", "created_at", "name"}
+
+    assert [r["name"] for r in db.list_clusters(actual_state="running")] == ["dev"]
+    with pytest.raises(ValueError):
+        db.list_clusters(columns=["name; DROP TABLE clusters"])
+
+
+def test_change_version_bumped_by_all_writers(db: Database):
+    """Writes from the app and from external sqlite3 clients bump versions"""
+    start = db.get_change_version()
+    db.insert_cluster({"name": "dev", "provider": "k3d"})
+    after_insert = db.get_change_version()
+    assert after_insert > start
+    assert db.get_cluster_version("dev") == after_insert
+
+    # Simulate lib_sqlite.sh writing through its own connection
+    conn = sqlite3.connect(db.db_path)
+    conn.execute("UPDATE clusters SET actual_state = 'running' WHERE name = 'dev'")
+    conn.commit()
+    conn.close()
+    after_external = db.get_change_version()
+    assert after_external > after_insert
+    assert db.get_cluster_version("dev") == after_external
+
+    db.delete_cluster("dev")
+    assert db.get_change_version() > after_external
+    assert db.get_cluster_version("dev") is None
+
+
+def test_operation_log_chunks_are_compressed_and_range_readable(db: Database):
+    """Transcripts are stored as zlib chunks and read back by byte range"""
+    op_id = db.log_operation_start("dev", "create")
+    db.append_operation_log(op_id, "line 1\n" * 100)
+    db.append_operation_log(op_id, "héllo\n")
+    db.log_operation_complete(op_id, "success")
+
+    full = ("line 1\n" * 100 + "héllo\n").encode()
+    assert db.read_operation_log(op_id) == full
+    assert db.read_operation_log(op_id, 695, 703) == full[695:703]
+    assert db.get_operation_log(op_id).endswith("héllo\n")
+
+    with db._get_conn(readonly=True) as conn:
+        rows = conn.execute(
+            "SELECT offset, raw_size, length(data) AS stored FROM operation_log_chunks WHERE operation_id = ? ORDER BY seq",
+            (op_id,),
+        ).fetchall()
+    assert [(r["offset"], r["raw_size"]) for r in rows] == [(0, 700), (700, 7)]
+    assert rows[0]["stored"] < 100
+
+    operation = db.get_cluster_operations("dev")[0]
+    assert "log_output" not in operation
+    assert operation["log_size"] == len(full) and operation["status"] == "success"
+
+
+def test_legacy_operation_logs_are_migrated_once(tmp_path):
+    """operations.log_output moves to the compressed chunks on the first start only"""
+    path = str(tmp_path / "legacy.db")
+    Database(path).close()
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        PRAGMA user_version = 0;
+        INSERT INTO operations (id, cluster_name, operation, status, started_at)
+            VALUES (1, 'dev', 'start', 'success', '2024-01-01T00:00:00');
+        INSERT INTO operations (id, cluster_name, operation, status, started_at, log_output)
+            VALUES (2, 'dev', 'stop', 'success', '2024-01-02T00:00:00', 'legacy output\n');
+    """)
+    conn.commit()
+    conn.close()
+
+    database = Database(path)
+    try:
+        database.append_operation_log(1, "first\n")
+        database.append_operation_log(1, "second\n")
+        assert database.read_operation_log(1, 6) == b"second\n"
+        assert database.get_operation_log(2) == "legacy output\n"
+        assert database.get_operation(2)["log_size"] == 14
+
+        # Retention removes finished operations together with their chunks
+        assert database.prune_operations("2024-01-01T12:00:00") == 1
+        assert database.get_operation(1) is None
+        assert database.read_operation_log(1) == b""
+    finally:
+        database.close()
+
+    # Later starts do not rescan operations
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE operations SET log_output = 'left alone' WHERE id = 2")
+    conn.commit()
+    conn.close()
+    database = Database(path)
+    try:
+        assert database.get_operation_log(2) == "legacy output\n"
+    finally:
+        database.close()
+
+
+def test_search_operations_and_reconcile_errors(db: Database):
+    """Transcripts are indexed on completion, reconcile errors on every write"""
+    op_id = db.log_operation_start("dev", "create")
+    db.append_operation_log(op_id, "creating cluster dev\nError: port already allocated: 19001\n")
+    assert db.search_operations("port allocated")["total"] == 0  # still running
+    db.log_operation_complete(op_id, "failed", error_message="create failed")
+
+    db.insert_cluster({"name": "dev", "provider": "k3d"})
+    db.update_cluster("dev", {"reconcile_error": "Bind for 0.0.0.0:19001 failed: port is already allocated"})
+    # Written behind the backend's back (like reconcile.sh does)
+    with db._get_conn() as conn:
+        conn.execute("INSERT INTO clusters (name, provider, reconcile_error) VALUES ('uat', 'kind', 'disk full')")
+
+    result = db.search_operations('"already allocated"')
+    assert result["total"] == 2
+    hits = {item["kind"]: item for item in result["items"]}
+    assert hits["operation"]["id"] == op_id and hits["operation"]["status"] == "failed"
+    assert "port <mark>already allocated</mark>" in hits["operation"]["snippet"]
+    assert hits["cluster"]["cluster_name"] == "dev"
+
+    assert db.search_operations("disk", kind="cluster")["items"][0]["cluster_name"] == "uat"
+    assert db.search_operations("19001:", kind="operation", limit=1)["total"] == 1
+    assert db.search_operations("create failed")["items"][0]["id"] == op_id
+
+    db.update_cluster("dev", {"reconcile_error": None})
+    db.delete_cluster("uat")
+    assert db.search_operations("allocated", kind="cluster")["total"] == 0
+    assert db.search_operations("disk")["total"] == 0
+
+
+def test_search_snippets_are_escaped_and_searches_only_read(db: Database):
+    """Indexed text is HTML-escaped around the <mark> highlights"""
+    db.insert_cluster({"name": "dev", "provider": "k3d"})
+    with db._get_conn() as conn:
+        conn.execute(
+            "UPDATE clusters SET reconcile_error = ? WHERE name = 'dev'",
+            ('<img src=x onerror=alert(1)> failed \x02boom\x03',),
+        )
+    writes = db.pool_stats()["write"]["acquisitions"]
+
+    snippet = db.search_operations("failed")["items"][0]["snippet"]
+    assert snippet == "&lt;img src=x onerror=alert(1)&gt; <mark>failed</mark> boom"
+    assert db.pool_stats()["write"]["acquisitions"] == writes
+
+
+def test_allocator_fills_gaps_and_reserves_atomically(db: Database):
+    """Allocations skip cluster ports and other reservations, in parallel too"""
+    from app.db import PORT_RANGES
+
+    lo, _ = PORT_RANGES["pf_port"]
+    db.insert_cluster({"name": "a", "provider": "k3d", "pf_port": lo, "http_port": lo + 2,
+                       "subnet": "10.101.0.0/16"})
+    assert db.allocate_port("x", "pf_port") == lo + 1
+    assert db.allocate_port("x", "pf_port") == lo + 1  # idempotent per owner/purpose
+    assert db.allocate_port("y", "pf_port") == lo + 3
+    assert db.allocate_subnet("x") == "10.102.0.0/16"
+
+    ports = []
+    threads = [
+        threading.Thread(target=lambda i=i: ports.append(db.allocate_port(f"t{i}", "pf_port")))
+        for i in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(ports) == list(range(lo + 4, lo + 12))
+
+    assert db.release("x") == 2
+    assert db.allocate_port("z", "pf_port") == lo + 1
+    with pytest.raises(ValueError):
+        db.allocate("port", "w", "pf_port", lo, lo + 1)
+
+    db.insert_cluster({"name": "z", "provider": "k3d"})
+    db.delete_cluster("z")
+    assert [a["owner"] for a in db.list_allocations("z")] == []
@@ -0,0 +1,109 @@
+"""Test the Docker Engine API client against the fake Unix-socket dockerd"""
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from app import docker_api
+from app.docker_api import DockerAPIError, DockerClient, cluster_ips
+
+from .fake_docker import FakeDockerAPI, container
+
+
+def _k3d(cid, cluster, node, networks, state="running"):
+    return container(cid, f"k3d-{cluster}-{node}", {"k3d.cluster": cluster, "k3d.role": node.split("-")[0]}, state, networks)
+
+
+def _kind(cid, cluster, networks):
+    labels = {"io.x-k8s.kind.cluster": cluster, "io.x-k8s.kind.role": "control-plane"}
+    return container(cid, f"{cluster}-control-plane", labels, "running", networks)
+
+
+@pytest.fixture
+def docker():
+    containers = [
+        _k3d(f"k{i}", f"dev{i}", "server-0", {f"k3d-dev{i}": f"10.{101 + i}.0.2", "k3d-shared": f"10.100.0.{10 + i}"})
+        for i in range(50)
+    ]
+    containers += [
+        _k3d("s1", "shared", "server-0", {"k3d-shared": "10.100.0.99"}, state="exited"),
+        _kind("q1", "qa", {"kind": "172.18.0.4"}),
+        # Same name as a k3d cluster
+        _kind("q2", "dev3", {"kind": "172.18.0.5"}),
+        container("h1", "haproxy-gw", {"com.docker.compose.service": "haproxy"}, "running", {"k3d-shared": "10.100.0.1"}),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        with FakeDockerAPI(str(Path(tmp) / "docker.sock"), containers) as fake:
+            yield fake
+
+
+@pytest.fixture
+def client(docker):
+    client = DockerClient(socket_path=docker.socket_path, pool_size=2)
+    yield client
+    client.close()
+
+
+def test_all_node_ips_in_one_listing_per_provider(client, docker):
+    resolved = cluster_ips(client.node_containers())
+
+    # 53 clusters, 2 requests (one label filter per provider), 1 connection
+    assert len(docker.requests) == 2 and docker.connections == 1
+    assert all(path.startswith("/containers/json?all=1&filters=") for path in docker.requests)
+    assert len(resolved) == 53 and all(cluster != "haproxy-gw" for _, cluster in resolved)
+    assert resolved[("k3d", "dev7")] == "10.108.0.2"
+    # Stopped clusters are listed too; no own network -> k3d-shared
+    assert resolved[("k3d", "shared")] == "10.100.0.99"
+    assert resolved[("kind", "qa")] == "172.18.0.4"
+    # A k3d and a kind cluster with the same name do not collide
+    assert resolved[("k3d", "dev3")] == "10.104.0.2" and resolved[("kind", "dev3")] == "172.18.0.5"
+
+    one = client.node_containers(provider="k3d", cluster="dev3")
+    assert [node.name for node in one] == ["k3d-dev3-server-0"]
+
+
+def test_pool_reuses_connections_and_bounds_them(client, docker):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: client.containers(), range(40)))
+    assert docker.connections <= 2
+    stats = client.stats()
+    assert stats["requests"] == 40 and stats["open"] <= 2
+
+
+def test_stale_keep_alive_connection_is_retried(client, docker):
+    assert client.inspect("qa-control-plane")["Id"] == "q1"
+    # Daemon restart closes the idle pooled connection
+    docker.stop()
+    docker.start()
+    assert client.inspect("k0")["Name"] == "/k3d-dev0-server-0"
+    assert client.stats()["retries"] == 1
+
+
+def test_errors(client, docker):
+    assert client.inspect("missing") is None
+    with pytest.raises(DockerAPIError) as excinfo:
+        client.get("/nope")
+    assert excinfo.value.status == 404
+
+    docker.stop()
+    with pytest.raises(OSError):
+        DockerClient(socket_path=docker.socket_path).containers()
+
+
+def test_cli(docker, capsys):
+    assert docker_api.main(["--socket", docker.socket_path, "node-ips", "--provider", "kind"]) == 0
+    assert capsys.readouterr().out == "dev3 kind 172.18.0.5\nqa kind 172.18.0.4\n"
+
+    assert docker_api.main(["--socket", docker.socket_path, "ip", "dev1"]) == 0
+    assert capsys.readouterr().out == "10.102.0.2\n"
+    # Filtered by the cluster label, one request per provider
+    assert all("%3Ddev1%22" in path for path in docker.requests[-2:])
+
+    assert docker_api.main(["--socket", docker.socket_path, "ip", "nope"]) == 1
+    # Ambiguous without --provider
+    assert docker_api.main(["--socket", docker.socket_path, "ip", "dev3"]) == 1
+    assert docker_api.main(["--socket", docker.socket_path, "ip", "dev3", "--provider", "kind"]) == 0
+    assert capsys.readouterr().out == "172.18.0.5\n"
+    docker.stop()
+    assert docker_api.main(["--socket", docker.socket_path, "ip", "dev1"]) == 2
@@ -0,0 +1,212 @@
+"""Test the event-driven provider inventory and its API"""
+import asyncio
+import tempfile
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+
+from app.api import inventory as inventory_api
+from app.docker_api import DockerClient
+from app.services.inventory_service import ProviderInventory, node_from_inspect, route_ip
+
+from .fake_docker import FakeDockerAPI, container
+
+
+def _container(cid, name, provider, cluster, state="running", networks=None, role="server"):
+    label, role_label = {
+        "k3d": ("k3d.cluster", "k3d.role"),
+        "kind": ("io.x-k8s.kind.cluster", "io.x-k8s.kind.role"),
+    }[provider]
+    return container(cid, name, {label: cluster, role_label: role}, state=state, networks=networks)
+
+
+def _event(action, cid, labels=None, event_type="container", container=None):
+    if event_type == "network":
+        return {"Type": "network", "Action": action, "Actor": {"ID": "net", "Attributes": {"container": container}}}
+    return {"Type": "container", "Action": action, "Actor": {"ID": cid, "Attributes": labels or {}}}
+
+
+@pytest.fixture
+def docker():
+    with tempfile.TemporaryDirectory() as tmp:
+        with FakeDockerAPI(str(Path(tmp) / "docker.sock"), [
+            _container("a1", "k3d-dev-server-0", "k3d", "dev", networks={"k3d-dev": "10.101.0.2", "k3d-shared": "10.100.0.5"}),
+            _container("a2", "k3d-dev-agent-0", "k3d", "dev", role="agent", networks={"k3d-dev": "10.101.0.3"}),
+            _container("b1", "qa-control-plane", "kind", "qa", state="exited", networks={"kind": "172.18.0.4"}),
+        ]) as fake:
+            yield fake
+
+
+@pytest.fixture
+def inventory(docker):
+    client = DockerClient(socket_path=docker.socket_path, pool_size=2)
+    yield ProviderInventory(client=client)
+    client.close()
+
+
+@pytest.fixture
+async def running(inventory):
+    await inventory.start()
+    await _until(lambda: inventory.fresh)
+    yield inventory
+    await inventory.stop()
+
+
+async def _until(predicate, timeout=3):
+    async with asyncio.timeout(timeout):
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+
+def test_node_from_inspect_ignores_other_containers():
+    assert node_from_inspect({"Id": "x", "Name": "/haproxy-gw", "Config": {"Labels": {}}}) is None
+    node = node_from_inspect(_container("b1", "qa-control-plane", "kind", "qa", networks={"kind": "172.18.0.4"}))
+    assert (node.provider, node.cluster, node.role, node.networks) == ("kind", "qa", "server", {"kind": "172.18.0.4"})
+
+
+def test_route_ip_follows_haproxy_route_preference():
+    server = node_from_inspect(_container(
+        "a1", "k3d-dev-server-0", "k3d", "dev", networks={"k3d-shared": "10.100.0.5", "k3d-dev": "10.101.0.2"},
+    ))
+    assert route_ip("k3d", "dev", [server]) == "10.101.0.2"
+    server.networks.pop("k3d-dev")
+    assert route_ip("k3d", "dev", [server]) == "10.100.0.5"
+    server.networks = {"bridge": "172.17.0.9"}
+    assert route_ip("k3d", "dev", [server]) == "172.17.0.9"
+    # Only server-0 / control-plane is routed to
+    agent = node_from_inspect(_container("a2", "k3d-dev-agent-0", "k3d", "dev", networks={"k3d-dev": "10.101.0.3"}))
+    assert route_ip("k3d", "dev", [agent]) is None
+
+
+@pytest.mark.asyncio
+async def test_relist_builds_clusters_and_is_required_for_answers(inventory, docker):
+    assert inventory.clusters("k3d") is None
+    # A relist alone is not enough: without the event stream answers may go stale
+    assert await inventory.relist()
+    assert inventory.clusters("k3d") is None
+
+    await inventory.start()
+    await _until(lambda: inventory.fresh)
+    assert inventory.clusters("k3d") == {"dev"}
+    assert inventory.clusters("kind") == {"qa"}
+    dev = inventory.cluster("dev")
+    assert dev["ip"] == "10.101.0.2" and dev["running"] is True and len(dev["nodes"]) == 2
+    # A stopped cluster still exists, as in `kind get clusters`
+    qa = inventory.cluster("qa")
+    assert qa["running"] is False and qa["ip"] == "172.18.0.4"
+    assert inventory.snapshot()["clusters"] == {"k3d": ["dev"], "kind": ["qa"]}
+
+    # Event stream down: answers are no longer trusted
+    docker.stop()
+    await _until(lambda: not inventory.fresh)
+    assert inventory.clusters() is None
+    await inventory.stop()
+
+
+@pytest.mark.asyncio
+async def test_events_update_nodes_without_relist(running, docker):
+    inventory = running
+    label = {"k3d.cluster": "uat"}
+    relists = inventory.stats["relists"]
+
+    docker.containers["c1"] = _container("c1", "k3d-uat-server-0", "k3d", "uat", networks={"k3d-uat": "10.102.0.2"})
+    docker.emit(_event("create", "c1", label))
+    await _until(lambda: inventory.clusters("k3d") == {"dev", "uat"})
+
+    docker.containers["c1"]["State"]["Status"] = "exited"
+    docker.emit(_event("die", "c1", label))
+    await _until(lambda: inventory.cluster("uat")["running"] is False)
+
+    # Joining the shared network is seen through the network event
+    docker.containers["b1"]["NetworkSettings"]["Networks"]["k3d-shared"] = {"IPAddress": "10.100.0.9"}
+    docker.emit(_event("connect", None, event_type="network", container="b1"))
+    await _until(lambda: "k3d-shared" in inventory.cluster("qa")["nodes"][0]["networks"])
+
+    # Unlabelled containers and unknown nodes are not inspected
+    del docker.containers["c1"]
+    docker.emit(_event("start", "zz", {"name": "haproxy-gw"}))
+    docker.emit(_event("connect", None, event_type="network", container="zz"))
+    docker.emit(_event("destroy", "c1", label))
+    await _until(lambda: inventory.clusters("k3d") == {"dev"})
+    assert not any("/containers/zz" in path for path in docker.requests)
+    assert inventory.stats["relists"] == relists
+
+
+@pytest.mark.asyncio
+async def test_events_during_a_relist_are_not_overwritten(inventory, docker):
+    """A listing taken before an event never replaces what the event changed"""
+    inventory.relist_seconds = 0.3
+    docker.list_delay = 0.1
+    await inventory.start()
+    await _until(lambda: inventory.fresh)
+
+    # Wait for the periodic relist to be in flight, then change things under it
+    listed = sum(path.startswith("/containers/json") for path in docker.requests)
+    await _until(lambda: sum(path.startswith("/containers/json") for path in docker.requests) > listed)
+    del docker.containers["a1"], docker.containers["a2"]
+    docker.containers["c1"] = _container("c1", "k3d-uat-server-0", "k3d", "uat", networks={"k3d-uat": "10.102.0.2"})
+    for action, cid, cluster in (("destroy", "a1", "dev"), ("destroy", "a2", "dev"), ("create", "c1", "uat")):
+        docker.emit(_event(action, cid, {"k3d.cluster": cluster}))
+
+    await _until(lambda: inventory.stats["events"] == 3 and inventory.stats["relists"] >= 2)
+    assert inventory.fresh and inventory.clusters("k3d") == {"uat"}
+    await inventory.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_relist_after_reconnect_is_not_fresh(running, docker, monkeypatch):
+    inventory = running
+    docker.stop()
+    await _until(lambda: not inventory.fresh)
+
+    def fail(*args, **kwargs):
+        raise OSError("docker unavailable")
+
+    monkeypatch.setattr(inventory.client, "node_containers", fail)
+    failures = inventory.stats["relist_failures"]
+    docker.start()
+    await _until(lambda: inventory.stats["relist_failures"] > failures)
+    assert not inventory.fresh and inventory.clusters("k3d") is None
+
+
+@pytest.mark.asyncio
+async def test_inventory_api(client: AsyncClient, inventory, monkeypatch):
+    monkeypatch.setattr(inventory_api, "provider_inventory", inventory)
+    response = await client.get("/api/inventory/clusters")
+    assert response.status_code == 503
+
+    await inventory.start()
+    await _until(lambda: inventory.fresh)
+    response = await client.get("/api/inventory/clusters", params={"provider": "k3d", "format": "text"})
+    assert response.status_code == 200 and response.text == "dev\n"
+    # Scripts only trust answers marked as coming from the inventory
+    assert response.headers["X-Kindler-Inventory"] == "1"
+
+    response = await client.get("/api/inventory/clusters/dev/ip")
+    assert response.status_code == 200 and response.text == "10.101.0.2"
+    assert response.headers["X-Kindler-Inventory"] == "1"
+    response = await client.get("/api/inventory/clusters/dev", params={"provider": "kind"})
+    assert response.status_code == 404
+
+    response = await client.get("/api/inventory")
+    assert response.json()["fresh"] is True and response.json()["nodes"] == 3
+    await inventory.stop()
+
+
+@pytest.mark.asyncio
+async def test_same_name_on_two_providers_needs_provider(client: AsyncClient, inventory, docker, monkeypatch):
+    """Nodes of a k3d and a kind cluster sharing a name are never mixed"""
+    docker.containers["d1"] = _container("d1", "dev-control-plane", "kind", "dev", networks={"kind": "172.18.0.7"})
+    monkeypatch.setattr(inventory_api, "provider_inventory", inventory)
+    await inventory.start()
+    await _until(lambda: inventory.fresh)
+
+    for path in ("/api/inventory/clusters/dev", "/api/inventory/clusters/dev/ip"):
+        response = await client.get(path)
+        assert response.status_code == 409 and "k3d, kind" in response.json()["detail"]
+    response = await client.get("/api/inventory/clusters/dev/ip", params={"provider": "kind"})
+    assert response.status_code == 200 and response.text == "172.18.0.7"
+    response = await client.get("/api/inventory/clusters/dev", params={"provider": "k3d"})
+    assert response.json()["provider"] == "k3d" and len(response.json()["nodes"]) == 2
+    await inventory.stop()
@@ -0,0 +1,134 @@
+"""Test operation scheduler (concurrency cap, per-cluster order, priorities, cancel)"""
+import asyncio
+
+import pytest
+
+from app.services.operation_scheduler import OperationScheduler
+from app.services.task_manager import task_manager
+
+
+class Recorder:
+    """Fake cluster operation that blocks until released"""
+
+    def __init__(self):
+        self.started = []
+        self.running = 0
+        self.max_running = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self, name: str, label: str):
+        self.started.append(label)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await self.release.wait()
+            return True
+        finally:
+            self.running -= 1
+
+
+async def _settle():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+async def _submit(scheduler, recorder, cluster, operation):
+    task_id = task_manager.create_task(f"{operation} {cluster}")
+    await scheduler.submit(task_id, cluster, operation, recorder, name=cluster, label=f"{operation}:{cluster}")
+    return task_id
+
+
+@pytest.mark.asyncio
+async def test_concurrency_cap_and_priorities():
+    """At most max_concurrency run; queued work is dispatched delete > stop > start"""
+    scheduler = OperationScheduler(max_concurrency=1)
+    recorder = Recorder()
+    first = await _submit(scheduler, recorder, "a", "start")
+    start_b = await _submit(scheduler, recorder, "b", "start")
+    stop_c = await _submit(scheduler, recorder, "c", "stop")
+    delete_d = await _submit(scheduler, recorder, "d", "delete")
+    await _settle()
+
+    assert recorder.started == ["start:a"]
+    assert task_manager.get_task(first).queue_position == 0
+    assert [scheduler.queue_position(t) for t in (delete_d, stop_c, start_b)] == [1, 2, 3]
+    assert task_manager.get_task(start_b).queue_position == 3
+
+    recorder.release.set()
+    await _settle()
+    assert recorder.started == ["start:a", "delete:d", "stop:c", "start:b"]
+    assert recorder.max_running == 1
+    task = task_manager.get_task(start_b)
+    assert task.status == "completed" and task.wait_seconds is not None
+
+
+@pytest.mark.asyncio
+async def test_same_cluster_operations_are_serialised():
+    """Operations on one cluster never overlap, even with free slots"""
+    scheduler = OperationScheduler(max_concurrency=4)
+    recorder = Recorder()
+    await _submit(scheduler, recorder, "dev", "start")
+    await _submit(scheduler, recorder, "dev", "stop")
+    await _submit(scheduler, recorder, "uat", "start")
+    await _settle()
+
+    assert sorted(recorder.started) == ["start:dev", "start:uat"]
+    recorder.release.set()
+    await _settle()
+    assert recorder.started[-1] == "stop:dev"
+
+
+@pytest.mark.asyncio
+async def test_cancel_queued_and_running_operations():
+    """Queued operations are dropped; running ones are cancelled and marked failed"""
+    scheduler = OperationScheduler(max_concurrency=1)
+    recorder = Recorder()
+    running = await _submit(scheduler, recorder, "a", "start")
+    queued = await _submit(scheduler, recorder, "b", "start")
+    await _settle()
+
+    assert await scheduler.cancel(queued)
+    assert task_manager.get_task(queued).error == "Cancelled"
+    assert await scheduler.cancel(running)
+    await _settle()
+
+    task = task_manager.get_task(running)
+    assert task.status == "failed" and task.error == "Cancelled"
+    assert recorder.started == ["start:a"]
+    assert not await scheduler.cancel(running)
+    assert scheduler.snapshot()["cancelled"] == 2
+
+
+@pytest.mark.asyncio
+async def test_task_less_runs_share_the_queue_and_priorities():
+    """Engine create/delete via run() queue with API start/stop and return their result"""
+    scheduler = OperationScheduler(max_concurrency=1)
+    recorder = Recorder()
+    first = await _submit(scheduler, recorder, "a", "start")
+    create = asyncio.create_task(scheduler.run("b", "create", recorder, name="b", label="create:b"))
+    delete = asyncio.create_task(scheduler.run("c", "delete", recorder, name="c", label="delete:c"))
+    stop_d = await _submit(scheduler, recorder, "d", "stop")
+    await _settle()
+    assert [op.operation for op in scheduler.pending()] == ["delete", "stop", "create"]
+    assert scheduler.queue_position(stop_d) == 2
+
+    recorder.release.set()
+    assert await asyncio.gather(create, delete) == [True, True]
+    await _settle()
+    assert recorder.started == ["start:a", "delete:c", "stop:d", "create:b"]
+    assert task_manager.get_task(first).status == "completed"
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_task_less_run_withdraws_it():
+    scheduler = OperationScheduler(max_concurrency=1)
+    recorder = Recorder()
+    await _submit(scheduler, recorder, "a", "start")
+    waiting = asyncio.create_task(scheduler.run("b", "delete", recorder, name="b", label="delete:b"))
+    await _settle()
+    waiting.cancel()
+    await _settle()
+    assert scheduler.pending() == [] and scheduler.stats["cancelled"] == 1
+    recorder.release.set()
+    await _settle()
+    assert recorder.started == ["start:a"]
@@ -0,0 +1,51 @@
+"""Test operation history API helpers"""
+import pytest
+from fastapi import HTTPException
+from httpx import AsyncClient
+
+from app.api import operations as operations_api
+from app.api.operations import _parse_range
+from app.db import get_db
+
+
+@pytest.mark.parametrize("header,expected", [
+    ("bytes=0-99", (0, 100)),
+    ("bytes=100-", (100, 1000)),
+    ("bytes=-50", (950, 1000)),
+    ("bytes=900-5000", (900, 1000)),
+    ("bytes=1000-", None),
+    ("bytes=-0", None),
+    ("bytes=5-2", None),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+])
+def test_parse_range(header, expected):
+    """Single byte ranges are clamped to the log size; others are unsatisfiable"""
+    assert _parse_range(header, 1000) == expected
+
+
+@pytest.mark.asyncio
+async def test_log_stream_is_snapshotted_before_headers(client: AsyncClient, monkeypatch):
+    """A transcript pruned while streaming still fills the announced length"""
+    db = get_db()
+    op_id = db.log_operation_start("snapshot", "create")
+    db.append_operation_log(op_id, "a" * 10)
+    db.append_operation_log(op_id, "b" * 10)
+    db.log_operation_complete(op_id, "success")
+    monkeypatch.setattr(operations_api, "STREAM_BLOCK_BYTES", 4)
+
+    chunks = await operations_api._log_snapshot(op_id, 5, 15)
+    db.prune_operations("9999-01-01")
+    body = b"".join([piece async for piece in operations_api._stream_log(chunks, 5, 15)])
+    assert body == b"aaaaabbbbb"
+
+    # Once pruned, no headers promising a body are sent
+    with pytest.raises(HTTPException) as excinfo:
+        await operations_api._log_snapshot(op_id, 0, 20)
+    assert excinfo.value.status_code == 404
+
+    op_id = db.log_operation_start("snapshot", "start")
+    db.append_operation_log(op_id, "0123456789")
+    response = await client.get(f"/api/operations/{op_id}/log", headers={"Range": "bytes=-4"})
+    assert response.status_code == 206 and response.content == b"6789"
+    assert response.headers["content-length"] == "4"
@@ -0,0 +1,67 @@
+"""Test shared HTTP prober (TTL cache + single-flight)"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.prober import HttpProber
+
+
+def _prober(handler) -> HttpProber:
+    prober = HttpProber()
+    prober._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return prober
+
+
+@pytest.mark.asyncio
+async def test_refresh_storm_probes_each_target_once():
+    """Concurrent and repeated probes within the TTL hit the target once"""
+    calls = []
+
+    async def handler(request: httpx.Request):
+        calls.append(str(request.url))
+        await asyncio.sleep(0.05)
+        return httpx.Response(200)
+
+    prober = _prober(handler)
+    urls = ["http://portainer.test/", "http://argocd.test/"]
+    results = await asyncio.gather(*(prober.probe_many(urls) for _ in range(20)))
+    await prober.probe_many(urls)
+
+    assert sorted(calls) == sorted(urls)
+    assert all(r[url].reachable for r in results for url in urls)
+    assert prober.stats["probes"] == 2
+    await prober.close()
+
+
+@pytest.mark.asyncio
+async def test_expired_cache_is_reprobed():
+    """Results older than the TTL trigger a new probe"""
+    calls = []
+
+    async def handler(request: httpx.Request):
+        calls.append(str(request.url))
+        return httpx.Response(503)
+
+    prober = _prober(handler)
+    prober.ttl = 0
+    first = await prober.probe("http://git.test/")
+    await prober.probe("http://git.test/")
+
+    assert len(calls) == 2
+    assert first.status_code == 503 and not first.reachable
+    await prober.close()
+
+
+@pytest.mark.asyncio
+async def test_connection_error_reported_offline():
+    """Transport errors produce an unreachable result instead of raising"""
+    def handler(request: httpx.Request):
+        raise httpx.ConnectError("connection refused")
+
+    prober = _prober(handler)
+    result = await prober.probe("http://haproxy.test/")
+
+    assert result.status_code is None
+    assert "refused" in result.error
+    await prober.close()
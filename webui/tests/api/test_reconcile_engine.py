@@ -0,0 +1,260 @@
+"""Test the in-process reconcile engine (plan, worker limits, backoff, write-back)"""
+import asyncio
+
+import pytest
+
+from app.db import Database
+from app.services import reconcile_engine as engine_module
+from app.services.operation_scheduler import OperationScheduler
+from app.services.reconcile_engine import ReconcileBusyError, ReconcileEngine, parse_inventory, plan
+
+
+class FakeProviders:
+    """Provider inventory plus a ClusterService stand-in that edits it"""
+
+    def __init__(self, **clusters):
+        self.clusters = {provider: set(names) for provider, names in clusters.items()}
+        self.failures = {}  # name -> remaining failures
+        self.running = {}
+        self.max_running = {}
+        self.max_total = 0
+        self.calls = []
+        self.listed = []
+        self.delay = 0.01
+
+    async def list(self, provider):
+        self.listed.append(provider)
+        return set(self.clusters.get(provider, ()))
+
+    async def _operate(self, name, provider, progress_callback):
+        self.calls.append(name)
+        self.running[provider] = self.running.get(provider, 0) + 1
+        self.max_running[provider] = max(self.max_running.get(provider, 0), self.running[provider])
+        self.max_total = max(self.max_total, sum(self.running.values()))
+        try:
+            await asyncio.sleep(self.delay)
+            if self.failures.get(name, 0) > 0:
+                self.failures[name] -= 1
+                for i in range(25):
+                    await progress_callback(f"line{i}\n")
+                return False
+            return True
+        finally:
+            self.running[provider] -= 1
+
+    async def create_cluster(self, cluster_data, progress_callback=None):
+        name, provider = cluster_data["name"], cluster_data["provider"]
+        ok = await self._operate(name, provider, progress_callback)
+        if ok:
+            self.clusters.setdefault(provider, set()).add(name)
+        return ok
+
+    async def delete_cluster(self, name, progress_callback=None):
+        provider = next(p for p, names in self.clusters.items() if name in names)
+        ok = await self._operate(name, provider, progress_callback)
+        if ok:
+            self.clusters[provider].discard(name)
+        return ok
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    database = Database(str(tmp_path / "kindler.db"))
+    monkeypatch.setattr(engine_module, "get_db", lambda: database)
+    yield database
+    database.close()
+
+
+def _engine(providers, scheduler=None, **settings):
+    engine = ReconcileEngine(
+        lister=providers.list, cluster_service=providers, scheduler=scheduler or OperationScheduler(max_concurrency=4),
+    )
+    engine.backoff_base = 0.001
+    for key, value in settings.items():
+        setattr(engine, key, value)
+    return engine
+
+
+def _add(db, name, provider="k3d", desired="present", **fields):
+    db.insert_cluster({"name": name, "provider": provider, "desired_state": desired, **fields})
+
+
+def test_parse_inventory():
+    assert parse_inventory("k3d", '[{"name": "a"}, {"name": "b"}]') == {"a", "b"}
+    assert parse_inventory("k3d", "") == set()
+    assert parse_inventory("kind", "x\ny\n\n") == {"x", "y"}
+
+
+def test_plan_mirrors_reconcile_script():
+    """Branches of reconcile_from_database; devops and unlisted providers are skipped"""
+    rows = [
+        {"name": "devops", "provider": "k3d", "desired_state": "present"},
+        {"name": "new", "provider": "k3d", "desired_state": "present"},
+        {"name": "up", "provider": "k3d", "desired_state": "present"},
+        {"name": "gone", "provider": "kind", "desired_state": "absent"},
+        {"name": "old", "provider": "kind", "desired_state": "absent"},
+        {"name": "odd", "provider": "k3d", "desired_state": "paused"},
+        {"name": "dark", "provider": "other", "desired_state": "present"},
+    ]
+    actions = plan(rows, {"k3d": {"up"}, "kind": {"old"}})
+    assert [(a.name, a.action) for a in actions] == [
+        ("new", "create"), ("up", "mark_running"), ("gone", "mark_absent"),
+        ("old", "delete"), ("dark", "create"),
+    ]
+    # A provider that could not be listed gets no actions at all
+    assert [a.name for a in plan(rows, {"k3d": None, "kind": {"old"}})] == ["gone", "old", "dark"]
+
+
+@pytest.mark.asyncio
+async def test_run_respects_worker_and_provider_limits(db):
+    """Actions run concurrently but within the scheduler's global and per-provider caps"""
+    for i in range(6):
+        _add(db, f"k{i}", "k3d")
+        _add(db, f"i{i}", "kind")
+    providers = FakeProviders()
+    scheduler = OperationScheduler(max_concurrency=3)
+    engine = _engine(providers, scheduler=scheduler, provider_limits={"k3d": 2, "kind": 2})
+
+    result = await engine.run()
+
+    assert result["counts"] == {"created": 12}
+    assert providers.max_total == 3
+    assert max(providers.max_running.values()) == 2
+    assert scheduler.stats["completed"] == 12
+    assert all(db.get_cluster(f"k{i}")["actual_state"] == "running" for i in range(6))
+    row = db.get_cluster("i0")
+    assert row["status"] == "Ready" and row["reconcile_error"] is None and row["last_reconciled_at"]
+    assert engine.last_result is result
+
+
+@pytest.mark.asyncio
+async def test_failed_action_is_retried_then_recorded(db):
+    """Retries with backoff; exhausted attempts leave failed/Failed and the output tail"""
+    _add(db, "flaky")
+    _add(db, "broken")
+    providers = FakeProviders()
+    providers.failures = {"flaky": 1, "broken": 5}
+    engine = _engine(providers, max_attempts=3)
+
+    result = await engine.run()
+
+    by_name = {a["name"]: a for a in result["actions"]}
+    assert by_name["flaky"]["result"] == "created" and by_name["flaky"]["attempts"] == 2
+    assert by_name["broken"]["result"] == "error" and by_name["broken"]["attempts"] == 3
+    row = db.get_cluster("broken")
+    assert (row["actual_state"], row["status"]) == ("failed", "Failed")
+    assert row["reconcile_error"] == " ".join(f"line{i}" for i in range(5, 25))
+
+
+def test_backoff_grows_exponentially_up_to_the_cap():
+    engine = ReconcileEngine(lister=FakeProviders().list)
+    engine.backoff_base, engine.backoff_max = 5, 60
+    delays = [engine.backoff_delay(attempt) for attempt in range(1, 7)]
+    for delay, expected in zip(delays, [5, 10, 20, 40, 60, 60]):
+        assert expected * 0.75 <= delay <= expected * 1.25
+
+
+@pytest.mark.asyncio
+async def test_delete_and_converged_rows(db):
+    """Deletes write absent/Removed; converged rows are written only on change"""
+    _add(db, "doomed", "kind", desired="absent")
+    _add(db, "steady", actual_state="running", status="Ready")
+    _add(db, "stale", actual_state="failed", status="Failed", reconcile_error="boom")
+    providers = FakeProviders(k3d={"steady", "stale"}, kind={"doomed"})
+    engine = _engine(providers)
+    steady_version = db.get_cluster_version("steady")
+
+    result = await engine.run()
+
+    assert {a["name"]: a["result"] for a in result["actions"]} == {"doomed": "deleted", "steady": "ok", "stale": "ok"}
+    assert providers.calls == ["doomed"]
+    assert db.get_cluster("doomed")["actual_state"] == "absent"
+    stale = db.get_cluster("stale")
+    assert (stale["actual_state"], stale["status"], stale["reconcile_error"]) == ("running", "Ready", None)
+    assert db.get_cluster_version("steady") == steady_version
+
+
+@pytest.mark.asyncio
+async def test_create_not_detected_is_a_warning(db):
+    """A successful script whose cluster does not show up is recorded as unknown/Warning"""
+    _add(db, "ghost")
+    providers = FakeProviders()
+
+    async def lister(provider):
+        return set()
+
+    engine = ReconcileEngine(lister=lister, cluster_service=providers, scheduler=OperationScheduler(max_concurrency=1))
+    result = await engine.run()
+
+    assert result["counts"] == {"warning": 1}
+    row = db.get_cluster("ghost")
+    assert (row["actual_state"], row["status"]) == ("unknown", "Warning")
+    assert row["reconcile_error"] == "create succeeded but cluster not detected"
+
+
+@pytest.mark.asyncio
+async def test_dry_run_plans_without_side_effects(db):
+    _add(db, "new")
+    providers = FakeProviders()
+    engine = _engine(providers)
+
+    result = await engine.run(dry_run=True)
+
+    assert result["counts"] == {"planned": 1} and result["inventory"] == {"k3d": 0, "kind": 0}
+    assert providers.calls == [] and engine.last_result is None
+    assert db.get_cluster("new")["actual_state"] == "unknown"
+
+
+@pytest.mark.asyncio
+async def test_incremental_pass_touches_only_named_clusters(db):
+    """Only the named rows are read and only their providers are listed"""
+    for i in range(50):
+        _add(db, f"k{i}", "k3d")
+    _add(db, "fresh", "kind")
+    providers = FakeProviders()
+    engine = _engine(providers)
+
+    result = await engine.run(names=["fresh", "vanished"])
+
+    assert result["scope"] == "incremental" and result["clusters"] == 1
+    assert [a["name"] for a in result["actions"]] == ["fresh"]
+    assert providers.listed == ["kind", "kind"]  # diff + post-create check
+    assert db.get_cluster("k0")["actual_state"] == "unknown"
+
+    providers.listed.clear()
+    assert (await engine.run(names=[]))["actions"] == [] and providers.listed == []
+
+
+@pytest.mark.asyncio
+async def test_actions_wait_for_other_operations_on_the_same_cluster(db):
+    """An engine delete queues behind a running start/stop of that cluster"""
+    _add(db, "busy", desired="absent")
+    providers = FakeProviders(k3d={"busy"})
+    scheduler = OperationScheduler(max_concurrency=4)
+    engine = _engine(providers, scheduler=scheduler)
+    release = asyncio.Event()
+
+    async def stop_cluster():
+        await release.wait()
+        providers.calls.append("stop")
+
+    stop = asyncio.create_task(scheduler.run("busy", "stop", stop_cluster))
+    await asyncio.sleep(0)
+    pass_task = asyncio.create_task(engine.run())
+    await asyncio.sleep(0.05)
+    assert providers.calls == [] and [op.operation for op in scheduler.pending()] == ["delete"]
+
+    release.set()
+    await asyncio.gather(stop, pass_task)
+    assert providers.calls == ["stop", "busy"]
+
+
+@pytest.mark.asyncio
+async def test_claim_is_exclusive(db):
+    engine = _engine(FakeProviders())
+    results = await asyncio.gather(engine.claim(), engine.claim(), return_exceptions=True)
+    assert results.count(None) == 1 and isinstance(results[1], ReconcileBusyError)
+    assert engine.running
+
+    await engine.run(claimed=True)
+    assert not engine.running
@@ -0,0 +1,178 @@
+"""Test the coalescing reconciler (max wait, one run in flight, dirty set)"""
+import asyncio
+
+import pytest
+
+from app.services import reconcile_service as reconcile_module
+from app.services.reconcile_service import CoalescingReconciler
+from app.services.watch_service import WatchEvent
+
+
+class FakeEngine:
+    def __init__(self):
+        self.passes = []
+        self.actions = []
+        self.running = 0
+        self.max_running = 0
+        self.release = None  # asyncio.Event gating each pass when set
+
+    async def run(self, names=None, dry_run=False):
+        self.passes.append(None if names is None else sorted(names))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            if self.release is not None:
+                await self.release.wait()
+            return {"counts": {}, "actions": self.actions}
+        finally:
+            self.running -= 1
+
+
+@pytest.fixture
+async def setup(monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(reconcile_module, "reconcile_engine", engine)
+    reconciler = CoalescingReconciler()
+    reconciler.auto_enabled = True
+    reconciler.engine_enabled = True
+    reconciler.debounce_seconds = 0.01
+    reconciler.max_wait_seconds = 1
+    scripts = []
+
+    async def run_script(clusters=None):
+        scripts.append(clusters)
+        return True
+
+    reconciler._run_reconcile = run_script
+    yield reconciler, engine, scripts
+    await reconciler.stop()
+
+
+async def _idle(reconciler, timeout=2):
+    async with asyncio.timeout(timeout):
+        while reconciler.running or reconciler.queued:
+            await asyncio.sleep(0.005)
+
+
+def _event(event_type, name, desired="present", provider="k3d", actual="unknown"):
+    obj = {"name": name, "provider": provider, "desired_state": desired, "actual_state": actual}
+    return WatchEvent(type=event_type, resource_version=1, frame="", object=obj)
+
+
+@pytest.mark.asyncio
+async def test_named_triggers_reconcile_only_those_clusters(setup):
+    """Names from several triggers are merged into one incremental pass"""
+    reconciler, engine, scripts = setup
+    await reconciler.schedule(reason="create:a", names=["a"])
+    await reconciler.schedule(reason="delete:b", names=["b"])
+    await _idle(reconciler)
+
+    assert engine.passes == [["a", "b"]]
+    assert reconciler.dirty == set()
+    # No cluster was created or deleted: the final sync script is skipped
+    assert scripts == []
+    run = reconciler.history[0]
+    assert run["triggers"] == 2 and run["reasons"] == {"create:a": 1, "delete:b": 1}
+    assert run["scope"] == "incremental" and run["clusters"] == ["a", "b"] and run["final_sync"] is False
+
+    engine.actions = [{"name": "c", "action": "create"}]
+    await reconciler.schedule(names=["c"])
+    await reconciler.schedule(reason="manual")
+    await _idle(reconciler)
+    assert engine.passes[-1] is None and scripts == [None]
+    assert reconciler.history[0]["status"] == "completed"
+
+
+@pytest.mark.asyncio
+async def test_final_sync_covers_only_created_or_deleted_clusters(setup):
+    """Incremental passes sync the changed clusters' routes; full passes prune"""
+    reconciler, engine, scripts = setup
+    engine.actions = [
+        {"name": "b", "action": "delete"},
+        {"name": "a", "action": "create"},
+        {"name": "c", "action": "mark_running"},
+    ]
+    await reconciler.schedule(reason="batch", names=["a", "b", "c"])
+    await _idle(reconciler)
+    assert scripts == [["a", "b"]]
+    run = reconciler.history[0]
+    assert run["final_sync"] is True and run["final_sync_clusters"] == ["a", "b"]
+
+    # Periodic full resync: whole fleet, pruning sync even without changes
+    engine.actions = []
+    await reconciler.schedule(reason="periodic full resync")
+    await _idle(reconciler)
+    assert scripts[-1] is None
+    assert reconciler.history[0]["scope"] == "full" and reconciler.history[0]["final_sync"] is True
+
+
+@pytest.mark.asyncio
+async def test_steady_triggers_cannot_postpone_past_max_wait(setup):
+    """A trigger every 20ms never leaves a 50ms quiet period; max wait still fires"""
+    reconciler, engine, _ = setup
+    reconciler.debounce_seconds = 0.05
+    reconciler.max_wait_seconds = 0.15
+    for i in range(20):
+        reconciler.trigger(reason="create", names=[f"c{i}"])
+        await asyncio.sleep(0.02)
+
+    assert len(reconciler.history) >= 2
+    assert all(run["waited_seconds"] < 0.3 for run in reconciler.history)
+    await _idle(reconciler)
+    assert sum(run["triggers"] for run in reconciler.history) == 20
+
+
+@pytest.mark.asyncio
+async def test_one_run_in_flight_and_one_coalesced_follow_up(setup):
+    """Triggers during a run are absorbed by a single follow-up run"""
+    reconciler, engine, _ = setup
+    reconciler.debounce_seconds = 0
+    engine.release = asyncio.Event()
+    reconciler.trigger(reason="create:a", names=["a"])
+    async with asyncio.timeout(1):
+        while not reconciler.running:
+            await asyncio.sleep(0.005)
+
+    for name in ("b", "c", "b"):
+        reconciler.trigger(reason=f"create:{name}", names=[name])
+    state = reconciler.snapshot()
+    assert state["running"]["clusters"] == ["a"]
+    assert state["queued"]["triggers"] == 3 and state["queued"]["reasons"] == {"create:b": 2, "create:c": 1}
+
+    engine.release.set()
+    await _idle(reconciler)
+    assert engine.passes == [["a"], ["b", "c"]]
+    assert engine.max_running == 1
+    assert [run["triggers"] for run in reconciler.history] == [3, 1]
+
+
+@pytest.mark.asyncio
+async def test_watch_events_mark_desired_spec_changes(setup):
+    """Only events that change provider/desired_state make a cluster dirty"""
+    reconciler, engine, _ = setup
+    reconciler._specs = {"a": ("k3d", "present")}
+
+    reconciler.on_cluster_event(_event("MODIFIED", "a", actual="running"))  # engine write-back
+    assert not reconciler.queued
+
+    reconciler.on_cluster_event(_event("MODIFIED", "a", desired="absent"))
+    reconciler.on_cluster_event(_event("ADDED", "new"))
+    await _idle(reconciler)
+    assert engine.passes == [["a", "new"]]
+
+    reconciler.on_cluster_event(_event("DELETED", "new"))
+    assert "new" not in reconciler._specs
+
+
+@pytest.mark.asyncio
+async def test_cancelled_pass_keeps_its_clusters_dirty(setup):
+    reconciler, engine, _ = setup
+    engine.release = asyncio.Event()
+    reconciler.trigger(names=["a"])
+    async with asyncio.timeout(1):
+        while not engine.running:
+            await asyncio.sleep(0.005)
+
+    await reconciler.stop()
+    assert reconciler.dirty == {"a"}
+    assert reconciler.history[0]["status"] == "cancelled"
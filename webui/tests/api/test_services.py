@@ -0,0 +1,68 @@
+"""Test global services status (background health monitor)"""
+import httpx
+import pytest
+from httpx import AsyncClient
+
+from app.services import health_monitor as health_monitor_module
+from app.services.health_monitor import HealthMonitor
+from app.services.prober import HttpProber
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    """Monitor whose probes hit a mock transport (portainer down, others up)"""
+    def handler(request: httpx.Request):
+        if request.url.host.startswith("portainer."):
+            raise httpx.ConnectError("connection refused")
+        return httpx.Response(200)
+
+    prober = HttpProber()
+    prober._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(health_monitor_module, "http_prober", prober)
+    return HealthMonitor()
+
+
+@pytest.mark.asyncio
+async def test_services_status_served_from_memory(client: AsyncClient):
+    """Endpoint answers without probing; unchecked services are unknown"""
+    response = await client.get("/api/services")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert set(data) == {"portainer", "argocd", "haproxy", "git"}
+    assert data["portainer"]["url"].startswith("http://portainer.devops.")
+
+
+@pytest.mark.asyncio
+async def test_monitor_records_status_and_notifies_changes(monitor: HealthMonitor):
+    """Checks update status/latency histogram and push only on change"""
+    pushed = []
+
+    async def listener(service):
+        pushed.append(service)
+
+    monitor.add_listener(listener)
+    for _ in range(2):
+        for target in monitor.targets.values():
+            await monitor.check(target)
+
+    snapshot = monitor.snapshot(with_histogram=True)
+    assert snapshot["argocd"]["status"] == "healthy"
+    assert snapshot["portainer"]["status"] == "offline"
+    assert sum(snapshot["argocd"]["latency_histogram_ms"].values()) == 2
+    # One push per service (unknown -> first status), none for unchanged results
+    assert sorted(s["name"] for s in pushed) == ["ArgoCD", "Git", "HAProxy", "Portainer"]
+
+
+@pytest.mark.asyncio
+async def test_monitor_backs_off_for_down_targets(monitor: HealthMonitor):
+    """Down targets are re-probed with exponential backoff"""
+    monitor.jitter = 0
+    portainer = monitor.targets["portainer"]
+    argocd = monitor.targets["argocd"]
+    for _ in range(3):
+        await monitor.check(portainer)
+        await monitor.check(argocd)
+
+    assert monitor.next_delay(argocd) == monitor.interval
+    assert monitor.next_delay(portainer) == min(monitor.max_backoff, monitor.interval * 8)
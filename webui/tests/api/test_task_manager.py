@@ -0,0 +1,185 @@
+"""Test task manager log ring buffer and delta notifications"""
+import asyncio
+
+import pytest
+
+from app.services.task_manager import TaskLogBuffer, TaskManager
+
+
+def test_log_buffer_keeps_last_lines_with_sequence_numbers():
+    """Oldest lines are evicted while sequence numbers keep increasing"""
+    buffer = TaskLogBuffer(max_lines=3)
+    for i in range(1, 6):
+        assert buffer.append(f"line{i}") == i
+
+    assert buffer.lines() == ["line3", "line4", "line5"]
+    assert buffer.first_seq == 3
+    assert buffer.since(0) == [(3, "line3"), (4, "line4"), (5, "line5")]
+    assert buffer.since(4) == [(5, "line5")]
+    assert buffer.since(5) == []
+
+
+@pytest.mark.asyncio
+async def test_update_task_broadcasts_only_new_lines():
+    """Log updates carry just the appended line, state updates carry no logs"""
+    manager = TaskManager()
+    manager.max_log_lines = 2
+    task_id = manager.create_task("create cluster")
+    received = []
+
+    async def callback(update):
+        received.append(update)
+
+    manager.add_callback(task_id, callback)
+    for i in range(3):
+        await manager.update_task(task_id, log_line=f"line{i}")
+    await manager.update_task(task_id, status="running", progress=10)
+
+    assert [m["type"] for m in received] == ["task_logs"] * 3 + ["task_update"]
+    assert received[2]["lines"] == [{"seq": 3, "line": "line2"}]
+    assert "logs" not in received[3]["task"]
+    assert received[3]["task"]["log_seq"] == 3
+
+    task = manager.get_task(task_id)
+    assert task.logs == ["line1", "line2"]
+    assert manager.get_logs_since(task_id, 2) == [(3, "line2")]
+
+
+@pytest.mark.asyncio
+async def test_log_writer_coalesces_lines_into_batches():
+    """Lines are delivered in batches of flush_lines, the rest on flush"""
+    manager = TaskManager()
+    manager.flush_lines = 100
+    manager.flush_ms = 60_000
+    task_id = manager.create_task("create cluster")
+    received = []
+
+    async def callback(update):
+        received.append(update)
+
+    manager.add_callback(task_id, callback)
+    write = manager.log_writer(task_id)
+    for i in range(250):
+        await write(f"line{i}")
+    assert [len(m["lines"]) for m in received] == [100, 100]
+
+    await manager.flush_logs(task_id)
+    assert [len(m["lines"]) for m in received] == [100, 100, 50]
+    seqs = [line["seq"] for m in received for line in m["lines"]]
+    assert seqs == list(range(1, 251))
+
+
+@pytest.mark.asyncio
+async def test_log_writer_flushes_on_timer_and_before_completion():
+    """Partial batches go out after flush_ms and ahead of the final status"""
+    manager = TaskManager()
+    manager.flush_ms = 10
+    task_id = manager.create_task("start cluster")
+    received = []
+
+    async def callback(update):
+        received.append(update)
+
+    manager.add_callback(task_id, callback)
+    write = manager.log_writer(task_id)
+
+    await write("first")
+    await asyncio.sleep(0.05)
+    assert received[-1] == {"type": "task_logs", "task_id": task_id, "lines": [{"seq": 1, "line": "first"}]}
+
+    async def operation():
+        await write("last")
+        return True, "done"
+
+    await manager.run_task(task_id, operation)
+    types = [m["type"] for m in received]
+    assert types[-2:] == ["task_logs", "task_update"]
+    assert received[-1]["task"]["status"] == "completed"
+
+
+@pytest.mark.asyncio
+async def test_replay_messages_return_state_and_missed_lines():
+    """Replay carries the current state and only lines after ``since``"""
+    manager = TaskManager()
+    manager.max_log_lines = 3
+    task_id = manager.create_task("create cluster")
+    await manager.append_logs(task_id, [f"line{i}" for i in range(1, 6)])
+
+    state, logs = manager.replay_messages(task_id, since=3)
+    assert state["type"] == "task_update" and state["task"]["log_seq"] == 5
+    assert logs["lines"] == [{"seq": 4, "line": "line4"}, {"seq": 5, "line": "line5"}]
+    assert logs["replay"] is True and logs["truncated"] is False
+
+    # Lines 2..3 were evicted from the ring buffer
+    assert manager.replay_messages(task_id, since=1)[1]["truncated"] is True
+    assert manager.replay_messages("missing", since=0) == []
+
+
+@pytest.fixture
+def store_db(tmp_path, monkeypatch):
+    """Temp database wired into the task manager's store"""
+    from app.db import Database
+    from app.services import task_manager as task_manager_module
+
+    database = Database(str(tmp_path / "kindler.db"))
+    monkeypatch.setattr(task_manager_module, "get_db", lambda: database)
+    yield database
+    database.close()
+
+
+@pytest.mark.asyncio
+async def test_evicted_task_is_lazily_loaded_from_store(store_db):
+    """Finished tasks are persisted, evicted from memory and loaded on demand"""
+    manager = TaskManager()
+    task_id = manager.create_task("stop cluster")
+    await manager.append_logs(task_id, ["a", "b"])
+    await manager.append_logs(task_id, ["c"])
+    await manager.update_task(task_id, status="completed", progress=100, message="done")
+
+    # Not evicted before it has been written
+    manager.cleanup_old_tasks(max_age_seconds=0)
+    assert task_id in manager.tasks
+
+    await manager.flush()
+    manager.cleanup_old_tasks(max_age_seconds=0)
+    assert task_id not in manager.tasks and task_id not in manager.logs
+
+    task = await manager.load_task(task_id)
+    assert task.status == "completed" and task.message == "done"
+    assert task.logs == ["a", "b", "c"] and task.log_seq == 3
+    assert await manager.load_task("missing") is None
+
+    # A resubscribing client still gets the state and the lines it missed
+    assert manager.replay_messages(task_id, since=1) == []
+    state, logs = await manager.load_replay_messages(task_id, since=1)
+    assert state["task"]["status"] == "completed" and state["task"]["log_seq"] == 3
+    assert logs["lines"] == [{"seq": 2, "line": "b"}, {"seq": 3, "line": "c"}]
+    assert logs["replay"] is True and logs["truncated"] is False
+    manager.max_log_lines = 1
+    assert (await manager.load_replay_messages(task_id, since=0))[1]["truncated"] is True
+    assert await manager.load_replay_messages("missing", since=0) == []
+
+
+@pytest.mark.asyncio
+async def test_hot_task_limit_and_restart_recovery(store_db):
+    """Memory keeps at most max_hot_tasks finished tasks; restarts fail orphans"""
+    manager = TaskManager()
+    manager.max_hot_tasks = 2
+    finished = []
+    for i in range(4):
+        task_id = manager.create_task(f"task {i}")
+        await manager.update_task(task_id, status="completed")
+        finished.append(task_id)
+    running = manager.create_task("still running")
+    await manager.update_task(running, status="running")
+    await manager.flush()
+
+    manager.cleanup_old_tasks(max_age_seconds=3600)
+    assert set(manager.tasks) == {finished[2], finished[3], running}
+
+    # A new process finds the running task orphaned
+    restarted = TaskManager()
+    await restarted.start()
+    await restarted.stop()
+    task = await restarted.load_task(running)
+    assert task.status == "failed" and "restart" in task.error
@@ -0,0 +1,81 @@
+"""Test cluster watch hub (change log driven SSE events)"""
+import asyncio
+import json
+
+import pytest
+
+from app.db import Database
+from app.services import watch_service
+from app.services.watch_service import ClusterWatchHub, WatchExpired
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Temp database wired into the watch hub"""
+    database = Database(str(tmp_path / "kindler.db"))
+    monkeypatch.setattr(watch_service, "get_db", lambda: database)
+    yield database
+    database.close()
+
+
+def _payload(event):
+    data_line = [line for line in event.frame.splitlines() if line.startswith("data: ")][0]
+    return json.loads(data_line[len("data: "):])
+
+
+@pytest.mark.asyncio
+async def test_initial_snapshot_ends_with_bookmark(db: Database):
+    """Snapshot lists every cluster as ADDED followed by a BOOKMARK"""
+    db.insert_cluster({"name": "dev", "provider": "k3d"})
+    db.insert_cluster({"name": "uat", "provider": "kind"})
+
+    events = await ClusterWatchHub().initial_events(None)
+
+    assert [e.type for e in events] == ["ADDED", "ADDED", "BOOKMARK"]
+    assert [_payload(e)["object"]["name"] for e in events[:2]] == ["dev", "uat"]
+    assert events[-1].resource_version == db.get_change_version()
+
+
+@pytest.mark.asyncio
+async def test_resume_replays_only_missed_changes(db: Database):
+    """?since= replays the change log after that version"""
+    db.insert_cluster({"name": "dev", "provider": "k3d"})
+    since = db.get_change_version()
+    db.update_cluster("dev", {"actual_state": "running"})
+    db.insert_cluster({"name": "uat", "provider": "k3d"})
+    db.delete_cluster("uat")
+
+    events = await ClusterWatchHub().initial_events(since)
+
+    assert [e.type for e in events] == ["MODIFIED", "DELETED", "DELETED"]
+    assert _payload(events[0])["object"]["actual_state"] == "running"
+    assert all(e.resource_version > since for e in events)
+
+
+@pytest.mark.asyncio
+async def test_resume_from_pruned_version_expires(db: Database):
+    """Versions older than the retained log raise WatchExpired (HTTP 410)"""
+    for i in range(5):
+        db.insert_cluster({"name": f"c{i}", "provider": "k3d"})
+    db.prune_cluster_changes(keep=1)
+
+    with pytest.raises(WatchExpired):
+        await ClusterWatchHub().initial_events(1)
+
+
+@pytest.mark.asyncio
+async def test_detector_fans_out_to_all_watchers(db: Database):
+    """One change detector feeds every subscribed queue"""
+    hub = ClusterWatchHub()
+    hub.poll_interval = 0.01
+    await hub.start()
+    try:
+        queues = [hub.subscribe() for _ in range(3)]
+        db.insert_cluster({"name": "dev", "provider": "k3d"})
+
+        events = await asyncio.wait_for(asyncio.gather(*(q.get() for q in queues)), timeout=2)
+        assert {e.type for e in events} == {"ADDED"}
+        # Encoded once, shared by every watcher
+        assert len({id(e) for e in events}) == 1
+    finally:
+        await hub.stop()
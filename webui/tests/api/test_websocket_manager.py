@@ -0,0 +1,164 @@
+"""Test WebSocket topic hub, send queues, coalescing and slow-consumer eviction"""
+import asyncio
+import json
+
+import pytest
+
+from app.websocket.manager import WebSocketManager
+
+
+class FakeWebSocket:
+    """In-memory socket; ``gate`` blocks sends to simulate a slow client"""
+
+    def __init__(self, blocked: bool = False):
+        self.sent = []
+        self.closed_code = None
+        self.gate = asyncio.Event()
+        if not blocked:
+            self.gate.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        await self.gate.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        self.closed_code = code
+
+
+@pytest.fixture
+async def manager():
+    ws_manager = WebSocketManager()
+    yield ws_manager
+    await ws_manager.shutdown()
+
+
+async def _drain():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_slow_client_does_not_block_fast_clients(manager):
+    """Broadcast only enqueues; a stalled socket leaves others unaffected"""
+    fast, slow = FakeWebSocket(), FakeWebSocket(blocked=True)
+    for ws in (fast, slow):
+        await manager.connect(ws)
+        manager.subscribe(ws, ["task:t1"])
+
+    for i in range(3):
+        manager.publish_task("t1", {"type": "task_logs", "lines": [i]})
+    await _drain()
+
+    assert [m["lines"] for m in fast.sent] == [[0], [1], [2]]
+    assert slow.sent == []
+    assert manager.stats()["queue_depth_max"] >= 2
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_logs_and_keeps_latest_state(manager):
+    """Log deltas are dropped and task_update coalesces when a client lags"""
+    manager.max_queue = 3
+    slow = FakeWebSocket(blocked=True)
+    await manager.connect(slow)
+    manager.subscribe(slow, ["task:t1"])
+    await _drain()
+
+    manager.publish_task("t1", {"type": "task_update", "task": {"progress": 10}})
+    for i in range(5):
+        manager.publish_task("t1", {"type": "task_logs", "lines": [i]})
+    manager.publish_task("t1", {"type": "task_update", "task": {"progress": 90}})
+
+    stats = manager.stats()
+    assert stats["dropped"] >= 3
+    assert stats["coalesced"] == 1
+    assert stats["evicted"] == 0
+
+    slow.gate.set()
+    await _drain()
+    updates = [m for m in slow.sent if m["type"] == "task_update"]
+    # The writer may already hold the first frame; the rest collapses to the latest state
+    assert updates[-1]["task"]["progress"] == 90
+    assert len(updates) <= 2
+
+
+@pytest.mark.asyncio
+async def test_coalesced_state_is_not_sent_before_later_frames(manager):
+    """A superseding task_update moves behind the log deltas queued before it"""
+    slow = FakeWebSocket(blocked=True)
+    await manager.connect(slow)
+    manager.subscribe(slow, ["task:t1"])
+    manager.publish_task("t1", {"type": "task_logs", "lines": ["hold"]})
+    await _drain()
+
+    manager.publish_task("t1", {"type": "task_update", "task": {"status": "running"}})
+    manager.publish_task("t1", {"type": "task_logs", "lines": ["last"]})
+    manager.publish_task("t1", {"type": "task_update", "task": {"status": "completed"}})
+    assert manager.stats()["coalesced"] == 1
+
+    slow.gate.set()
+    await _drain()
+    assert [m.get("lines") or m["task"]["status"] for m in slow.sent] == [["hold"], ["last"], "completed"]
+
+
+@pytest.mark.asyncio
+async def test_client_with_full_state_queue_is_evicted(manager):
+    """A queue full of undroppable state evicts the slow consumer"""
+    manager.max_queue = 2
+    slow = FakeWebSocket(blocked=True)
+    await manager.connect(slow)
+
+    manager.subscribe(slow, ["services"])
+    for i in range(4):
+        manager.publish("services", {"type": "service_status", "i": i}, key=str(i))
+    await _drain()
+
+    assert manager.stats()["evicted"] == 1
+    assert manager.stats()["connections"] == 0
+    assert slow.closed_code == 1013
+
+
+@pytest.mark.asyncio
+async def test_topics_are_multiplexed_and_serialized_once(manager):
+    """One socket receives several topics; each message is encoded once per topic"""
+    a, b = FakeWebSocket(), FakeWebSocket()
+    for ws in (a, b):
+        await manager.connect(ws)
+    assert manager.subscribe(a, ["clusters", "task:t1", "bogus"]) == ["clusters", "task:t1"]
+    manager.subscribe(b, ["clusters"])
+
+    manager.publish("clusters", {"type": "cluster_event", "event": "ADDED"})
+    manager.publish_task("t1", {"type": "task_update", "task": {"progress": 5}})
+    manager.publish("services", {"type": "service_status"})
+    await _drain()
+
+    assert [m["topic"] for m in a.sent] == ["clusters", "task:t1"]
+    assert [m["topic"] for m in b.sent] == ["clusters"]
+    assert manager.stats()["published"] == 2
+
+    manager.unsubscribe(a, ["clusters"])
+    manager.publish("clusters", {"type": "cluster_event", "event": "DELETED"})
+    await _drain()
+    assert len(a.sent) == 2 and len(b.sent) == 2
+
+
+def test_subscribe_with_since_replays_missed_lines():
+    """A resuming client gets the state plus lines after ``since`` before live updates"""
+    from starlette.testclient import TestClient
+
+    from app.main import app
+    from app.services.task_manager import task_manager
+
+    task_id = task_manager.create_task("create cluster")
+    asyncio.run(task_manager.append_logs(task_id, ["one", "two", "three"]))
+
+    with TestClient(app).websocket_connect("/ws") as ws:
+        ws.send_json({"type": "subscribe", "task_id": task_id, "since": 2})
+        assert ws.receive_json()["type"] == "subscribed"
+        state = ws.receive_json()
+        assert state["type"] == "task_update" and state["task"]["log_seq"] == 3
+        replay = ws.receive_json()
+        assert replay["replay"] is True
+        assert replay["lines"] == [{"seq": 3, "line": "three"}]
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark: allocating a free pf port / subnet with N clusters in the database.
+
+Fills a scratch database with N clusters holding the lowest pf ports and
+subnets, then compares:
+
+- ``linear``: the old ``sqlite_next_available_port`` strategy, one
+  ``COUNT(*)`` query per candidate port (in-process, so without the flock,
+  sqlite3 process and ``docker exec`` each shell iteration paid),
+- ``gap``: ``Database.allocate_port``/``allocate_subnet``, one gap-finding
+  query inside ``BEGIN IMMEDIATE`` that also records the reservation,
+- with ``--shell``: the same two strategies through scripts/lib/lib_sqlite.sh
+  (``sqlite_port_in_use`` loop vs ``sqlite_allocate_port``); needs sqlite3.
+
+Usage (from webui/backend):
+    python ../tests/perf/bench_allocator.py --clusters 500 --shell
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "backend"))
+
+from app.db import PORT_RANGES, SUBNET_RANGE, Database, subnet_cidr  # noqa: E402
+
+LIB_SQLITE = os.path.join(os.path.dirname(__file__), "..", "..", "..", "scripts", "lib", "lib_sqlite.sh")
+
+
+def fill(db: Database, clusters: int):
+    pf_lo, _ = PORT_RANGES["pf_port"]
+    http_lo, _ = PORT_RANGES["http_port"]
+    https_lo, _ = PORT_RANGES["https_port"]
+    with db._get_conn() as conn:
+        conn.executemany(
+            "INSERT INTO clusters (name, provider, subnet, node_port, pf_port, http_port, https_port) "
+            "VALUES (?, 'k3d', ?, 30080, ?, ?, ?)",
+            [
+                (f"c{i}", subnet_cidr(SUBNET_RANGE[0] + i) if i < 100 else None,
+                 pf_lo + i, http_lo + i, https_lo + i)
+                for i in range(clusters)
+            ],
+        )
+
+
+def linear_next_port(db: Database, lo: int, hi: int) -> int:
+    with db._get_conn(readonly=True) as conn:
+        for port in range(lo, hi + 1):
+            count = conn.execute(
+                "SELECT COUNT(*) FROM clusters WHERE node_port = ? OR pf_port = ? OR http_port = ? OR https_port = ?",
+                (port, port, port, port),
+            ).fetchone()[0]
+            if not count:
+                return port
+    raise ValueError("exhausted")
+
+
+def timed(func, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def shell(db_path: str, script: str) -> str:
+    env = {**os.environ, "SQLITE_DB": db_path, "SQLITE_LOCK": db_path + ".lock"}
+    return subprocess.run(
+        ["bash", "-c", f"source {LIB_SQLITE}; {script}"],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--shell", action="store_true", help="also time lib_sqlite.sh (needs sqlite3)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="kindler-alloc-")
+    db_path = os.path.join(workdir, "kindler.db")
+    db = Database(db_path)
+    try:
+        fill(db, args.clusters)
+        lo, hi = PORT_RANGES["pf_port"]
+        print(f"{args.clusters} clusters, pf ports {lo}-{hi}")
+
+        elapsed, port = timed(lambda: linear_next_port(db, lo, hi), args.repeat)
+        print(f"  linear (in-process): {elapsed * 1000:8.2f} ms -> {port} ({port - lo + 1} queries)")
+
+        def allocate():
+            value = db.allocate_port("bench", "pf_port")
+            db.release("bench")
+            return value
+
+        elapsed, port = timed(allocate, args.repeat)
+        print(f"  gap allocate+release: {elapsed * 1000:7.2f} ms -> {port}")
+
+        def allocate_subnet():
+            value = db.allocate_subnet("bench")
+            db.release("bench")
+            return value
+
+        elapsed, subnet = timed(allocate_subnet, args.repeat)
+        print(f"  gap subnet allocate+release: {elapsed * 1000:.2f} ms -> {subnet}")
+
+        if args.shell:
+            if not shutil.which("sqlite3"):
+                print("  (sqlite3 not found, skipping shell timings)")
+                return
+            db.close()
+            legacy = (
+                f'for p in $(seq {lo} {hi}); do '
+                f'if ! sqlite_port_in_use "$p"; then echo "$p"; break; fi; done'
+            )
+            elapsed, port = timed(lambda: shell(db_path, legacy), 1)
+            print(f"  shell sqlite_port_in_use loop: {elapsed:.2f} s -> {port}")
+            elapsed, port = timed(
+                lambda: shell(db_path, "sqlite_allocate_port bench pf_port; sqlite_release_allocations bench"), 3
+            )
+            print(f"  shell sqlite_allocate_port: {elapsed * 1000:.1f} ms -> {port}")
+    finally:
+        db.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /api/health latency while /api/clusters is under load.
+
+Measures how much database work on /api/clusters delays unrelated requests
+served by the same event loop. With the DB executor in place, p99 of
+/api/health should stay close to its idle baseline.
+
+Usage:
+    python bench_health_latency.py --url http://localhost:8000 \
+        --load-clients 32 --duration 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile (samples need not be sorted)"""
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def load_worker(client: httpx.AsyncClient, stop: asyncio.Event, counter: list):
+    """Hammer /api/clusters until stopped"""
+    while not stop.is_set():
+        try:
+            await client.get("/api/clusters")
+            counter[0] += 1
+        except httpx.HTTPError:
+            counter[1] += 1
+
+
+async def probe_health(client: httpx.AsyncClient, stop: asyncio.Event, interval: float) -> list:
+    """Sample /api/health latency (ms) until stopped"""
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/api/health")
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def run_phase(url: str, load_clients: int, duration: float, interval: float):
+    """Run one phase (idle when load_clients == 0) and return stats"""
+    stop = asyncio.Event()
+    counter = [0, 0]  # ok, errors
+    limits = httpx.Limits(max_connections=load_clients + 4)
+    async with httpx.AsyncClient(base_url=url, timeout=30, limits=limits) as client:
+        loaders = [asyncio.create_task(load_worker(client, stop, counter)) for _ in range(load_clients)]
+        prober = asyncio.create_task(probe_health(client, stop, interval))
+        await asyncio.sleep(duration)
+        stop.set()
+        latencies = await prober
+        await asyncio.gather(*loaders)
+    return {
+        "samples": len(latencies),
+        "p50": statistics.median(latencies) if latencies else float("nan"),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies) if latencies else float("nan"),
+        "load_rps": counter[0] / duration,
+        "load_errors": counter[1],
+    }
+
+
+def print_phase(name: str, stats: dict):
+    print(
+        f"{name:<10} samples={stats['samples']:<6} "
+        f"p50={stats['p50']:.2f}ms p99={stats['p99']:.2f}ms max={stats['max']:.2f}ms "
+        f"clusters_rps={stats['load_rps']:.1f} errors={stats['load_errors']}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="Backend base URL")
+    parser.add_argument("--load-clients", type=int, default=32, help="Concurrent /api/clusters clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per phase")
+    parser.add_argument("--interval", type=float, default=0.01, help="Delay between health probes (s)")
+    args = parser.parse_args()
+
+    print(f"Target: {args.url}")
+    print_phase("idle", await run_phase(args.url, 0, args.duration, args.interval))
+    print_phase("loaded", await run_phase(args.url, args.load_clients, args.duration, args.interval))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: task log lines per second delivered to WebSocket subscribers.
+
+Feeds a burst of script output lines through the task manager into the
+WebSocket manager with N subscribed sockets, once line-by-line
+(``update_task(log_line=...)``, one message per line) and once through the
+coalescing ``log_writer`` (``task_logs`` batches). The sockets are in-process
+sinks that only count frames, so the numbers isolate the server-side cost of
+lock acquisition, serialisation and fan-out.
+
+Usage (from webui/backend):
+    python ../tests/perf/bench_task_logs.py --lines 20000 --subscribers 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "backend"))
+
+from app.services.task_manager import TaskManager  # noqa: E402
+from app.websocket.manager import WebSocketManager  # noqa: E402
+
+
+class SinkSocket:
+    """Minimal stand-in for a connected WebSocket that counts delivered lines"""
+
+    def __init__(self):
+        self.frames = 0
+        self.lines = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.frames += 1
+        message = json.loads(text)
+        if message.get("type") == "task_logs":
+            self.lines += len(message["lines"])
+
+
+async def run(mode: str, lines: int, subscribers: int, flush_ms: float, flush_lines: int) -> dict:
+    manager = TaskManager()
+    manager.flush_ms = flush_ms
+    manager.flush_lines = flush_lines
+    ws = WebSocketManager()
+    # Large enough that nothing is dropped: every line must be delivered
+    ws.max_queue = lines + 16
+    sockets = [SinkSocket() for _ in range(subscribers)]
+
+    task_id = manager.create_task("benchmark")
+    for socket in sockets:
+        await ws.connect(socket)
+        ws.subscribe(socket, [f"task:{task_id}"])
+
+    async def ws_callback(update: dict):
+        ws.publish_task(task_id, update)
+
+    manager.add_callback(task_id, ws_callback)
+
+    if mode == "batched":
+        write = manager.log_writer(task_id)
+    else:
+        async def write(line: str):
+            await manager.update_task(task_id, log_line=line)
+
+    started = time.perf_counter()
+    for i in range(lines):
+        await write(f"[INFO] step {i}: creating resources for cluster bench\n")
+    await manager.flush_logs(task_id)
+    while ws.stats()["queue_depth_total"]:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    await ws.shutdown()
+
+    delivered = sum(s.lines for s in sockets)
+    assert delivered == lines * subscribers, f"{delivered} != {lines * subscribers}"
+    return {
+        "mode": mode,
+        "elapsed_s": elapsed,
+        "frames_per_socket": sockets[0].frames,
+        "lines_per_s": lines / elapsed,
+        "delivered_lines_per_s": delivered / elapsed,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=20000)
+    parser.add_argument("--subscribers", type=int, default=50)
+    parser.add_argument("--flush-ms", type=float, default=100)
+    parser.add_argument("--flush-lines", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.lines} lines -> {args.subscribers} subscribers "
+          f"(flush every {args.flush_ms}ms / {args.flush_lines} lines)")
+    for mode in ("per-line", "batched"):
+        r = await run(mode, args.lines, args.subscribers, args.flush_ms, args.flush_lines)
+        print(f"  {r['mode']:>9}: {r['elapsed_s']:.3f}s, {r['frames_per_socket']} frames/socket, "
+              f"{r['lines_per_s']:.0f} lines/s produced, {r['delivered_lines_per_s']:.0f} lines/s delivered")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())